@@ -1,11 +1,203 @@
 #!/usr/bin/env python3
 
+import argparse
 import sys
 
-from pyscm.pyscm import interpret_from_file, run_repl
+from pyscm.batch import read_manifest, run_batch_command
+from pyscm.bench import run_bench
+from pyscm.cache import CACHE_DIR
+from pyscm.limits import Limits
+from pyscm.pyscm import BACKENDS, interpret_from_file, run_repl
+from pyscm.server import run_client, serve
 
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
-        interpret_from_file(sys.argv[1])
+    arg_parser = argparse.ArgumentParser(description="Scheme interpreter")
+    arg_parser.add_argument(
+        "file", nargs="?", help="scheme file to interpret, - for standard input"
+    )
+    arg_parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        help="how expressions are executed (default: tree, the server's own "
+        "backend with --connect)",
+    )
+
+    arg_parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"don't read or write parsed files in {CACHE_DIR}",
+    )
+
+    arg_parser.add_argument(
+        "--no-check",
+        action="store_true",
+        help="don't look for undefined variables before running the file, "
+        "with --no-cache it is then read as it is evaluated",
+    )
+
+    arg_parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="fold constants and drop dead branches before evaluating",
+    )
+    arg_parser.add_argument(
+        "--dump-optimized",
+        action="store_true",
+        help="print the optimized forms to stderr, implies --optimize",
+    )
+
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print per procedure call counts and times to stderr",
+    )
+    arg_parser.add_argument(
+        "--profile-collapsed",
+        metavar="FILE",
+        help="write collapsed call stacks for flamegraph tools to FILE",
+    )
+
+    limits = arg_parser.add_argument_group("limits")
+    limits.add_argument(
+        "--max-steps",
+        type=int,
+        metavar="N",
+        help="stop an evaluation after N procedure calls",
+    )
+    limits.add_argument(
+        "--timeout",
+        type=float,
+        metavar="SECONDS",
+        help="stop an evaluation after SECONDS of wall clock time",
+    )
+    limits.add_argument(
+        "--max-memory",
+        type=int,
+        metavar="MB",
+        help="stop an evaluation once it grew the process' memory by MB",
+    )
+
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        help="interpreter processes for --serve and --batch (default: cpu count)",
+    )
+
+    batch = arg_parser.add_argument_group("batch")
+    batch.add_argument(
+        "--batch",
+        nargs="+",
+        metavar="FILE",
+        help="evaluate many files in parallel, each in its own environment",
+    )
+    batch.add_argument(
+        "--manifest",
+        metavar="FILE",
+        help="evaluate the files listed in FILE, one per line, as a batch",
+    )
+
+    server = arg_parser.add_argument_group("server")
+    server.add_argument(
+        "--serve",
+        metavar="ADDRESS",
+        help="serve requests on a unix socket path or host:port",
+    )
+    server.add_argument(
+        "--connect",
+        metavar="ADDRESS",
+        help="evaluate file, or standard input, on the server at ADDRESS",
+    )
+
+    bench = arg_parser.add_argument_group("benchmarks")
+    bench.add_argument(
+        "--bench",
+        nargs="*",
+        metavar="NAME",
+        help="run the benchmark suite, or only the named benchmarks",
+    )
+    bench.add_argument(
+        "--bench-repeat",
+        type=int,
+        default=3,
+        help="runs per benchmark, the best is reported (default: 3)",
+    )
+    bench.add_argument(
+        "--bench-save", metavar="FILE", help="save results as a baseline"
+    )
+    bench.add_argument(
+        "--bench-baseline",
+        metavar="FILE",
+        help="fail if a benchmark is slower than in this baseline",
+    )
+    bench.add_argument(
+        "--bench-threshold",
+        type=float,
+        default=0.1,
+        help="slowdown over the baseline allowed, as a fraction (default: 0.1)",
+    )
+    args = arg_parser.parse_args()
+    # --connect sends args.backend as given, without it the server's is used
+    backend = args.backend or "tree"
+    limits = None
+    if args.max_steps or args.timeout or args.max_memory:
+        limits = Limits(
+            args.max_steps,
+            args.timeout,
+            args.max_memory and args.max_memory * 2**20,
+        )
+
+    if args.bench is not None:
+        sys.exit(
+            run_bench(
+                backend,
+                args.bench,
+                args.bench_repeat,
+                args.bench_save,
+                args.bench_baseline,
+                args.bench_threshold,
+            )
+        )
+    elif args.batch or args.manifest:
+        paths = list(args.batch or [])
+        if args.manifest:
+            try:
+                paths.extend(read_manifest(args.manifest))
+            except OSError as e:
+                print(e)
+                sys.exit(1)
+        sys.exit(
+            run_batch_command(
+                paths, backend, args.workers, not args.no_cache, limits
+            )
+        )
+    elif args.serve:
+        try:
+            serve(args.serve, args.workers, backend, limits or Limits())
+        except OSError as e:
+            print(e)
+            sys.exit(1)
+    elif args.connect:
+        if args.file:
+            try:
+                with open(args.file) as f:
+                    source = f.read()
+            except OSError as e:
+                print(e)
+                sys.exit(1)
+        else:
+            source = sys.stdin.read()
+        sys.exit(run_client(args.connect, source, args.backend))
+    elif args.file:
+        interpret_from_file(
+            args.file,
+            backend,
+            not args.no_cache,
+            args.profile,
+            args.profile_collapsed,
+            not args.no_check,
+            limits,
+            args.optimize,
+            args.dump_optimized,
+        )
     else:
-        run_repl()
+        run_repl(backend, limits)
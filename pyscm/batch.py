@@ -0,0 +1,133 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import io
+import os
+import time
+from typing import List, Optional
+
+from .env import global_env
+from .limits import Limits
+from .procedure import to_string
+from .pyscm import SUCCESS, Interpret
+
+
+@dataclass
+class FileResult:
+    path: str
+    ok: bool
+    # the printed values of the file's expressions
+    results: List[str] = field(default_factory=list)
+    error: Optional[str] = None
+    # seconds spent reading and evaluating the file
+    time: float = 0.0
+    # what the file wrote with display, write-string and newline
+    output: str = ""
+
+
+def evaluate_file(
+    path: str,
+    backend: str = "tree",
+    use_cache: bool = True,
+    limits: Optional[Limits] = None,
+) -> FileResult:
+    start = time.perf_counter()
+    if not path.endswith("scm"):
+        return FileResult(path, False, error="Can only interpret scheme file")
+
+    # a new interpreter per file, so files don't see each other's definitions.
+    # Its output is kept with its results, so it is reported in order too
+    output = io.StringIO()
+    interpreter = Interpret(global_env, backend, limits=limits, output=output)
+    try:
+        status, results = interpreter.interpret_file(path, use_cache)
+    except (OSError, ValueError) as e:
+        # a file that can't be read or decoded fails alone, not the batch
+        return FileResult(path, False, error=str(e))
+    elapsed = time.perf_counter() - start
+
+    if status != SUCCESS:
+        return FileResult(
+            path, False, error=str(results), time=elapsed, output=output.getvalue()
+        )
+    values = [to_string(result) for result in results]  # type: ignore
+    return FileResult(path, True, values, time=elapsed, output=output.getvalue())
+
+
+def read_manifest(path: str) -> List[str]:
+    """
+    A manifest lists one file per line, relative to the manifest's directory.
+    Blank lines and lines starting with ; are skipped
+    """
+    directory = os.path.dirname(path)
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [
+        os.path.join(directory, line)
+        for line in lines
+        if line and not line.startswith(";")
+    ]
+
+
+def run_batch(
+    paths: List[str],
+    backend: str = "tree",
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+    limits: Optional[Limits] = None,
+) -> List[FileResult]:
+    """
+    Evaluates the files in parallel processes. Results come back in the order
+    of paths whichever file finishes first. limits bound each file on its own
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(paths) <= 1:
+        return [
+            evaluate_file(path, backend, use_cache, limits) for path in paths
+        ]
+
+    # small files are sent in chunks, one process round trip per file would
+    # cost more than evaluating it
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(workers) as executor:
+        return list(
+            executor.map(
+                evaluate_file,
+                paths,
+                [backend] * len(paths),
+                [use_cache] * len(paths),
+                [limits] * len(paths),
+                chunksize=chunksize,
+            )
+        )
+
+
+def format_batch(results: List[FileResult], elapsed: float) -> str:
+    lines = []
+    for result in results:
+        if result.ok:
+            lines.append(f"{result.path}: ok ({result.time * 1000:.2f} ms)")
+        else:
+            lines.append(f"{result.path}: error: {result.error}")
+        # output is marked apart from values
+        lines.extend(f"  | {line}" for line in result.output.splitlines())
+        if result.ok:
+            lines.extend(f"  {value}" for value in result.results)
+    failed = sum(not result.ok for result in results)
+    lines.append(
+        f"{len(results)} files, {failed} failed in {elapsed * 1000:.2f} ms"
+    )
+    return "\n".join(lines)
+
+
+def run_batch_command(
+    paths: List[str],
+    backend: str = "tree",
+    workers: Optional[int] = None,
+    use_cache: bool = True,
+    limits: Optional[Limits] = None,
+) -> int:
+    """Runs a batch for the command line. Returns the exit status"""
+    start = time.perf_counter()
+    results = run_batch(paths, backend, workers, use_cache, limits)
+    print(format_batch(results, time.perf_counter() - start))
+    return 0 if all(result.ok for result in results) else 1
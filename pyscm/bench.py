@@ -0,0 +1,262 @@
+from dataclasses import asdict, dataclass
+import json
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from .env import global_env
+from .evaluate import EvalStatus
+from .pyscm import Interpret
+
+
+@dataclass
+class Benchmark:
+    name: str
+    source: Callable[[], str]
+    # user procedure applications one evaluation performs, used for calls/sec
+    calls: int
+
+
+@dataclass
+class BenchResult:
+    name: str
+    parse_time: float
+    eval_time: float
+    calls_per_sec: float
+    peak_memory: int
+
+
+def _fib_calls(n: int) -> int:
+    a, b = 1, 1
+    for _ in range(n):
+        a, b = b, a + b + 1
+    return a
+
+
+def _ackermann_calls(m: int, n: int) -> int:
+    # the same recursion as the scheme program, with an explicit stack
+    calls = 0
+    stack = [m]
+    while stack:
+        m = stack.pop()
+        calls += 1
+        if m == 0:
+            n += 1
+        elif n == 0:
+            n = 1
+            stack.append(m - 1)
+        else:
+            n -= 1
+            stack.append(m - 1)
+            stack.append(m)
+    return calls
+
+
+def _fib_source() -> str:
+    return """
+    (define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+    (fib 18)
+    """
+
+
+def _ackermann_source() -> str:
+    return """
+    (define (ack m n)
+        (if (= m 0)
+            (+ n 1)
+            (if (= n 0)
+                (ack (- m 1) 1)
+                (ack (- m 1) (ack m (- n 1))))))
+    (ack 2 40)
+    """
+
+
+def _loop_source() -> str:
+    return """
+    (define (loop n acc) (if (= n 0) acc (loop (- n 1) (+ acc n))))
+    (loop 20000 0)
+    """
+
+
+def _named_let_source() -> str:
+    return """
+    (define (sum-squares n)
+        (let loop ((i 0) (acc 0))
+            (if (= i n) acc (let ((square (* i i))) (loop (+ i 1) (+ acc square))))))
+    (sum-squares 20000)
+    """
+
+
+def _closures_source() -> str:
+    return """
+    (define (make-adder n) (lambda (x) (+ x n)))
+    (define (compose f g) (lambda (x) (f (g x))))
+    (define add3 (compose (make-adder 1) (make-adder 2)))
+    (define (repeat n acc) (if (= n 0) acc (repeat (- n 1) (add3 acc))))
+    (repeat 5000 0)
+    """
+
+
+def _data_source() -> str:
+    # a generated file of literal configuration data
+    lines = []
+    for i in range(2000):
+        values = " ".join(str((i * 31 + j * 17) % 1000) for j in range(50))
+        lines.append(f'(define row{i} (max {values})) ; row "{i}"')
+    return "\n".join(lines)
+
+
+def _nesting_source() -> str:
+    depth = 150
+    return "(+ 1 " * depth + "0" + ")" * depth
+
+
+BENCHMARKS = [
+    Benchmark("fib", _fib_source, _fib_calls(18)),
+    Benchmark("ackermann", _ackermann_source, _ackermann_calls(2, 40)),
+    Benchmark("loop", _loop_source, 20001),
+    Benchmark("named-let", _named_let_source, 1 + 20001),
+    Benchmark("closures", _closures_source, 3 + 5001 + 5000 * 3),
+    Benchmark("data", _data_source, 0),
+    Benchmark("nesting", _nesting_source, 0),
+]
+
+
+def run_benchmark(benchmark: Benchmark, backend: str, repeat: int) -> BenchResult:
+    source = benchmark.source()
+    parse_time = eval_time = float("inf")
+
+    def run():
+        interpreter = Interpret(global_env, backend)
+        start = time.perf_counter()
+        forms = []
+        for status, datum in interpreter.parser.parse(source):
+            if not status:
+                raise ValueError(f"{benchmark.name}: {datum}")
+            forms.append(datum)
+        parsed = time.perf_counter()
+        for form in forms:
+            evaluation = interpreter.evaluator.evaluate(form)
+            if evaluation.status == EvalStatus.FAILURE:
+                raise ValueError(f"{benchmark.name}: {evaluation.result}")
+        return parsed - start, time.perf_counter() - parsed
+
+    # the best of several runs is the least noisy estimate
+    for _ in range(repeat):
+        parsed, evaluated = run()
+        parse_time = min(parse_time, parsed)
+        eval_time = min(eval_time, evaluated)
+
+    # tracing slows everything down, so memory is measured in its own run
+    tracemalloc.start()
+    try:
+        run()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchResult(
+        benchmark.name,
+        parse_time,
+        eval_time,
+        benchmark.calls / eval_time if eval_time > 0 else 0.0,
+        peak_memory,
+    )
+
+
+def run_benchmarks(
+    backend: str = "tree", names: Optional[List[str]] = None, repeat: int = 3
+) -> List[BenchResult]:
+    """
+    Parses and evaluates each benchmark repeat times, keeping the best times,
+    then once more with tracemalloc to measure peak memory
+    """
+    benchmarks = BENCHMARKS
+    if names:
+        unknown = set(names) - {benchmark.name for benchmark in BENCHMARKS}
+        if unknown:
+            raise ValueError(f"unknown benchmarks {', '.join(sorted(unknown))}")
+        benchmarks = [b for b in BENCHMARKS if b.name in names]
+    return [run_benchmark(b, backend, repeat) for b in benchmarks]
+
+
+def format_results(results: List[BenchResult]) -> str:
+    lines = [
+        f"{'benchmark':<12}{'parse (ms)':>12}{'eval (ms)':>12}"
+        f"{'calls/s':>12}{'peak (KiB)':>12}"
+    ]
+    for result in results:
+        calls = f"{result.calls_per_sec:.0f}" if result.calls_per_sec else "-"
+        lines.append(
+            f"{result.name:<12}{result.parse_time * 1000:>12.2f}"
+            f"{result.eval_time * 1000:>12.2f}{calls:>12}"
+            f"{result.peak_memory / 1024:>12.0f}"
+        )
+    return "\n".join(lines)
+
+
+def save_baseline(results: List[BenchResult], backend: str, path: str):
+    """
+    Baselines are kept per backend, saving one backend keeps the others
+    already in the file
+    """
+    try:
+        with open(path) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+    baseline[backend] = {result.name: asdict(result) for result in results}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str, backend: str) -> Dict[str, BenchResult]:
+    with open(path) as f:
+        baseline = json.load(f).get(backend, {})
+    return {name: BenchResult(**result) for name, result in baseline.items()}
+
+
+def compare(
+    results: List[BenchResult], baseline: Dict[str, BenchResult], threshold: float
+) -> List[str]:
+    """
+    Returns a description of every benchmark whose parse plus eval time grew
+    by more than threshold (a fraction) over its baseline
+    """
+    regressions = []
+    for result in results:
+        base = baseline.get(result.name)
+        if base is None:
+            continue
+        before = base.parse_time + base.eval_time
+        after = result.parse_time + result.eval_time
+        if after > before * (1 + threshold):
+            regressions.append(
+                f"{result.name}: {before * 1000:.2f}ms -> {after * 1000:.2f}ms "
+                f"(+{(after / before - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def run_bench(
+    backend: str = "tree",
+    names: Optional[List[str]] = None,
+    repeat: int = 3,
+    save: Optional[str] = None,
+    baseline: Optional[str] = None,
+    threshold: float = 0.1,
+) -> int:
+    """Runs the suite for the command line. Returns the exit status"""
+    results = run_benchmarks(backend, names, repeat)
+    print(format_results(results))
+
+    status = 0
+    if baseline:
+        regressions = compare(results, load_baseline(baseline, backend), threshold)
+        for regression in regressions:
+            print("regression:", regression)
+        if regressions:
+            status = 1
+    if save:
+        save_baseline(results, backend, save)
+    return status
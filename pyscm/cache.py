@@ -0,0 +1,176 @@
+import hashlib
+import io
+import marshal
+import os
+import sys
+from typing import Any, Callable, Iterator, List, Optional, Tuple
+
+from . import number, parse
+from .number import Rational
+from .parse import Parse, Symbol, Token, TokenType, intern
+
+CACHE_DIR = "__pyscmcache__"
+
+
+def _reader_version() -> Optional[bytes]:
+    """
+    A digest of the source of the reader, the number literals it builds and
+    this module's encoding. Changing any of them changes what a file parses
+    to, so the cache is invalidated without a version to remember to bump.
+    None when the source can't be read, then nothing is cached
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in (parse.__file__, number.__file__, __file__):
+        try:
+            with open(path, "rb") as f:  # type: ignore
+                digest.update(f.read())
+        except (OSError, TypeError):
+            return None
+    return digest.digest()
+
+
+READER_VERSION = _reader_version()
+
+
+def cache_path(path: str) -> str:
+    """
+    Where the parsed form of a file is cached, next to it in the same way
+    python keeps __pycache__
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    tag = sys.implementation.cache_tag or "python"
+    return os.path.join(directory, CACHE_DIR, f"{name}.{tag}.bin")
+
+
+def load(path: str, parser: Parse) -> Iterator[Tuple[bool, Any]]:
+    """
+    Yields the parsed top level expressions of the file at path like
+    Parse.parse does. They are read from the cache when it holds an entry for
+    the same contents and interpreter version, otherwise the file is parsed
+    and the cache entry rewritten. Raises OSError if path can't be read
+    """
+    return load_analyzed(path, parser)[0]
+
+
+def load_analyzed(
+    path: str,
+    parser: Parse,
+    analyze: Optional[Callable[[List[Any]], Optional[List[str]]]] = None,
+) -> Tuple[Iterator[Tuple[bool, Any]], Optional[List[str]]]:
+    """
+    load, along with what analyze returned for the parsed forms when they
+    were cached, or None. Forms read from the cache are decoded as they are
+    consumed, so they can be evaluated before the rest are decoded
+    """
+    with open(path, "rb") as f:
+        source = f.read()
+    if READER_VERSION is None:
+        return parser.parse(io.StringIO(source.decode("utf-8"))), None
+    digest = hashlib.blake2b(source, digest_size=16).digest()
+    location = cache_path(path)
+
+    entry = _read(location, digest)
+    if entry is not None and (entry[1] is not None or analyze is None):
+        encoded, analysis = entry
+        constants = {}
+        forms = ((True, decode(form, constants)) for form in encoded)
+        return forms, analysis
+
+    parsed = list(parser.parse(io.StringIO(source.decode("utf-8"))))
+    # a file with errors is reported the same way every time, only files
+    # that parse cleanly are cached
+    analysis = None
+    if all(status for status, _ in parsed):
+        forms = [form for _, form in parsed]
+        if analyze is not None:
+            analysis = analyze(forms)
+        _write(location, digest, forms, analysis)
+    return iter(parsed), analysis
+
+
+def _read(location: str, digest: bytes):
+    """The encoded forms and the analysis cached at location, None if stale"""
+    try:
+        with open(location, "rb") as f:
+            version, cached_digest, encoded, analysis = marshal.load(f)
+        if version != READER_VERSION or cached_digest != digest:
+            return None
+        if type(encoded) is not list:
+            return None
+        return encoded, analysis
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+
+def _write(
+    location: str, digest: bytes, forms: List[Any], analysis: Optional[List[str]]
+):
+    # the cache is only an optimization, failing to write it (a read only
+    # directory, data nested too deeply for marshal) is not an error
+    try:
+        encoded = [encode(f) for f in forms]
+        data = marshal.dumps((READER_VERSION, digest, encoded, analysis))
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        # written to a temporary file first, so readers never see half a file
+        temporary = f"{location}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(data)
+        os.replace(temporary, location)
+    except (OSError, ValueError, RecursionError):
+        pass
+
+
+def encode(exp):
+    """
+    Turns a parsed expression into something marshal can store. Symbols
+    become their name, string constants a 1-tuple, rationals a 2-tuple of
+    numerator and denominator and other constants their value, which marshal
+    keeps the type of
+    """
+    if isinstance(exp, Symbol):
+        return exp.literal
+    elif isinstance(exp, Token):
+        if exp.token_type == TokenType.STRING:
+            return (exp.literal,)
+        elif isinstance(exp.literal, Rational):
+            return (exp.literal.numerator, exp.literal.denominator)
+        return exp.literal
+    return [encode(e) for e in exp]
+
+
+_CONSTANT_TYPES = {
+    int: TokenType.INT,
+    float: TokenType.FLOAT,
+    bool: TokenType.BOOLEAN,
+}
+
+
+def decode(exp, constants=None):
+    """
+    constants maps the values already decoded to their token, so equal
+    constants share one, and names to their symbol, which saves looking them
+    up in the weak symbol table again
+    """
+    if constants is None:
+        constants = {}
+    kind = type(exp)
+    if kind is list:
+        return [decode(e, constants) for e in exp]
+    elif kind is str:
+        symbol = constants.get(exp)
+        if symbol is None:
+            symbol = constants[exp] = intern(exp)
+        return symbol
+
+    # the type is part of the key, 1, 1.0 and True are equal in python
+    key = (kind, exp)
+    token = constants.get(key)
+    if token is None:
+        if kind is tuple and len(exp) == 2:
+            token = Token(TokenType.RATIONAL, Rational(*exp))
+        elif kind is tuple:
+            token = Token(TokenType.STRING, exp[0])
+        else:
+            token = Token(_CONSTANT_TYPES[kind], exp)
+        constants[key] = token
+    return token
@@ -0,0 +1,492 @@
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Tuple
+
+from .env import Env, primitive
+from .evaluate import EvalError, EvalResult, EvalStatus
+from .let import Let, parse_let
+from .limits import LimitExceeded, Meter
+from .memoize import expand_define_memoized
+from .parse import CONSTANT_TYPES, Parse, Token, TokenType
+from .profiler import Profiler
+from .resolve import (
+    Scope,
+    let_scope,
+    partial_scope,
+    procedure_scope,
+    resolve,
+)
+
+# marks a missing binding, None is a perfectly valid value to bind
+_MISSING = object()
+# fills the slots of internal defines until they are assigned
+_UNASSIGNED = object()
+
+# compiled code takes the call frame to run in, None at the top level
+Code = Callable[[Optional[list]], Any]
+
+
+@dataclass(repr=False, eq=False)
+class CompiledProcedure:
+    """
+    A user defined procedure whose body has already been compiled. frame is
+    the call frame the lambda was evaluated in, nlocals the number of slots
+    a call frame holds and apply is Compile.call
+    """
+
+    params: List[str]
+    nlocals: int
+    body: Code
+    frame: Optional[list]
+    apply: Callable[["CompiledProcedure", List[Any]], Any]
+    name: str = "lambda"
+
+    def __call__(self, *args):
+        return self.apply(self, list(args))
+
+    def __repr__(self):
+        return f"#<procedure {self.name}>"
+
+
+class TailCall:
+    """
+    Returned by applications in tail position instead of making the call. The
+    caller's trampoline in Compile.call makes it, so tail calls don't grow the
+    python stack
+    """
+
+    __slots__ = ("procedure", "args")
+
+    def __init__(self, procedure, args):
+        self.procedure = procedure
+        self.args = args
+
+
+@dataclass
+class Compile:
+    """
+    Turns parsed expressions into a tree of python closures taking the call
+    frame to run in. All syntactic analysis (special forms, constants,
+    builtins, variable references) happens once at compile time, so running a
+    procedure body never looks at tokens again. Local variables are resolved
+    to frame slots, only globals are looked up by name
+    """
+
+    parser: Parse
+    env: Env
+    profiler: Optional[Profiler] = None
+    meter: Optional[Meter] = None
+
+    def __post_init__(self):
+        self.special_forms = {
+            TokenType.DEFINE: self.compile_define,
+            TokenType.DEFINE_MEMOIZED: self.compile_define_memoized,
+            TokenType.SET: self.compile_set,
+            TokenType.IF: self.compile_if,
+            TokenType.LAMBDA: self.compile_lambda,
+            TokenType.BEGIN: self.compile_begin,
+            TokenType.LET: self.compile_let,
+            TokenType.LET_STAR: self.compile_let,
+            TokenType.LETREC: self.compile_let,
+        }
+
+    def evaluate(self, exp) -> EvalResult:
+        try:
+            result = self.compile(exp)(None)
+        except LimitExceeded as e:
+            return EvalResult(EvalStatus.LIMIT_EXCEEDED, str(e))
+        except EvalError as e:
+            return EvalResult(EvalStatus.FAILURE, str(e))
+        except Exception as e:
+            return EvalResult(EvalStatus.FAILURE, e)
+        return EvalResult(EvalStatus.SUCCESS, result)
+
+    def compile(self, exp, scopes: Tuple[Scope, ...] = (), tail: bool = False) -> Code:
+        """
+        scopes are the scopes of the enclosing lambdas, innermost first. tail
+        is set for expressions whose value is returned as the value of the
+        enclosing procedure body
+        """
+        if isinstance(exp, Token):
+            return self.compile_token(exp, scopes)
+
+        if len(exp) == 0:
+            raise EvalError("attempt to call a non procedure")
+        head = exp[0]
+        if isinstance(head, Token):
+            special_form = self.special_forms.get(head.token_type)
+            if special_form is not None:
+                return special_form(exp, scopes, tail)
+        return self.compile_application(exp, scopes, tail)
+
+    def compile_token(self, exp: Token, scopes: Tuple[Scope, ...]) -> Code:
+        if exp.token_type == TokenType.IDENT:
+            return self.compile_variable(exp.literal, scopes)  # type: ignore
+
+        if exp.token_type in CONSTANT_TYPES:
+            value = exp.literal
+        else:
+            # builtins can't be rebound, so they are looked up once
+            value = self.env.get(exp.token_type)
+            if value is None:
+                raise EvalError("ill-formed special form")
+        return lambda frame: value
+
+    def compile_variable(self, name: str, scopes: Tuple[Scope, ...]) -> Code:
+        depth, slot = resolve(name, scopes)
+        if slot is None:
+            env = self.env
+
+            def global_variable(frame):
+                value = env.get(name, _MISSING)
+                if value is _MISSING:
+                    raise EvalError(f"undefined variable {name}")
+                return value
+
+            return global_variable
+
+        # parameters are always bound, only slots of internal defines can be
+        # read before they are assigned
+        if slot <= scopes[depth].nparams:
+            if depth == 0:
+                return lambda frame: frame[slot]  # type: ignore
+            elif depth == 1:
+                return lambda frame: frame[0][slot]  # type: ignore
+            elif depth == 2:
+                return lambda frame: frame[0][0][slot]  # type: ignore
+
+        def variable(frame):
+            for _ in range(depth):
+                frame = frame[0]
+            value = frame[slot]
+            if value is _UNASSIGNED:
+                raise EvalError(f"undefined variable {name}")
+            return value
+
+        return variable
+
+    def compile_application(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        operator = self.compile(exp[0], scopes)
+        args = [self.compile(arg, scopes) for arg in exp[1:]]
+
+        # builtins never grow the stack, so they are called directly even in
+        # tail position
+        head = exp[0]
+        if isinstance(head, Token) and head.token_type != TokenType.IDENT:
+            if self.profiler is None:
+                builtin = primitive(self.env, head.token_type, len(args))
+                if builtin is not None:
+                    return self.compile_primitive(builtin, args)
+            tail = False
+        call = TailCall if tail else self.call
+
+        # the common arities avoid building an intermediate list of closures
+        if len(args) == 0:
+            return lambda frame: call(operator(frame), [])
+        elif len(args) == 1:
+            (a,) = args
+            return lambda frame: call(operator(frame), [a(frame)])
+        elif len(args) == 2:
+            a, b = args
+            return lambda frame: call(operator(frame), [a(frame), b(frame)])
+        return lambda frame: call(operator(frame), [arg(frame) for arg in args])
+
+    def compile_primitive(self, builtin, args) -> Code:
+        """A call to a builtin, which skips call and the argument list"""
+        if len(args) == 0:
+            return lambda frame: builtin()
+        elif len(args) == 1:
+            (a,) = args
+            return lambda frame: builtin(a(frame))
+        elif len(args) == 2:
+            a, b = args
+            return lambda frame: builtin(a(frame), b(frame))
+        elif len(args) == 3:
+            a, b, c = args
+            return lambda frame: builtin(a(frame), b(frame), c(frame))
+        return lambda frame: builtin(*[arg(frame) for arg in args])
+
+    def call(self, procedure, args):
+        if self.profiler is not None:
+            return self.profiled_call(procedure, args)
+
+        meter = self.meter
+        # trampoline: keep making the tail calls procedure bodies hand back
+        while True:
+            if type(procedure) is CompiledProcedure:
+                nparams = len(procedure.params)
+                # the function should be called with expected number of arguments
+                if nparams != len(args):
+                    raise EvalError(
+                        f"function expects {nparams} arguments, got {len(args)} instead"
+                    )
+                if meter is not None:
+                    meter.step()
+                frame = [procedure.frame, *args]
+                if procedure.nlocals > nparams:
+                    frame.extend([_UNASSIGNED] * (procedure.nlocals - nparams))
+                result = procedure.body(frame)
+                if type(result) is TailCall:
+                    procedure = result.procedure
+                    args = result.args
+                    continue
+                return result
+            if callable(procedure):
+                return procedure(*args)
+            raise EvalError("attempt to call a non procedure")
+
+    def profiled_call(self, procedure, args):
+        """call, reporting to the profiler"""
+        profiler = self.profiler
+        assert profiler is not None
+        meter = self.meter
+        profiled = False
+        try:
+            while True:
+                if type(procedure) is CompiledProcedure:
+                    nparams = len(procedure.params)
+                    if nparams != len(args):
+                        raise EvalError(
+                            f"function expects {nparams} arguments, got {len(args)} instead"
+                        )
+                    if meter is not None:
+                        meter.step()
+                    if profiled:
+                        profiler.tail(procedure.name)
+                    else:
+                        profiler.enter(procedure.name)
+                        profiled = True
+                    frame = [procedure.frame, *args]
+                    frame.extend([_UNASSIGNED] * (procedure.nlocals - nparams))
+                    result = procedure.body(frame)
+                    if type(result) is TailCall:
+                        procedure = result.procedure
+                        args = result.args
+                        continue
+                    return result
+                if callable(procedure):
+                    profiler.builtin(procedure)
+                    return procedure(*args)
+                raise EvalError("attempt to call a non procedure")
+        finally:
+            if profiled:
+                profiler.exit()
+
+    def compile_body(self, body, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        if len(body) == 0:
+            raise EvalError("ill-formed special form")
+        if len(body) == 1:
+            return self.compile(body[0], scopes, tail)
+        init = [self.compile(exp, scopes) for exp in body[:-1]]
+        last = self.compile(body[-1], scopes, tail)
+
+        def sequence(frame):
+            for exp in init:
+                exp(frame)
+            return last(frame)
+
+        return sequence
+
+    def compile_begin(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        return self.compile_body(exp[1:], scopes, tail)
+
+    def compile_define(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        if len(exp) < 3:
+            raise EvalError("ill-formed definition")
+
+        target = exp[1]
+        if isinstance(target, Token):
+            if target.token_type != TokenType.IDENT or len(exp) != 3:
+                raise EvalError("ill-formed definition")
+            name: str = target.literal  # type: ignore
+        else:
+            # (define (name params...) body...) is shorthand for a named lambda
+            if len(target) == 0:
+                raise EvalError("ill-formed definition")
+            fn_name = target[0]
+            if not isinstance(fn_name, Token) or fn_name.token_type != TokenType.IDENT:
+                raise EvalError("ill-formed definition")
+            name = fn_name.literal  # type: ignore
+
+        if scopes and scopes[0].closed:
+            raise EvalError("ill-formed definition")
+        # defines inside a lambda body bind a slot of the call frame, the slot
+        # is allocated before compiling the value so it can refer to itself
+        slot = scopes[0].define(name) if scopes else None
+        if isinstance(target, Token):
+            value = self.compile(exp[2], scopes)
+        else:
+            value = self.compile_procedure(target[1:], exp[2:], scopes)
+
+        env = self.env
+
+        def define(frame):
+            result = value(frame)
+            if type(result) is CompiledProcedure and result.name == "lambda":
+                result.name = name
+            if slot is None:
+                env[name] = result
+            else:
+                frame[slot] = result  # type: ignore
+
+        return define
+
+    def compile_define_memoized(
+        self, exp, scopes: Tuple[Scope, ...], tail: bool
+    ) -> Code:
+        expansion = expand_define_memoized(exp)
+        if expansion is None:
+            raise EvalError("ill-formed definition")
+        return self.compile(expansion, scopes, tail)
+
+    def compile_set(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        if len(exp) != 3:
+            raise EvalError("ill-formed special form")
+        target = exp[1]
+        if not isinstance(target, Token) or target.token_type != TokenType.IDENT:
+            raise EvalError("argument of wrong type")
+        name: str = target.literal  # type: ignore
+        value = self.compile(exp[2], scopes)
+
+        depth, slot = resolve(name, scopes)
+        if slot is None:
+            env = self.env
+
+            def set_global(frame):
+                # set! checks if binding already exists before overwriting it
+                defining_env = env.find(name)
+                if defining_env is None:
+                    raise EvalError(f"unbound variable {name}")
+                defining_env[name] = value(frame)
+
+            return set_global
+
+        def set_(frame):
+            result = value(frame)
+            for _ in range(depth):
+                frame = frame[0]
+            frame[slot] = result
+
+        return set_
+
+    def compile_if(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        if len(exp) not in (3, 4):
+            raise EvalError("ill-formed special form")
+        test = self.compile(exp[1], scopes)
+        consequent = self.compile(exp[2], scopes, tail)
+        if len(exp) == 4:
+            alternative = self.compile(exp[3], scopes, tail)
+        else:
+            alternative = lambda frame: None
+
+        # everything except #f counts as true
+        return lambda frame: (
+            alternative(frame) if test(frame) is False else consequent(frame)
+        )
+
+    def compile_let(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        """
+        A let, let* or letrec allocates one frame holding its variables and
+        the names defined in its body, chained to the current frame like the
+        call frame of a procedure but without a procedure or a call
+        """
+        let = parse_let(exp)
+        if let is None:
+            raise EvalError("ill-formed special form")
+        if let.name is not None:
+            return self.compile_named_let(let, scopes, tail)
+
+        scope = let_scope(let)
+        inner = (scope, *scopes)
+        if let.token_type == TokenType.LET:
+            inits = [self.compile(init, scopes) for init in let.inits]
+        elif let.token_type == TokenType.LET_STAR:
+            # an init only sees the variables bound before it
+            inits = [
+                self.compile(init, (partial_scope(scope, i), *scopes))
+                for i, init in enumerate(let.inits)
+            ]
+        else:
+            inits = [self.compile(init, inner) for init in let.inits]
+        body = self.compile_body(let.body, inner, tail)
+        nlocals = len(scope.names)
+
+        if let.token_type == TokenType.LET:
+            # the common sizes build the frame in one go
+            if nlocals == len(inits) == 1:
+                (a,) = inits
+                return lambda frame: body([frame, a(frame)])
+            elif nlocals == len(inits) == 2:
+                a, b = inits
+                return lambda frame: body([frame, a(frame), b(frame)])
+
+            def let_(frame):
+                values = [frame]
+                values.extend([init(frame) for init in inits])
+                if nlocals > len(inits):
+                    values.extend([_UNASSIGNED] * (nlocals - len(inits)))
+                return body(values)
+
+            return let_
+
+        def sequential_let(frame):
+            values = [frame]
+            values.extend([_UNASSIGNED] * nlocals)
+            for slot, init in enumerate(inits, 1):
+                values[slot] = init(values)
+            return body(values)
+
+        return sequential_let
+
+    def compile_named_let(
+        self, let: Let, scopes: Tuple[Scope, ...], tail: bool
+    ) -> Code:
+        """
+        The procedure of a named let is bound to its name in a frame of its
+        own and then called, so loops are tail calls on the trampoline
+        """
+        name: str = let.name.literal  # type: ignore
+        inits = [self.compile(init, scopes) for init in let.inits]
+        # the slot is assigned before the procedure can run
+        make_procedure = self.compile_procedure(
+            let.params, let.body, (Scope([name], 1), *scopes)
+        )
+        call = TailCall if tail else self.call
+
+        def named_let(frame):
+            args = [init(frame) for init in inits]
+            values = [frame, None]
+            procedure = make_procedure(values)
+            procedure.name = name
+            values[1] = procedure
+            return call(procedure, args)
+
+        return named_let
+
+    def compile_lambda(self, exp, scopes: Tuple[Scope, ...], tail: bool) -> Code:
+        if len(exp) < 3:
+            raise EvalError("ill-formed special form")
+        return self.compile_procedure(exp[1], exp[2:], scopes)
+
+    def compile_procedure(self, params, body, scopes: Tuple[Scope, ...]) -> Code:
+        if isinstance(params, Token):
+            raise EvalError("ill-formed special form")
+        for param in params:
+            if not isinstance(param, Token) or param.token_type != TokenType.IDENT:
+                raise EvalError("ill-formed special form")
+        names = [param.literal for param in params]
+        if len(set(names)) != len(names):
+            raise EvalError("ill-formed special form")
+        scope = procedure_scope(params, body)
+        code = self.compile_body(body, (scope, *scopes), True)
+        # defines nested in other forms only get their slots while compiling
+        nlocals = len(scope.names)
+        call = self.call
+        profiler = self.profiler
+        if profiler is None:
+            return lambda frame: CompiledProcedure(names, nlocals, code, frame, call)
+
+        def make_procedure(frame):
+            profiler.allocate()
+            return CompiledProcedure(names, nlocals, code, frame, call)
+
+        return make_procedure
@@ -1,27 +1,226 @@
-import math
-import operator as op
+from types import MappingProxyType
 
+from .memoize import memo_stats, memoize
+from .number import (
+    add,
+    ceiling,
+    denominator,
+    divide,
+    equal,
+    exact,
+    expt,
+    floor,
+    greater,
+    greater_equal,
+    inexact,
+    is_exact,
+    is_inexact,
+    is_integer,
+    is_number,
+    is_rational,
+    less,
+    less_equal,
+    modulo,
+    multiply,
+    numerator,
+    plus,
+    quotient,
+    remainder,
+    scm_abs,
+    scm_max,
+    scm_min,
+    scm_round,
+    sqrt,
+    subtract,
+    times,
+    truncate,
+)
+from .pair import (
+    append,
+    car,
+    cdr,
+    cons,
+    for_each,
+    is_null,
+    is_pair,
+    length,
+    reverse,
+    scm_list,
+    scm_map,
+)
 from .parse import TokenType
-from .procedure import ceiling, divide, floor, reduce, scm_round
-
-global_env = {
-    TokenType.PLUS: lambda *args: reduce(op.add, *args),
-    TokenType.MINUS: op.sub,
-    TokenType.MULTIPLY: lambda *args: reduce(op.mul, *args),
-    TokenType.DIVIDE: lambda a, b: divide(a, b),
-    TokenType.GREATER_THAN: op.gt,
-    TokenType.LESS_THAN: op.lt,
-    TokenType.GREATER_EQUAL: op.ge,
-    TokenType.LESS_EQUAL: op.le,
-    TokenType.EQUAL: op.eq,
-    TokenType.SQRT: math.sqrt,
-    TokenType.FLOOR: lambda n: floor(n),
-    TokenType.CEIL: lambda n: ceiling(n),
-    TokenType.ROUND: lambda n: scm_round(n),
-    TokenType.MAX: max,
-    TokenType.MIN: min,
-    TokenType.ABS: abs,
-    TokenType.BEGIN: lambda *args: args[-1],
-    "#t": True,
-    "#f": False,
+from .strings import (
+    display,
+    get_output_string,
+    is_string,
+    is_symbol,
+    newline,
+    number_to_string,
+    open_output_string,
+    string_append,
+    string_length,
+    string_split,
+    string_to_number,
+    string_to_symbol,
+    substring,
+    symbol_to_string,
+    write_string,
+)
+from .vector import (
+    is_vector,
+    list_to_vector,
+    make_vector,
+    vector,
+    vector_fill,
+    vector_length,
+    vector_map,
+    vector_ref,
+    vector_set,
+    vector_sum,
+    vector_to_list,
+)
+
+# marks a missing binding, None is a perfectly valid value to bind
+_MISSING = object()
+
+
+class Env:
+    """
+    A frame of bindings chained to the frame it was created in. Lookups walk
+    outwards until the name is found, so calling a procedure only allocates one
+    small frame for its parameters
+    """
+
+    __slots__ = ("vars", "outer")
+
+    def __init__(self, vars=None, outer=None):
+        self.vars = {} if vars is None else vars
+        self.outer = outer
+
+    def find(self, name):
+        """Returns the innermost frame binding name or None"""
+        env = self
+        while env is not None:
+            if name in env.vars:
+                return env
+            env = env.outer
+        return None
+
+    def get(self, name, default=None):
+        env = self
+        while env is not None:
+            value = env.vars.get(name, _MISSING)
+            if value is not _MISSING:
+                return value
+            env = env.outer
+        return default
+
+    def __getitem__(self, name):
+        value = self.get(name, _MISSING)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        self.vars[name] = value
+
+    def __contains__(self, name):
+        return self.find(name) is not None
+
+
+# the builtins, read only so no interpreter can change them for the others
+BUILTINS = MappingProxyType(
+    {
+        TokenType.PLUS: plus,
+        TokenType.MINUS: subtract,
+        TokenType.MULTIPLY: times,
+        TokenType.DIVIDE: divide,
+        TokenType.GREATER_THAN: greater,
+        TokenType.LESS_THAN: less,
+        TokenType.GREATER_EQUAL: greater_equal,
+        TokenType.LESS_EQUAL: less_equal,
+        TokenType.EQUAL: equal,
+        TokenType.SQRT: sqrt,
+        TokenType.FLOOR: floor,
+        TokenType.CEIL: ceiling,
+        TokenType.ROUND: scm_round,
+        TokenType.TRUNCATE: truncate,
+        TokenType.MAX: scm_max,
+        TokenType.MIN: scm_min,
+        TokenType.ABS: scm_abs,
+        TokenType.QUOTIENT: quotient,
+        TokenType.REMAINDER: remainder,
+        TokenType.MODULO: modulo,
+        TokenType.EXPT: expt,
+        TokenType.EXACT: exact,
+        TokenType.INEXACT: inexact,
+        TokenType.IS_EXACT: is_exact,
+        TokenType.IS_INEXACT: is_inexact,
+        TokenType.IS_NUMBER: is_number,
+        TokenType.IS_INTEGER: is_integer,
+        TokenType.IS_RATIONAL: is_rational,
+        TokenType.NUMERATOR: numerator,
+        TokenType.DENOMINATOR: denominator,
+        TokenType.CONS: cons,
+        TokenType.CAR: car,
+        TokenType.CDR: cdr,
+        TokenType.LIST: scm_list,
+        TokenType.LENGTH: length,
+        TokenType.APPEND: append,
+        TokenType.REVERSE: reverse,
+        TokenType.MAP: scm_map,
+        TokenType.FOR_EACH: for_each,
+        TokenType.IS_NULL: is_null,
+        TokenType.IS_PAIR: is_pair,
+        TokenType.MAKE_VECTOR: make_vector,
+        TokenType.VECTOR: vector,
+        TokenType.VECTOR_REF: vector_ref,
+        TokenType.VECTOR_SET: vector_set,
+        TokenType.VECTOR_LENGTH: vector_length,
+        TokenType.VECTOR_FILL: vector_fill,
+        TokenType.VECTOR_MAP: vector_map,
+        TokenType.VECTOR_SUM: vector_sum,
+        TokenType.VECTOR_TO_LIST: vector_to_list,
+        TokenType.LIST_TO_VECTOR: list_to_vector,
+        TokenType.IS_VECTOR: is_vector,
+        TokenType.MEMOIZE: memoize,
+        TokenType.MEMO_STATS: memo_stats,
+        TokenType.IS_STRING: is_string,
+        TokenType.IS_SYMBOL: is_symbol,
+        TokenType.STRING_LENGTH: string_length,
+        TokenType.STRING_APPEND: string_append,
+        TokenType.SUBSTRING: substring,
+        TokenType.STRING_SPLIT: string_split,
+        TokenType.STRING_TO_SYMBOL: string_to_symbol,
+        TokenType.SYMBOL_TO_STRING: symbol_to_string,
+        TokenType.NUMBER_TO_STRING: number_to_string,
+        TokenType.STRING_TO_NUMBER: string_to_number,
+        TokenType.OPEN_OUTPUT_STRING: open_output_string,
+        TokenType.GET_OUTPUT_STRING: get_output_string,
+        TokenType.WRITE_STRING: write_string,
+        TokenType.DISPLAY: display,
+        TokenType.NEWLINE: newline,
+    }
+)
+
+# the base environment of every interpreter. Each interpreter binds its own
+# definitions in a frame chained to it, so creating one copies nothing
+global_env = Env(BUILTINS)
+
+# versions of varargs builtins for calls with a fixed number of arguments,
+# which skip building the argument tuple and reduce
+FAST_PATHS = {
+    (TokenType.PLUS, 2): add,
+    (TokenType.MULTIPLY, 2): multiply,
 }
+
+
+def primitive(env: Env, token_type: TokenType, nargs: int):
+    """
+    The builtin named by token_type for a call with nargs arguments. Builtins
+    can't be rebound, so backends look this up once and call it directly
+    """
+    builtin = env.get(token_type)
+    if not callable(builtin):
+        return None
+    return FAST_PATHS.get((token_type, nargs), builtin)
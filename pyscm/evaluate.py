@@ -1,15 +1,30 @@
-from copy import deepcopy
 from dataclasses import dataclass
 from enum import Enum, unique
-from typing import Any, Optional
+from typing import Any, List, Optional, Union
 
-from .parse import Parse, Token, TokenType
+from .env import Env, primitive
+from .let import LET_FORMS, Let, parse_let
+from .limits import LimitExceeded, Meter
+from .memoize import expand_define_memoized
+from .parse import CONSTANT_TYPES, Parse, Token, TokenType
+from .procedure import Procedure
+from .profiler import Profiler
+
+
+# marks a missing binding, None is a perfectly valid value to bind
+_MISSING = object()
 
 
 @unique
 class EvalStatus(Enum):
     SUCCESS = 0
     FAILURE = 1
+    # the evaluation went over a limit of its Meter
+    LIMIT_EXCEEDED = 2
+
+
+class EvalError(Exception):
+    """Raised by backends that report failures with exceptions"""
 
 
 @dataclass
@@ -21,176 +36,346 @@ class EvalResult:
 @dataclass
 class Evaluate:
     parser: Parse
-    env: dict
+    env: Env
+    profiler: Optional[Profiler] = None
+    meter: Optional[Meter] = None
 
-    def evaluate(self, exp) -> EvalResult:
-        if isinstance(exp, Token):
-            if exp.token_type == TokenType.IDENT:
-                if self.env.get(exp.literal, None) == None:
-                    return EvalResult(
-                        EvalStatus.FAILURE, f"undefined variable {exp.literal}"
-                    )
-                else:
+    def evaluate(self, exp, env: Optional[Env] = None) -> EvalResult:
+        if env is None:
+            # a top level expression, nested ones always pass their env
+            try:
+                return self.evaluate(exp, self.env)
+            except LimitExceeded as e:
+                return EvalResult(EvalStatus.LIMIT_EXCEEDED, str(e))
+            except RecursionError as e:
+                # runaway recursion, the other backends report it the same way
+                return EvalResult(EvalStatus.FAILURE, e)
+
+        # expressions in tail position (if branches, the last expression of
+        # begin and of procedure bodies) replace exp and go around the loop
+        # instead of recursing, so tail calls run in constant python stack.
+        # profiled is set once a procedure is applied, later tail calls
+        # replace it in the profile
+        profiled = False
+        try:
+            while True:
+                if isinstance(exp, Token):
+                    return self.evaluate_token(exp, env)
+
+                if len(exp) == 0:
                     return EvalResult(
-                        EvalStatus.SUCCESS,
-                        self.parser.get_token(self.env.get(exp.literal)),
+                        EvalStatus.FAILURE, "attempt to call a non procedure"
                     )
-            return EvalResult(EvalStatus.SUCCESS, exp)
-
-        # evaluate the first element of the list this might be a function, macro or
-        # special operator (terms taken from
-        # https://en.wikipedia.org/wiki/Lisp_(programming_language))
-        operator = self.evaluate(exp[0])
-        if operator.status == EvalStatus.FAILURE:
-            return operator
-        op_token = None
-        if operator.result != None:
-            try:
-                iter(operator.result)
-            except TypeError:
-                op_token = operator.result.token_type
-            else:
-                pass
 
-        args = []
-        for i, arg in enumerate(exp[1:]):
-            # set! and define don't take expression. They just bind names. Hence,
-            # we assume that the first argument is a Token of type IDENT
-            if i == 0 and (op_token == TokenType.SET or op_token == TokenType.DEFINE):
-                if isinstance(arg, Token):
-                    if arg.token_type != TokenType.IDENT:
-                        return EvalResult(EvalStatus.FAILURE, "argument of wrong type")
-                    else:
-                        args.append(arg.literal)
-                        continue
-                else:
-                    assert len(exp) > 2
-
-                    # check if we have a valid function call expression
-                    fn_name = arg[0]
-                    if (
-                        not isinstance(fn_name, Token)
-                        or fn_name.token_type != TokenType.IDENT
-                    ):
-                        return EvalResult(EvalStatus.FAILURE, "ill-formed definition")
-                    fn_args = arg[1:]
-                    for fn_arg in fn_args:
-                        if (
-                            not isinstance(fn_arg, Token)
-                            or fn_arg.token_type != TokenType.IDENT
-                        ):
+                # special forms don't evaluate all of their arguments, so they are
+                # handled before the operator is looked up. A named let makes
+                # the procedure to apply itself
+                procedure = None
+                args: List[Any] = []
+                head = exp[0]
+                if isinstance(head, Token):
+                    if head.token_type == TokenType.DEFINE:
+                        return self.evaluate_define(exp, env)
+                    elif head.token_type == TokenType.DEFINE_MEMOIZED:
+                        exp = expand_define_memoized(exp)
+                        if exp is None:
                             return EvalResult(
                                 EvalStatus.FAILURE, "ill-formed definition"
                             )
+                        continue
+                    elif head.token_type == TokenType.SET:
+                        return self.evaluate_set(exp, env)
+                    elif head.token_type == TokenType.LAMBDA:
+                        return self.make_procedure(exp[1], exp[2:], env)
+                    elif head.token_type == TokenType.IF:
+                        if len(exp) not in (3, 4):
+                            return EvalResult(
+                                EvalStatus.FAILURE, "ill-formed special form"
+                            )
+                        test = self.evaluate(exp[1], env)
+                        if test.status == EvalStatus.FAILURE:
+                            return test
 
-                    args = [
-                        fn_name.literal,
-                        [self.parser.get_token("lambda"), fn_args, exp[2]],
-                    ]
-                    break
-
-            if op_token == TokenType.LAMBDA:
-                return EvalResult(EvalStatus.SUCCESS, exp)
-
-            argi = self.evaluate(arg)
-            if argi.status == EvalStatus.FAILURE:
-                return argi
-            if argi.result == None:
-                continue
-
-            # evaluate different branches for if statement. The dead branch is
-            # never evaluated
-            if op_token == TokenType.IF:
-                if argi.result.literal == "#t":
-                    return self.evaluate(exp[2])
-                else:
-                    return self.evaluate(exp[3])
-            if isinstance(argi.result, Token):
-                args.append(argi.result.literal)
-            else:
-                args.append(argi.result)
-
-        if operator.result != None:
-            try:
-                iter(operator.result)
-            except TypeError:
-                pass
-            else:
-                op_token = operator.result[0].token_type
+                        # evaluate different branches for if statement. The dead
+                        # branch is never evaluated. Everything except #f counts
+                        # as true
+                        if not self.is_false(test.result):
+                            exp = exp[2]
+                        elif len(exp) == 4:
+                            exp = exp[3]
+                        else:
+                            return EvalResult(EvalStatus.SUCCESS, None)
+                        continue
+                    elif head.token_type == TokenType.BEGIN:
+                        if len(exp) == 1:
+                            return EvalResult(
+                                EvalStatus.FAILURE, "ill-formed special form"
+                            )
+                        result = self.evaluate_body(exp[1:-1], env)
+                        if result.status == EvalStatus.FAILURE:
+                            return result
+                        exp = exp[-1]
+                        continue
+                    elif head.token_type in LET_FORMS:
+                        let = parse_let(exp)
+                        if let is None:
+                            return EvalResult(
+                                EvalStatus.FAILURE, "ill-formed special form"
+                            )
+                        if let.name is None:
+                            frame = self.bind_let(let, env)
+                            if isinstance(frame, EvalResult):
+                                return frame
+                            env = frame
+                            result = self.evaluate_body(let.body[:-1], env)
+                            if result.status == EvalStatus.FAILURE:
+                                return result
+                            exp = let.body[-1]
+                            continue
+                        operator = self.make_named_let(let, env)
+                        if operator.status == EvalStatus.FAILURE:
+                            return operator
+                        started = operator.result
+                        assert started is not None
+                        procedure, args = started
+                    elif head.token_type != TokenType.IDENT and self.profiler is None:
+                        builtin = primitive(self.env, head.token_type, len(exp) - 1)
+                        if builtin is not None:
+                            return self.apply_primitive(builtin, exp[1:], env)
 
-        # set! checks if binding already exists before overwriting it
-        if op_token == TokenType.SET:
-            if self.env.get(args[0], None) == None:
-                return EvalResult(EvalStatus.FAILURE, None)
+                if procedure is None:
+                    # evaluate the first element of the list this might be a
+                    # function, macro or special operator (terms taken from
+                    # https://en.wikipedia.org/wiki/Lisp_(programming_language))
+                    operator = self.evaluate(head, env)
+                    if operator.status == EvalStatus.FAILURE:
+                        return operator
 
-            self.env[args[0]] = args[1]
-            return EvalResult(EvalStatus.SUCCESS, None)
+                    args = []
+                    for arg in exp[1:]:
+                        argi = self.evaluate(arg, env)
+                        if argi.status == EvalStatus.FAILURE:
+                            return argi
+                        args.append(argi.result)
+                    procedure = operator.result
 
-        elif op_token == TokenType.DEFINE:
-            self.env[args[0]] = args[1]
-            return EvalResult(EvalStatus.SUCCESS, None)
+                if not isinstance(procedure, Procedure):
+                    return self.apply(procedure, args)
 
-        elif op_token == TokenType.LAMBDA:
-            assert operator.result != None
+                # the function should be called with expected number of arguments
+                if len(procedure.params) != len(args):
+                    return self.arity_error(procedure, args)
+                if self.meter is not None:
+                    self.meter.step()
 
-            named_args = operator.result[1]
+                if self.profiler is not None:
+                    if profiled:
+                        self.profiler.tail(procedure.name)
+                    else:
+                        self.profiler.enter(procedure.name)
+                        profiled = True
+
+                # parameters are bound in a fresh frame chained to the frame the
+                # procedure was created in. The body itself is never copied
+                env = Env(dict(zip(procedure.params, args)), procedure.env)
+                result = self.evaluate_body(procedure.body[:-1], env)
+                if result.status == EvalStatus.FAILURE:
+                    return result
+                exp = procedure.body[-1]
+        finally:
+            if profiled:
+                self.profiler.exit()  # type: ignore
+
+    def apply(self, procedure, args) -> EvalResult:
+        if isinstance(procedure, Procedure):
             # the function should be called with expected number of arguments
-            if len(named_args) != len(args):
+            if len(procedure.params) != len(args):
+                return self.arity_error(procedure, args)
+            if self.meter is not None:
+                self.meter.step()
+
+            frame = Env(dict(zip(procedure.params, args)), procedure.env)
+            if self.profiler is None:
+                return self.evaluate_body(procedure.body, frame)
+            self.profiler.enter(procedure.name)
+            try:
+                return self.evaluate_body(procedure.body, frame)
+            finally:
+                self.profiler.exit()
+
+        # builtins are plain python callables
+        if callable(procedure):
+            if self.profiler is not None:
+                self.profiler.builtin(procedure)
+            try:
+                return EvalResult(EvalStatus.SUCCESS, procedure(*args))
+            except Exception as e:
+                return EvalResult(EvalStatus.FAILURE, e)
+        return EvalResult(EvalStatus.FAILURE, "attempt to call a non procedure")
+
+    def apply_primitive(self, builtin, args, env: Env) -> EvalResult:
+        """
+        Calls a builtin named directly in the operator position, which skips
+        evaluating the operator and apply's checks
+        """
+        values = []
+        for arg in args:
+            value = self.evaluate(arg, env)
+            if value.status == EvalStatus.FAILURE:
+                return value
+            values.append(value.result)
+        try:
+            return EvalResult(EvalStatus.SUCCESS, builtin(*values))
+        except Exception as e:
+            return EvalResult(EvalStatus.FAILURE, e)
+
+    def evaluate_token(self, exp: Token, env: Env) -> EvalResult:
+        if exp.token_type == TokenType.IDENT:
+            value = env.get(exp.literal, _MISSING)
+            if value is _MISSING:
                 return EvalResult(
-                    EvalStatus.FAILURE,
-                    f"function expects {len(operator.result[1])} arguments, got {len(args)} instead",
+                    EvalStatus.FAILURE, f"undefined variable {exp.literal}"
                 )
+            return EvalResult(EvalStatus.SUCCESS, value)
+        elif exp.token_type in CONSTANT_TYPES:
+            return EvalResult(EvalStatus.SUCCESS, exp.literal)
 
-            # replace named parameters in the function body with the arguments
-            # provided and evaluate the new expression. Make sure to copy the
-            # body to not override the arguments in the function definition
-            # permanently
-            fn_body = deepcopy(operator.result[2])
+        # any other symbol names a builtin, they are keyed by token type
+        builtin = self.env.get(exp.token_type)
+        if builtin is None:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed special form")
+        return EvalResult(EvalStatus.SUCCESS, builtin)
 
-            for i, name in enumerate(named_args):
-                self.replace_token(fn_body, name, self.parser.get_token(args[i]))
+    def call(self, procedure, args):
+        """apply for python callers, returns the value or raises on failure"""
+        result = self.apply(procedure, args)
+        if result.status == EvalStatus.FAILURE:
+            if isinstance(result.result, Exception):
+                raise result.result
+            raise EvalError(result.result)
+        return result.result
 
-            return self.evaluate(fn_body)
+    def arity_error(self, procedure: Procedure, args) -> EvalResult:
+        return EvalResult(
+            EvalStatus.FAILURE,
+            f"function expects {len(procedure.params)} arguments, got {len(args)} instead",
+        )
 
-        elif op_token == TokenType.IDENT:
-            assert operator.result != None
+    def evaluate_body(self, body, env: Env) -> EvalResult:
+        result = EvalResult(EvalStatus.SUCCESS, None)
+        for exp in body:
+            result = self.evaluate(exp, env)
+            if result.status == EvalStatus.FAILURE:
+                return result
+        return result
 
-            fn = operator.result.literal
-            call = [fn]
-            for arg in args:
-                call.append(self.parser.get_token(arg))
+    def evaluate_define(self, exp, env: Env) -> EvalResult:
+        if len(exp) < 3:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed definition")
 
-            return self.evaluate(call)
+        # define doesn't take an expression as its first argument. It just binds
+        # a name, either directly or as a shorthand for a named lambda
+        target = exp[1]
+        if isinstance(target, Token):
+            if target.token_type != TokenType.IDENT:
+                return EvalResult(EvalStatus.FAILURE, "argument of wrong type")
+            value = self.evaluate(exp[2], env)
+            if value.status == EvalStatus.FAILURE:
+                return value
+            if isinstance(value.result, Procedure) and value.result.name == "lambda":
+                value.result.name = target.literal  # type: ignore
+            env[target.literal] = value.result
+            return EvalResult(EvalStatus.SUCCESS, None)
 
-        # check if token exists in env. Call the procedure with the args if it
-        # exists in env
-        elif self.env.get(op_token, None) != None:
-            try:
-                key = op_token
-                if operator.result != None and (
-                    operator.result.literal == "#t" or operator.result.literal == "#f"
-                ):
-                    key = operator.result.literal
-                result = self.env[key](*args)
-                # why is 1 == True and 2 != True in python?
-                if type(result) == bool:
-                    if result == True:
-                        result = "#t"
-                    elif result == False:
-                        result = "#f"
-                return EvalResult(
-                    EvalStatus.SUCCESS, self.parser.get_token(str(result))
-                )
-            except Exception as e:
-                return EvalResult(EvalStatus.FAILURE, e)
-        return EvalResult(EvalStatus.FAILURE, "attempt to call a non procedure")
+        # check if we have a valid function call expression
+        if len(target) == 0:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed definition")
+        fn_name = target[0]
+        if not isinstance(fn_name, Token) or fn_name.token_type != TokenType.IDENT:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed definition")
+        procedure = self.make_procedure(target[1:], exp[2:], env)
+        if procedure.status == EvalStatus.FAILURE:
+            return procedure
+        procedure.result.name = fn_name.literal  # type: ignore
+        env[fn_name.literal] = procedure.result
+        return EvalResult(EvalStatus.SUCCESS, None)
+
+    def evaluate_set(self, exp, env: Env) -> EvalResult:
+        if len(exp) != 3:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed special form")
+        target = exp[1]
+        if not isinstance(target, Token) or target.token_type != TokenType.IDENT:
+            return EvalResult(EvalStatus.FAILURE, "argument of wrong type")
+
+        # set! checks if binding already exists before overwriting it
+        frame = env.find(target.literal)
+        if frame is None:
+            return EvalResult(
+                EvalStatus.FAILURE, f"unbound variable {target.literal}"
+            )
+
+        value = self.evaluate(exp[2], env)
+        if value.status == EvalStatus.FAILURE:
+            return value
+        frame[target.literal] = value.result
+        return EvalResult(EvalStatus.SUCCESS, None)
+
+    def bind_let(self, let: Let, env: Env) -> Union[Env, EvalResult]:
+        """
+        The one frame a let, let* or letrec evaluates its body in, or the
+        result of the init that failed. The body is never copied
+        """
+        frame = Env({}, env)
+        values = frame.vars
+        # let evaluates all inits outside of the new frame, let* and letrec
+        # inside of it, binding each variable as soon as its init is done
+        inner = env if let.token_type == TokenType.LET else frame
+        if let.token_type == TokenType.LETREC:
+            # reading a variable before its init has run reports it undefined
+            for param in let.params:
+                values[param.literal] = _MISSING
+        for param, init in zip(let.params, let.inits):
+            value = self.evaluate(init, inner)
+            if value.status == EvalStatus.FAILURE:
+                return value
+            values[param.literal] = value.result
+        return frame
+
+    def make_named_let(self, let: Let, env: Env) -> EvalResult:
+        """
+        The (procedure, args) a named let starts with. The procedure is bound
+        to the let's name in a frame of its own, so calls of it in the body
+        are ordinary tail calls and loops run in constant stack
+        """
+        args = []
+        for init in let.inits:
+            value = self.evaluate(init, env)
+            if value.status == EvalStatus.FAILURE:
+                return value
+            args.append(value.result)
+
+        frame = Env({}, env)
+        procedure = self.make_procedure(let.params, let.body, frame)
+        if procedure.status == EvalStatus.FAILURE:
+            return procedure
+        procedure.result.name = let.name.literal  # type: ignore
+        frame[let.name.literal] = procedure.result  # type: ignore
+        return EvalResult(EvalStatus.SUCCESS, (procedure.result, args))
 
-    def replace_token(self, exp, to_replace: Token, replace_with: Token):
-        if isinstance(exp, Token):
-            if exp == to_replace:
-                return replace_with
-            return exp
+    def make_procedure(self, params, body, env: Env) -> EvalResult:
+        if isinstance(params, Token) or len(body) == 0:
+            return EvalResult(EvalStatus.FAILURE, "ill-formed special form")
+        for param in params:
+            if not isinstance(param, Token) or param.token_type != TokenType.IDENT:
+                return EvalResult(EvalStatus.FAILURE, "ill-formed special form")
+        names = [param.literal for param in params]
+        if len(set(names)) != len(names):
+            return EvalResult(EvalStatus.FAILURE, "ill-formed special form")
+        if self.profiler is not None:
+            self.profiler.allocate()
+        return EvalResult(
+            EvalStatus.SUCCESS, Procedure(names, body, env, self.call)
+        )
 
-        for i, e in enumerate(exp):
-            exp[i] = self.replace_token(e, to_replace, replace_with)
-        return exp
+    def is_false(self, value) -> bool:
+        return value is False
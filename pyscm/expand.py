@@ -0,0 +1,354 @@
+from dataclasses import dataclass
+import itertools
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from .let import LET_FORMS
+from .parse import CONSTANT_TYPES, Symbol, Token, TokenType, intern
+from .resolve import body_defines
+
+ELLIPSIS = intern("...")
+WILDCARD = intern("_")
+
+# how many times in a row the form at one place may expand to another macro
+# use before the expansion is taken to not terminate
+MAX_EXPANSIONS = 1000
+
+
+class ExpandError(Exception):
+    pass
+
+
+class _Repeated(list):
+    """What a pattern variable followed by ... matched, one per repetition"""
+
+
+@dataclass
+class SyntaxRule:
+    pattern: List[Any]
+    template: Any
+    # names the template binds itself with lambda or let. They are renamed
+    # in every expansion, so they never capture variables of the macro use
+    binders: FrozenSet[Symbol]
+
+
+@dataclass
+class Macro:
+    name: str
+    literals: FrozenSet[Symbol]
+    rules: List[SyntaxRule]
+
+    def expand(self, exp, renamed: Iterator[int]) -> Any:
+        """The expansion of the first rule whose pattern matches exp"""
+        for rule in self.rules:
+            bindings: Dict[Symbol, Any] = {}
+            # the keyword position isn't matched, it is the macro's name
+            if _match_list(rule.pattern[1:], exp[1:], self.literals, bindings):
+                suffix = next(renamed)
+                renames = {
+                    binder: Symbol(TokenType.IDENT, f"{binder.literal};{suffix}")
+                    for binder in rule.binders
+                }
+                return _instantiate(rule.template, bindings, renames)
+        raise ExpandError(f"invalid use of macro {self.name}")
+
+
+def make_macro(exp) -> Macro:
+    """
+    The macro of (define-syntax name (syntax-rules (literals...) rules...)).
+    Raises ExpandError if it is ill-formed
+    """
+    if len(exp) != 3 or not _is_identifier(exp[1]):
+        raise ExpandError("ill-formed define-syntax")
+    spec = exp[2]
+    if (
+        isinstance(spec, Token)
+        or len(spec) < 2
+        or spec[0] is not intern("syntax-rules")
+        or isinstance(spec[1], Token)
+        or not all(_is_identifier(literal) for literal in spec[1])
+    ):
+        raise ExpandError("ill-formed syntax-rules")
+
+    literals = frozenset(spec[1])
+    rules = []
+    for rule in spec[2:]:
+        if isinstance(rule, Token) or len(rule) != 2:
+            raise ExpandError("ill-formed syntax-rules")
+        pattern, template = rule
+        if isinstance(pattern, Token) or len(pattern) == 0:
+            raise ExpandError("ill-formed syntax-rules")
+        variables = frozenset(_pattern_variables(pattern[1:], literals))
+        binders = frozenset(_template_binders(template)) - variables
+        rules.append(SyntaxRule(pattern, template, binders))
+    return Macro(exp[1].literal, literals, rules)
+
+
+def _is_identifier(exp) -> bool:
+    return isinstance(exp, Token) and exp.token_type == TokenType.IDENT
+
+
+def _pattern_variables(pattern, literals) -> Iterator[Symbol]:
+    if isinstance(pattern, Token):
+        if (
+            _is_identifier(pattern)
+            and pattern not in literals
+            and pattern is not ELLIPSIS
+            and pattern is not WILDCARD
+        ):
+            yield pattern  # type: ignore
+        return
+    for sub in pattern:
+        yield from _pattern_variables(sub, literals)
+
+
+def _template_binders(template) -> Iterator[Symbol]:
+    if isinstance(template, Token) or len(template) == 0:
+        return
+    head = template[0]
+    token_type = head.token_type if isinstance(head, Token) else None
+    if token_type == TokenType.LAMBDA and len(template) > 1:
+        params = template[1]
+        if not isinstance(params, Token):
+            yield from (param for param in params if _is_identifier(param))
+    elif token_type == TokenType.DEFINE and len(template) > 1:
+        target = template[1]
+        if not isinstance(target, Token):
+            # the parameters of a procedure, not its name
+            yield from (param for param in target[1:] if _is_identifier(param))
+    elif token_type in LET_FORMS and len(template) > 1:
+        bindings = template[1]
+        if _is_identifier(bindings) and len(template) > 2:
+            # a named let
+            yield bindings
+            bindings = template[2]
+        if not isinstance(bindings, Token):
+            for binding in bindings:
+                if not isinstance(binding, Token) and len(binding) > 0:
+                    if _is_identifier(binding[0]):
+                        yield binding[0]
+    for sub in template:
+        yield from _template_binders(sub)
+
+
+def _match(pattern, form, literals, bindings: Dict[Symbol, Any]) -> bool:
+    if isinstance(pattern, Token):
+        if pattern is WILDCARD:
+            return True
+        if _is_identifier(pattern) and pattern not in literals:
+            bindings[pattern] = form  # type: ignore
+            return True
+        if pattern.token_type in CONSTANT_TYPES:
+            return (
+                isinstance(form, Token)
+                and form.token_type == pattern.token_type
+                and form.literal == pattern.literal
+            )
+        # literals and keywords match themselves
+        return form is pattern
+    if isinstance(form, Token):
+        return False
+    return _match_list(pattern, form, literals, bindings)
+
+
+def _match_list(pattern, form, literals, bindings: Dict[Symbol, Any]) -> bool:
+    if ELLIPSIS not in pattern:
+        return len(pattern) == len(form) and all(
+            _match(p, f, literals, bindings) for p, f in zip(pattern, form)
+        )
+
+    # the element before ... matches any number of forms, those after it
+    # match the end of form
+    at = pattern.index(ELLIPSIS) - 1
+    repeated = pattern[at]
+    before, after = pattern[:at], pattern[at + 2 :]
+    if at < 0 or len(form) < len(before) + len(after):
+        return False
+    end = len(form) - len(after)
+    if not _match_list(before, form[:at], literals, bindings):
+        return False
+    if not _match_list(after, form[end:], literals, bindings):
+        return False
+
+    matches = []
+    for sub in form[at:end]:
+        match: Dict[Symbol, Any] = {}
+        if not _match(repeated, sub, literals, match):
+            return False
+        matches.append(match)
+    for variable in _pattern_variables(repeated, literals):
+        bindings[variable] = _Repeated(match[variable] for match in matches)
+    return True
+
+
+def _instantiate(template, bindings: Dict[Symbol, Any], renames) -> Any:
+    if isinstance(template, Symbol):
+        if template in bindings:
+            value = bindings[template]
+            if isinstance(value, _Repeated):
+                raise ExpandError(
+                    f"pattern variable {template.literal} used without ..."
+                )
+            return value
+        return renames.get(template, template)
+    if isinstance(template, Token):
+        return template
+    if len(template) == 2 and template[0] is ELLIPSIS:
+        # (... template) escapes ..., which is taken as a symbol in template
+        return template[1]
+
+    result = []
+    i = 0
+    while i < len(template):
+        sub = template[i]
+        if i + 1 < len(template) and template[i + 1] is ELLIPSIS:
+            result.extend(_instantiate_repeated(sub, bindings, renames))
+            i += 2
+        else:
+            result.append(_instantiate(sub, bindings, renames))
+            i += 1
+    return result
+
+
+def _instantiate_repeated(template, bindings: Dict[Symbol, Any], renames):
+    variables = [
+        variable
+        for variable in set(_pattern_variables(template, frozenset()))
+        if isinstance(bindings.get(variable), _Repeated)
+    ]
+    if not variables:
+        raise ExpandError("no pattern variable to repeat before ...")
+    lengths = {len(bindings[variable]) for variable in variables}
+    if len(lengths) > 1:
+        raise ExpandError("pattern variables repeated by ... differ in length")
+    for i in range(lengths.pop()):
+        inner = dict(bindings)
+        for variable in variables:
+            inner[variable] = bindings[variable][i]
+        yield _instantiate(template, inner, renames)
+
+
+class Expander:
+    """
+    Expands the macros defined with define-syntax in parsed top level forms,
+    once before they are evaluated, so the backends never see a macro use.
+    Macros are defined at the top level and apply to the forms after them
+    """
+
+    def __init__(self):
+        self.macros: Dict[str, Macro] = {}
+        # numbers the expansions, to rename what templates bind
+        self.renamed = itertools.count(1)
+
+    def expand_parsed(
+        self, parsed: Iterable[Tuple[bool, Any]]
+    ) -> Iterator[Tuple[bool, Any]]:
+        """
+        Expands the output of Parse.parse, dropping macro definitions. An
+        error is yielded like a parse error and ends the forms
+        """
+        for ok, datum in parsed:
+            if not ok:
+                yield ok, datum
+                return
+            try:
+                exp = self.expand_toplevel(datum)
+            except ExpandError as e:
+                yield False, str(e)
+                return
+            except RecursionError:
+                yield False, "macro expansion nested too deeply"
+                return
+            if exp is not None:
+                yield True, exp
+
+    def expand_toplevel(self, exp) -> Optional[Any]:
+        """
+        The expansion of a top level form, None for one that only defines
+        macros. Raises ExpandError
+        """
+        head = exp[0] if isinstance(exp, list) and len(exp) > 0 else None
+        if isinstance(head, Token):
+            if head.token_type == TokenType.DEFINE_SYNTAX:
+                macro = make_macro(exp)
+                self.macros[macro.name] = macro
+                return None
+            elif head.token_type == TokenType.BEGIN and len(exp) > 1:
+                body = [self.expand_toplevel(e) for e in exp[1:]]
+                body = [e for e in body if e is not None]
+                return [head, *body] if body else None
+        return self.expand(exp)
+
+    def expand(self, exp, bound: FrozenSet[str] = frozenset()) -> Any:
+        """
+        bound are the local variables in scope, which hide macros of the
+        same name
+        """
+        head: Any = None
+        for _ in range(MAX_EXPANSIONS):
+            if isinstance(exp, Token) or len(exp) == 0:
+                return exp
+            head = exp[0]
+            if not _is_identifier(head) or head.literal in bound:
+                break
+            macro = self.macros.get(head.literal)
+            if macro is None:
+                break
+            exp = macro.expand(exp, self.renamed)
+        else:
+            raise ExpandError(f"expansion of macro {head.literal} doesn't end")
+
+        token_type = head.token_type if isinstance(head, Token) else None
+        if token_type == TokenType.DEFINE_SYNTAX:
+            raise ExpandError("define-syntax is only allowed at the top level")
+        elif token_type == TokenType.LAMBDA and len(exp) > 2:
+            return [head, exp[1], *self.expand_body(exp[1], exp[2:], bound)]
+        elif (
+            token_type in (TokenType.DEFINE, TokenType.DEFINE_MEMOIZED)
+            and len(exp) > 2
+            and not isinstance(exp[1], Token)
+            and len(exp[1]) > 0
+        ):
+            target = exp[1]
+            return [head, target, *self.expand_body(target[1:], exp[2:], bound)]
+        elif token_type in (TokenType.DEFINE, TokenType.SET) and len(exp) > 2:
+            return [head, exp[1], *[self.expand(e, bound) for e in exp[2:]]]
+        elif token_type in LET_FORMS and len(exp) > 2:
+            return self.expand_let(exp, bound)
+        return [self.expand(e, bound) for e in exp]
+
+    def expand_body(self, params, body, bound: FrozenSet[str]) -> List[Any]:
+        if isinstance(params, Token):
+            return body
+        names = [str(param.literal) for param in params if isinstance(param, Token)]
+        inner = bound.union(names, body_defines(body))
+        return [self.expand(e, inner) for e in body]
+
+    def expand_let(self, exp, bound: FrozenSet[str]) -> List[Any]:
+        head, *rest = exp
+        prefix = [head]
+        if isinstance(rest[0], Token):
+            # a named let, whose name is bound in its body
+            prefix.append(rest[0])
+            bound = bound.union([str(rest[0].literal)])
+            rest = rest[1:]
+        if len(rest) == 0 or isinstance(rest[0], Token):
+            return exp
+        bindings, body = rest[0], rest[1:]
+        params = [
+            binding[0]
+            for binding in bindings
+            if not isinstance(binding, Token) and len(binding) == 2
+        ]
+
+        inits_bound = bound
+        if head.token_type != TokenType.LET:
+            inits_bound = bound.union(
+                str(param.literal) for param in params if isinstance(param, Token)
+            )
+        expanded = [
+            binding
+            if isinstance(binding, Token) or len(binding) != 2
+            else [binding[0], self.expand(binding[1], inits_bound)]
+            for binding in bindings
+        ]
+        return [*prefix, expanded, *self.expand_body(params, body, bound)]
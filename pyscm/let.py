@@ -0,0 +1,57 @@
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from .parse import Token, TokenType
+
+LET_FORMS = frozenset((TokenType.LET, TokenType.LET_STAR, TokenType.LETREC))
+
+
+@dataclass
+class Let:
+    """
+    The parts of a let, let* or letrec form. name is set for a named let,
+    (let name ((param init) ...) body...), which binds name to a procedure
+    of the params inside its own body and calls it with the inits
+    """
+
+    token_type: TokenType
+    name: Optional[Token]
+    params: List[Token]
+    inits: List[Any]
+    body: List[Any]
+
+
+def parse_let(exp) -> Optional[Let]:
+    """
+    Returns None if exp is ill-formed. The params of the result never repeat
+    a name, so they fit in one frame: a let* rebinding a name has the
+    bindings from that one on moved into a let* making up its body
+    """
+    token_type = exp[0].token_type
+    name = None
+    rest = exp[1:]
+    if token_type == TokenType.LET and len(rest) > 0 and isinstance(rest[0], Token):
+        name = rest[0]
+        if name.token_type != TokenType.IDENT:
+            return None
+        rest = rest[1:]
+    if len(rest) < 2 or isinstance(rest[0], Token):
+        return None
+    bindings, body = rest[0], rest[1:]
+
+    params: List[Token] = []
+    inits = []
+    for i, binding in enumerate(bindings):
+        if isinstance(binding, Token) or len(binding) != 2:
+            return None
+        param, init = binding
+        if not isinstance(param, Token) or param.token_type != TokenType.IDENT:
+            return None
+        if param in params:
+            if token_type != TokenType.LET_STAR:
+                return None
+            body = [[exp[0], bindings[i:], *body]]
+            break
+        params.append(param)
+        inits.append(init)
+    return Let(token_type, name, params, inits, body)
@@ -0,0 +1,112 @@
+from dataclasses import dataclass
+import os
+import sys
+import time
+from typing import Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore
+
+# how many steps go by between checks of the clock and the memory use
+CHECK_INTERVAL = 1024
+
+
+@dataclass
+class Limits:
+    """
+    Bounds on one evaluation. A step is one application of a user defined
+    procedure, which every loop and recursion takes. None means no limit
+    """
+
+    steps: Optional[int] = None
+    # seconds of wall clock time
+    timeout: Optional[float] = None
+    # bytes the process' resident memory may grow by
+    memory: Optional[int] = None
+
+    def within(self, other: "Limits") -> "Limits":
+        """The tighter of each of the two limits"""
+
+        def tighter(a, b):
+            return b if a is None else a if b is None else min(a, b)
+
+        return Limits(
+            tighter(self.steps, other.steps),
+            tighter(self.timeout, other.timeout),
+            tighter(self.memory, other.memory),
+        )
+
+
+class LimitExceeded(BaseException):
+    """
+    Raised when an evaluation goes over one of its limits. It isn't an
+    Exception so that nothing on the way out, like builtins reporting errors
+    of the procedures they call, mistakes it for an error of the program
+    """
+
+
+def resident_memory() -> int:
+    """The resident memory of the process in bytes, 0 if it can't be told"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is None:
+        return 0
+    # the peak, which is the best other systems offer. It is in bytes on
+    # macOS and in KiB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Meter:
+    """
+    Counts the steps of an evaluation and raises LimitExceeded once it goes
+    over its limits. The clock and memory are only looked at every
+    CHECK_INTERVAL steps, so they can be overrun by that much. The counters
+    stay readable afterwards
+    """
+
+    def __init__(self, limits: Limits):
+        self.limits = limits
+        self.steps = 0
+        self.start = time.perf_counter()
+        self.elapsed = 0.0
+        self.start_memory = 0 if limits.memory is None else resident_memory()
+        # largest growth of resident memory seen
+        self.memory = 0
+        self.exceeded: Optional[str] = None
+        self.next_check = self.check_after()
+
+    def step(self):
+        self.steps += 1
+        if self.steps >= self.next_check:
+            self.check()
+
+    def check(self):
+        limits = self.limits
+        self.elapsed = time.perf_counter() - self.start
+        if limits.steps is not None and self.steps > limits.steps:
+            self.exceed(f"step limit of {limits.steps} exceeded")
+        if limits.timeout is not None and self.elapsed > limits.timeout:
+            self.exceed(f"time limit of {limits.timeout}s exceeded")
+        if limits.memory is not None:
+            self.memory = max(self.memory, resident_memory() - self.start_memory)
+            if self.memory > limits.memory:
+                self.exceed(f"memory limit of {limits.memory} bytes exceeded")
+        self.next_check = self.check_after()
+
+    def check_after(self) -> int:
+        if self.limits.steps is None:
+            return self.steps + CHECK_INTERVAL
+        return min(self.steps + CHECK_INTERVAL, self.limits.steps + 1)
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self.start
+
+    def exceed(self, message: str):
+        self.exceeded = message
+        raise LimitExceeded(message)
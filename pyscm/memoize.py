@@ -0,0 +1,113 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from .pair import from_iterable
+from .parse import Token, TokenType, intern
+
+
+@dataclass
+class MemoStats:
+    hits: int
+    misses: int
+    size: int
+    # None when the cache is unbounded
+    maxsize: Optional[int]
+
+
+class Memoized:
+    """
+    Wraps a procedure with a cache of its results keyed by the arguments.
+    With maxsize set the least recently used results are dropped once it is
+    full. Only procedures without side effects should be memoized
+    """
+
+    __slots__ = ("procedure", "maxsize", "cache", "hits", "misses")
+
+    def __init__(self, procedure, maxsize: Optional[int] = None):
+        if not callable(procedure):
+            raise TypeError("memoize: expects a procedure")
+        if maxsize is not None and (type(maxsize) is not int or maxsize < 1):
+            raise ValueError("memoize: size must be a positive integer")
+        self.procedure = procedure
+        self.maxsize = maxsize
+        self.cache: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def name(self):
+        return getattr(self.procedure, "name", None)
+
+    def __call__(self, *args):
+        # 1, 1.0 and #t are equal and hash the same in python, the types keep
+        # their results apart
+        key = (*args, *map(type, args))
+        try:
+            result = self.cache[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # unhashable arguments can't be cached
+            self.misses += 1
+            return self.procedure(*args)
+        else:
+            self.hits += 1
+            if self.maxsize is not None:
+                self.cache.move_to_end(key)
+            return result
+
+        self.misses += 1
+        result = self.procedure(*args)
+        self.cache[key] = result
+        if self.maxsize is not None and len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+        return result
+
+    def cache_info(self) -> MemoStats:
+        return MemoStats(self.hits, self.misses, len(self.cache), self.maxsize)
+
+    def cache_clear(self):
+        self.cache.clear()
+        self.hits = self.misses = 0
+
+    def __repr__(self):
+        name = self.name
+        return f"#<procedure {name}>" if name else "#<procedure>"
+
+
+def memoize(procedure, maxsize: Optional[int] = None) -> Memoized:
+    return Memoized(procedure, maxsize)
+
+
+def memo_stats(procedure):
+    """
+    (hits misses size maxsize) of a memoized procedure, maxsize is #f when
+    the cache is unbounded
+    """
+    if type(procedure) is not Memoized:
+        raise TypeError("memo-stats: expects a memoized procedure")
+    stats = procedure.cache_info()
+    maxsize = False if stats.maxsize is None else stats.maxsize
+    return from_iterable([stats.hits, stats.misses, stats.size, maxsize])
+
+
+def expand_define_memoized(exp) -> Optional[Any]:
+    """
+    Rewrites (define-memoized (name params...) body...) to
+
+        (begin (define (name params...) body...) (set! name (memoize name)))
+
+    so recursive calls in the body go through the cache. Returns None if exp
+    is ill-formed
+    """
+    if len(exp) < 3 or isinstance(exp[1], Token) or len(exp[1]) == 0:
+        return None
+    name = exp[1][0]
+    if not isinstance(name, Token) or name.token_type != TokenType.IDENT:
+        return None
+    return [
+        intern("begin"),
+        [intern("define"), *exp[1:]],
+        [intern("set!"), name, [intern("memoize"), name]],
+    ]
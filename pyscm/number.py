@@ -0,0 +1,319 @@
+from fractions import Fraction
+import math
+
+from .procedure import reduce
+
+# exact integers are python ints of any size, exact non integers are
+# Rationals and inexact numbers floats
+
+
+class Rational(Fraction):
+    """
+    An exact number that isn't an integer. Arithmetic on it normalizes its
+    result, so a whole result is an int again. Integers never become
+    Rationals, arithmetic on them stays int arithmetic
+    """
+
+    __slots__ = ()
+
+
+def normalize(value):
+    """A whole Fraction as an int and any other as a Rational"""
+    if isinstance(value, Fraction):
+        if value.denominator == 1:
+            return value.numerator
+        if type(value) is not Rational:
+            return Rational(value)
+    return value
+
+
+def _normalized(method):
+    def normalized(*args):
+        return normalize(method(*args))
+
+    normalized.__name__ = method.__name__
+    return normalized
+
+
+# Fraction's operators return plain Fractions
+for _name in (
+    "__add__",
+    "__radd__",
+    "__sub__",
+    "__rsub__",
+    "__mul__",
+    "__rmul__",
+    "__truediv__",
+    "__rtruediv__",
+    "__mod__",
+    "__rmod__",
+    "__pow__",
+    "__rpow__",
+    "__neg__",
+    "__pos__",
+    "__abs__",
+):
+    setattr(Rational, _name, _normalized(getattr(Fraction, _name)))
+
+
+def rational(numerator: int, denominator: int):
+    """numerator/denominator in lowest terms, an int if it is whole"""
+    return normalize(Fraction(numerator, denominator))
+
+
+def is_number(x) -> bool:
+    return isinstance(x, (int, float, Fraction)) and type(x) is not bool
+
+
+def _check_number(name: str, x):
+    if not is_number(x):
+        raise TypeError(f"{name}: expects a number")
+
+
+def _check_integer(name: str, x):
+    if not is_integer(x):
+        raise TypeError(f"{name}: expects an integer")
+
+
+# + - and * also take vectors, which they apply element-wise. bool is a
+# subclass of int, so python's operators would take #t and #f for 1 and 0
+def add(a, b):
+    if type(a) is bool or type(b) is bool:
+        raise TypeError("+: expects a number")
+    return a + b
+
+
+def subtract(a, b):
+    if type(a) is bool or type(b) is bool:
+        raise TypeError("-: expects a number")
+    return a - b
+
+
+def multiply(a, b):
+    if type(a) is bool or type(b) is bool:
+        raise TypeError("*: expects a number")
+    return a * b
+
+
+def plus(*args):
+    if len(args) == 1 and type(args[0]) is bool:
+        raise TypeError("+: expects a number")
+    return reduce(add, *args)
+
+
+def times(*args):
+    if len(args) == 1 and type(args[0]) is bool:
+        raise TypeError("*: expects a number")
+    return reduce(multiply, *args)
+
+
+# the types numbers almost always have, checked before the slower is_number
+_NUMBER_TYPES = frozenset((int, float, Fraction, Rational))
+
+
+def _check_numbers(name: str, a, b):
+    _check_number(name, a)
+    _check_number(name, b)
+
+
+def greater(a, b):
+    if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+        _check_numbers(">", a, b)
+    return a > b
+
+
+def less(a, b):
+    if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+        _check_numbers("<", a, b)
+    return a < b
+
+
+def greater_equal(a, b):
+    if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+        _check_numbers(">=", a, b)
+    return a >= b
+
+
+def less_equal(a, b):
+    if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+        _check_numbers("<=", a, b)
+    return a <= b
+
+
+def equal(a, b):
+    if type(a) not in _NUMBER_TYPES or type(b) not in _NUMBER_TYPES:
+        _check_numbers("=", a, b)
+    return a == b
+
+
+def scm_abs(x):
+    _check_number("abs", x)
+    return abs(x)
+
+
+def is_exact(x) -> bool:
+    _check_number("exact?", x)
+    return type(x) is not float
+
+
+def is_inexact(x) -> bool:
+    _check_number("inexact?", x)
+    return type(x) is float
+
+
+def is_integer(x) -> bool:
+    if type(x) is float:
+        return x.is_integer()
+    return type(x) is int
+
+
+def is_rational(x) -> bool:
+    if type(x) is float:
+        return math.isfinite(x)
+    return is_number(x)
+
+
+def exact(x):
+    """The exact number equal to x"""
+    _check_number("exact", x)
+    if type(x) is not float:
+        return x
+    if not math.isfinite(x):
+        raise ValueError(f"exact: {x} has no exact representation")
+    return normalize(Fraction(x))
+
+
+def inexact(x) -> float:
+    _check_number("inexact", x)
+    return float(x)
+
+
+def divide(a, b):
+    if type(a) is int and type(b) is int:
+        # exact int division only needs a Rational when there's a remainder
+        quotient, remainder = divmod(a, b)
+        if remainder == 0:
+            return quotient
+        return Rational(a, b)
+    _check_numbers("/", a, b)
+    return a / b
+
+
+def quotient(a, b):
+    """a / b rounded towards zero"""
+    _check_integer("quotient", a)
+    _check_integer("quotient", b)
+    q = abs(a) // abs(b)
+    return q if (a < 0) == (b < 0) else -q
+
+
+def remainder(a, b):
+    """The remainder of quotient, which has the sign of a"""
+    _check_integer("remainder", a)
+    _check_integer("remainder", b)
+    if type(a) is float or type(b) is float:
+        return math.fmod(a, b)
+    return a - b * quotient(a, b)
+
+
+def modulo(a, b):
+    """The remainder of floor division, which has the sign of b"""
+    _check_integer("modulo", a)
+    _check_integer("modulo", b)
+    return a % b
+
+
+def expt(base, power):
+    _check_numbers("expt", base, power)
+    if type(base) is int and type(power) is int and power < 0:
+        # exact, where python would give a float
+        return rational(1, base ** -power)
+    if isinstance(power, Fraction):
+        # a root, which is inexact
+        power = float(power)
+    result = base**power
+    if type(result) is complex:
+        raise ValueError("expt: result is not a real number")
+    return normalize(result)
+
+
+def numerator(x):
+    _check_number("numerator", x)
+    if type(x) is float:
+        return float(Fraction(x).numerator)
+    return x.numerator
+
+
+def denominator(x):
+    _check_number("denominator", x)
+    if type(x) is float:
+        return float(Fraction(x).denominator)
+    return x.denominator
+
+
+def _isqrt(n: int) -> int:
+    """The integer square root by newton's method, math.isqrt before 3.8"""
+    if n < 2:
+        return n
+    x = 1 << ((n.bit_length() + 1) // 2)
+    while True:
+        y = (x + n // x) // 2
+        if y >= x:
+            return x
+        x = y
+
+
+isqrt = getattr(math, "isqrt", _isqrt)
+
+
+def sqrt(x):
+    """Exact for exact squares of integers and rationals"""
+    if type(x) is int and x >= 0:
+        root = isqrt(x)
+        if root * root == x:
+            return root
+    elif isinstance(x, Fraction) and x > 0:
+        top, bottom = isqrt(x.numerator), isqrt(x.denominator)
+        if top * top == x.numerator and bottom * bottom == x.denominator:
+            return rational(top, bottom)
+    _check_number("sqrt", x)
+    return math.sqrt(x)
+
+
+def _rounding(name: str, function):
+    """Rounding keeps exactness, an inexact number rounds to an integral float"""
+
+    def rounding(x):
+        _check_number(name, x)
+        if type(x) is float:
+            return float(function(x)) if math.isfinite(x) else x
+        return function(x)
+
+    return rounding
+
+
+floor = _rounding("floor", math.floor)
+ceiling = _rounding("ceiling", math.ceil)
+truncate = _rounding("truncate", math.trunc)
+# ties go to the even integer, as both float and Fraction round them
+scm_round = _rounding("round", round)
+
+
+def scm_max(*args):
+    """The largest argument, inexact if any argument is"""
+    for arg in args:
+        _check_number("max", arg)
+    result = max(args)
+    if type(result) is not float and any(type(arg) is float for arg in args):
+        return float(result)
+    return result
+
+
+def scm_min(*args):
+    """The smallest argument, inexact if any argument is"""
+    for arg in args:
+        _check_number("min", arg)
+    result = min(args)
+    if type(result) is not float and any(type(arg) is float for arg in args):
+        return float(result)
+    return result
@@ -0,0 +1,224 @@
+from typing import Any, List, Optional, TextIO
+
+from .env import Env
+from .let import LET_FORMS
+from .number import Rational
+from .parse import CONSTANT_TYPES, Token, TokenType, intern
+from .procedure import to_string
+
+# builtins without side effects. Their calls with constant arguments are
+# computed once by the optimizer instead of every time they are evaluated
+PURE_BUILTINS = frozenset(
+    (
+        TokenType.PLUS,
+        TokenType.MINUS,
+        TokenType.MULTIPLY,
+        TokenType.DIVIDE,
+        TokenType.GREATER_THAN,
+        TokenType.LESS_THAN,
+        TokenType.GREATER_EQUAL,
+        TokenType.LESS_EQUAL,
+        TokenType.EQUAL,
+        TokenType.SQRT,
+        TokenType.FLOOR,
+        TokenType.CEIL,
+        TokenType.ROUND,
+        TokenType.TRUNCATE,
+        TokenType.MAX,
+        TokenType.MIN,
+        TokenType.ABS,
+        TokenType.QUOTIENT,
+        TokenType.REMAINDER,
+        TokenType.MODULO,
+        TokenType.EXPT,
+        TokenType.EXACT,
+        TokenType.INEXACT,
+        TokenType.IS_EXACT,
+        TokenType.IS_INEXACT,
+        TokenType.IS_NUMBER,
+        TokenType.IS_INTEGER,
+        TokenType.IS_RATIONAL,
+        TokenType.NUMERATOR,
+        TokenType.DENOMINATOR,
+        TokenType.IS_STRING,
+        TokenType.STRING_LENGTH,
+        TokenType.STRING_APPEND,
+        TokenType.SUBSTRING,
+        TokenType.NUMBER_TO_STRING,
+        TokenType.STRING_TO_NUMBER,
+    )
+)
+
+# the token of a constant of each python type
+_CONSTANT_TOKEN_TYPES = {
+    bool: TokenType.BOOLEAN,
+    int: TokenType.INT,
+    Rational: TokenType.RATIONAL,
+    float: TokenType.FLOAT,
+    str: TokenType.STRING,
+}
+
+
+def is_constant(exp) -> bool:
+    return isinstance(exp, Token) and exp.token_type in CONSTANT_TYPES
+
+
+def constant(value) -> Optional[Token]:
+    """The token of a value, None if it has no literal form"""
+    token_type = _CONSTANT_TOKEN_TYPES.get(type(value))
+    if token_type is None:
+        return None
+    return Token(token_type, value)
+
+
+def to_source(exp) -> str:
+    """Prints a parsed expression back as source code"""
+    if isinstance(exp, list):
+        return "(" + " ".join(to_source(e) for e in exp) + ")"
+    if is_constant(exp):
+        return to_string(exp.literal)
+    return str(exp)
+
+
+class Optimizer:
+    """
+    Rewrites parsed forms into simpler ones with the same meaning before they
+    are evaluated: calls of pure builtins with constant arguments become
+    their value, ifs with a constant test become the branch taken, nested
+    begins are flattened and lambdas applied where they are written become
+    lets. Forms that would fail are left for evaluation to report. With dump
+    set every optimized top level form is printed to it
+    """
+
+    def __init__(self, env: Env, dump: Optional[TextIO] = None):
+        self.env = env
+        self.dump = dump
+
+    def optimize_toplevel(self, exp) -> Any:
+        optimized = self.optimize(exp)
+        if self.dump is not None:
+            print(to_source(optimized), file=self.dump)
+        return optimized
+
+    def optimize(self, exp) -> Any:
+        if isinstance(exp, Token) or len(exp) == 0:
+            return exp
+
+        head = exp[0]
+        token_type = head.token_type if isinstance(head, Token) else None
+        if token_type == TokenType.LAMBDA and len(exp) > 2:
+            return [head, exp[1], *self.optimize_body(exp[2:])]
+        elif (
+            token_type in (TokenType.DEFINE, TokenType.DEFINE_MEMOIZED)
+            and len(exp) > 2
+            and not isinstance(exp[1], Token)
+        ):
+            return [head, exp[1], *self.optimize_body(exp[2:])]
+        elif token_type in (TokenType.DEFINE, TokenType.SET) and len(exp) == 3:
+            return [head, exp[1], self.optimize(exp[2])]
+        elif token_type == TokenType.IF and len(exp) in (3, 4):
+            return self.optimize_if(exp)
+        elif token_type == TokenType.BEGIN and len(exp) > 1:
+            body = self.optimize_body(exp[1:])
+            return body[0] if len(body) == 1 else [head, *body]
+        elif token_type in LET_FORMS and len(exp) > 2:
+            return self.optimize_let(exp)
+        elif token_type in (TokenType.DEFINE, TokenType.SET, TokenType.IF):
+            # ill-formed, left for evaluation to report
+            return exp
+
+        exp = [self.optimize(e) for e in exp]
+        if token_type in PURE_BUILTINS and all(is_constant(e) for e in exp[1:]):
+            folded = self.fold(head, exp[1:])
+            if folded is not None:
+                return folded
+        elif isinstance(head, list):
+            inlined = self.inline(exp)
+            if inlined is not None:
+                return inlined
+        return exp
+
+    def optimize_body(self, body) -> List[Any]:
+        """
+        The expressions of a body or begin with nested begins spliced in.
+        Constants whose value is thrown away are dropped
+        """
+        flat: List[Any] = []
+        for exp in body:
+            exp = self.optimize(exp)
+            if (
+                isinstance(exp, list)
+                and len(exp) > 1
+                and isinstance(exp[0], Token)
+                and exp[0].token_type == TokenType.BEGIN
+            ):
+                flat.extend(exp[1:])
+            else:
+                flat.append(exp)
+        return [exp for exp in flat[:-1] if not is_constant(exp)] + flat[-1:]
+
+    def optimize_if(self, exp) -> Any:
+        test = self.optimize(exp[1])
+        branches = [self.optimize(e) for e in exp[2:]]
+        if not is_constant(test):
+            return [exp[0], test, *branches]
+        # everything except #f counts as true
+        if test.literal is not False:
+            return branches[0]
+        if len(branches) == 2:
+            return branches[1]
+        # there is no literal for the value of an if without alternative
+        return [exp[0], test, *branches]
+
+    def optimize_let(self, exp) -> Any:
+        head, *rest = exp
+        prefix = [head]
+        if isinstance(rest[0], Token):
+            # a named let
+            prefix.append(rest[0])
+            rest = rest[1:]
+        if len(rest) < 2 or isinstance(rest[0], Token):
+            return exp
+        bindings = [
+            binding
+            if isinstance(binding, Token) or len(binding) != 2
+            else [binding[0], self.optimize(binding[1])]
+            for binding in rest[0]
+        ]
+        return [*prefix, bindings, *self.optimize_body(rest[1:])]
+
+    def fold(self, head: Token, args) -> Optional[Token]:
+        """The value of a builtin call as a constant, None if it fails"""
+        builtin = self.env.get(head.token_type)
+        if builtin is None:
+            return None
+        try:
+            return constant(builtin(*[arg.literal for arg in args]))
+        except Exception:
+            return None
+
+    def inline(self, exp) -> Optional[Any]:
+        """
+        ((lambda (params...) body...) args...) as a let, which binds the
+        arguments without making a procedure and calling it
+        """
+        procedure, args = exp[0], exp[1:]
+        if (
+            len(procedure) < 3
+            or not isinstance(procedure[0], Token)
+            or procedure[0].token_type != TokenType.LAMBDA
+            or isinstance(procedure[1], Token)
+            or len(procedure[1]) != len(args)
+        ):
+            return None
+        params = procedure[1]
+        if len(set(map(id, params))) != len(params) or not all(
+            isinstance(param, Token) and param.token_type == TokenType.IDENT
+            for param in params
+        ):
+            return None
+        return [
+            intern("let"),
+            [[param, arg] for param, arg in zip(params, args)],
+            *procedure[2:],
+        ]
@@ -0,0 +1,145 @@
+from typing import Iterable, Iterator
+
+from .procedure import to_string
+
+
+class Nil:
+    """The empty list. NIL is its only instance"""
+
+    __slots__ = ()
+
+    def __iter__(self):
+        return iter(())
+
+    def __repr__(self):
+        return "()"
+
+
+NIL = Nil()
+
+
+class Pair:
+    """
+    A cons cell. Lists are chains of pairs ending in NIL, so taking the cdr of
+    a list shares the rest of it instead of copying
+    """
+
+    __slots__ = ("car", "cdr")
+
+    def __init__(self, car, cdr):
+        self.car = car
+        self.cdr = cdr
+
+    def __iter__(self) -> Iterator:
+        """Iterates over the elements of a proper list"""
+        pair = self
+        while type(pair) is Pair:
+            yield pair.car
+            pair = pair.cdr
+        if pair is not NIL:
+            raise TypeError(f"{to_string(self)} is not a proper list")
+
+    def __repr__(self):
+        items = []
+        pair = self
+        while type(pair) is Pair:
+            items.append(to_string(pair.car))
+            pair = pair.cdr
+        if pair is not NIL:
+            items.append(".")
+            items.append(to_string(pair))
+        return "(" + " ".join(items) + ")"
+
+
+def from_iterable(items: Iterable):
+    """Builds a scheme list holding items"""
+    result = NIL
+    for item in reversed(list(items)):
+        result = Pair(item, result)
+    return result
+
+
+def cons(car, cdr) -> Pair:
+    return Pair(car, cdr)
+
+
+def car(pair):
+    if type(pair) is not Pair:
+        raise TypeError(f"car: {to_string(pair)} is not a pair")
+    return pair.car
+
+
+def cdr(pair):
+    if type(pair) is not Pair:
+        raise TypeError(f"cdr: {to_string(pair)} is not a pair")
+    return pair.cdr
+
+
+def scm_list(*items):
+    return from_iterable(items)
+
+
+def length(lst) -> int:
+    count = 0
+    pair = lst
+    while type(pair) is Pair:
+        count += 1
+        pair = pair.cdr
+    if pair is not NIL:
+        raise TypeError(f"length: {to_string(lst)} is not a proper list")
+    return count
+
+
+def append(*lists):
+    """
+    Copies every list but the last, which the result shares. Like in other
+    schemes the last argument doesn't have to be a list
+    """
+    if not lists:
+        return NIL
+    head = tail = Pair(None, NIL)
+    for lst in lists[:-1]:
+        for item in _proper(lst, "append"):
+            tail.cdr = tail = Pair(item, NIL)
+    tail.cdr = lists[-1]
+    return head.cdr
+
+
+def reverse(lst):
+    result = NIL
+    for item in _proper(lst, "reverse"):
+        result = Pair(item, result)
+    return result
+
+
+def scm_map(procedure, *lists):
+    """Stops at the end of the shortest list"""
+    if not lists:
+        raise TypeError("map: expects at least one list")
+    head = tail = Pair(None, NIL)
+    for items in zip(*(_proper(lst, "map") for lst in lists)):
+        tail.cdr = tail = Pair(procedure(*items), NIL)
+    return head.cdr
+
+
+def for_each(procedure, *lists):
+    if not lists:
+        raise TypeError("for-each: expects at least one list")
+    for items in zip(*(_proper(lst, "for-each") for lst in lists)):
+        procedure(*items)
+
+
+def is_null(value) -> bool:
+    return value is NIL
+
+
+def is_pair(value) -> bool:
+    return type(value) is Pair
+
+
+def _proper(lst, name: str) -> Iterable:
+    if lst is NIL:
+        return ()
+    if type(lst) is not Pair:
+        raise TypeError(f"{name}: {to_string(lst)} is not a list")
+    return lst
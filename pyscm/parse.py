@@ -1,6 +1,24 @@
 from dataclasses import dataclass
 from enum import Enum, unique
-from typing import Union
+import io
+import re
+import threading
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+import weakref
+
+from .number import Rational, exact, inexact, rational
 
 List = list
 
@@ -40,11 +58,89 @@ class TokenType(Enum):
     BEGIN = 26
     LAMBDA = 27
 
+    CONS = 28
+    CAR = 29
+    CDR = 30
+    LIST = 31
+    LENGTH = 32
+    APPEND = 33
+    REVERSE = 34
+    MAP = 35
+    FOR_EACH = 36
+    IS_NULL = 37
+    IS_PAIR = 38
+    MAKE_VECTOR = 39
+    VECTOR = 40
+    VECTOR_REF = 41
+    VECTOR_SET = 42
+    VECTOR_LENGTH = 43
+    VECTOR_FILL = 44
+    VECTOR_MAP = 45
+    VECTOR_SUM = 46
+    VECTOR_TO_LIST = 47
+    LIST_TO_VECTOR = 48
+    IS_VECTOR = 49
+    DEFINE_MEMOIZED = 50
+    MEMOIZE = 51
+    MEMO_STATS = 52
+    LET_STAR = 53
+    LETREC = 54
+    DEFINE_SYNTAX = 55
+    SYNTAX_RULES = 56
+
+    RATIONAL = 57
+    QUOTIENT = 58
+    REMAINDER = 59
+    MODULO = 60
+    EXPT = 61
+    EXACT = 62
+    INEXACT = 63
+    IS_EXACT = 64
+    IS_INEXACT = 65
+    IS_NUMBER = 66
+    IS_INTEGER = 67
+    IS_RATIONAL = 68
+    NUMERATOR = 69
+    DENOMINATOR = 70
+    TRUNCATE = 71
+
+    IS_STRING = 72
+    IS_SYMBOL = 73
+    STRING_LENGTH = 74
+    STRING_APPEND = 75
+    SUBSTRING = 76
+    STRING_SPLIT = 77
+    STRING_TO_SYMBOL = 78
+    SYMBOL_TO_STRING = 79
+    NUMBER_TO_STRING = 80
+    STRING_TO_NUMBER = 81
+    OPEN_OUTPUT_STRING = 82
+    GET_OUTPUT_STRING = 83
+    WRITE_STRING = 84
+    DISPLAY = 85
+    NEWLINE = 86
+
+
+# tokens whose literal is their value
+CONSTANT_TYPES = frozenset(
+    (
+        TokenType.INT,
+        TokenType.FLOAT,
+        TokenType.RATIONAL,
+        TokenType.STRING,
+        TokenType.BOOLEAN,
+    )
+)
+
 
 @dataclass
 class Token:
+    __slots__ = ("token_type", "literal")
+
     token_type: TokenType
-    literal: Union[str, int, float]
+    # the value of a constant (int, Rational, float, bool or str) or the name
+    # of a symbol
+    literal: Union[str, int, Rational, float, bool]
 
     def __str__(self):
         return str(self.literal)
@@ -53,87 +149,343 @@ class Token:
         return str(self.literal)
 
 
+class Symbol(Token):
+    """
+    An identifier or keyword token. Symbols are interned by intern, there is
+    only one instance per name, so they compare by identity
+    """
+
+    __slots__ = ("__weakref__",)
+
+    def __eq__(self, other: object) -> bool:
+        return self is other
+
+    def __hash__(self) -> int:
+        return id(self)
+
+
+_KEYWORDS = {
+    "+": TokenType.PLUS,
+    "-": TokenType.MINUS,
+    "*": TokenType.MULTIPLY,
+    "/": TokenType.DIVIDE,
+    ">": TokenType.GREATER_THAN,
+    "<": TokenType.LESS_THAN,
+    ">=": TokenType.GREATER_EQUAL,
+    "<=": TokenType.LESS_EQUAL,
+    "=": TokenType.EQUAL,
+    "sqrt": TokenType.SQRT,
+    "floor": TokenType.FLOOR,
+    "ceiling": TokenType.CEIL,
+    "round": TokenType.ROUND,
+    "max": TokenType.MAX,
+    "min": TokenType.MIN,
+    "abs": TokenType.ABS,
+    "if": TokenType.IF,
+    "define": TokenType.DEFINE,
+    "set!": TokenType.SET,
+    "let": TokenType.LET,
+    "let*": TokenType.LET_STAR,
+    "letrec": TokenType.LETREC,
+    "begin": TokenType.BEGIN,
+    "lambda": TokenType.LAMBDA,
+    "cons": TokenType.CONS,
+    "car": TokenType.CAR,
+    "cdr": TokenType.CDR,
+    "list": TokenType.LIST,
+    "length": TokenType.LENGTH,
+    "append": TokenType.APPEND,
+    "reverse": TokenType.REVERSE,
+    "map": TokenType.MAP,
+    "for-each": TokenType.FOR_EACH,
+    "null?": TokenType.IS_NULL,
+    "pair?": TokenType.IS_PAIR,
+    "make-vector": TokenType.MAKE_VECTOR,
+    "vector": TokenType.VECTOR,
+    "vector-ref": TokenType.VECTOR_REF,
+    "vector-set!": TokenType.VECTOR_SET,
+    "vector-length": TokenType.VECTOR_LENGTH,
+    "vector-fill!": TokenType.VECTOR_FILL,
+    "vector-map": TokenType.VECTOR_MAP,
+    "vector-sum": TokenType.VECTOR_SUM,
+    "vector->list": TokenType.VECTOR_TO_LIST,
+    "list->vector": TokenType.LIST_TO_VECTOR,
+    "vector?": TokenType.IS_VECTOR,
+    "define-memoized": TokenType.DEFINE_MEMOIZED,
+    "memoize": TokenType.MEMOIZE,
+    "memo-stats": TokenType.MEMO_STATS,
+    "define-syntax": TokenType.DEFINE_SYNTAX,
+    "syntax-rules": TokenType.SYNTAX_RULES,
+    "quotient": TokenType.QUOTIENT,
+    "remainder": TokenType.REMAINDER,
+    "modulo": TokenType.MODULO,
+    "expt": TokenType.EXPT,
+    "exact": TokenType.EXACT,
+    "inexact->exact": TokenType.EXACT,
+    "inexact": TokenType.INEXACT,
+    "exact->inexact": TokenType.INEXACT,
+    "exact?": TokenType.IS_EXACT,
+    "inexact?": TokenType.IS_INEXACT,
+    "number?": TokenType.IS_NUMBER,
+    "integer?": TokenType.IS_INTEGER,
+    "rational?": TokenType.IS_RATIONAL,
+    "numerator": TokenType.NUMERATOR,
+    "denominator": TokenType.DENOMINATOR,
+    "truncate": TokenType.TRUNCATE,
+    "string?": TokenType.IS_STRING,
+    "symbol?": TokenType.IS_SYMBOL,
+    "string-length": TokenType.STRING_LENGTH,
+    "string-append": TokenType.STRING_APPEND,
+    "substring": TokenType.SUBSTRING,
+    "string-split": TokenType.STRING_SPLIT,
+    "string->symbol": TokenType.STRING_TO_SYMBOL,
+    "symbol->string": TokenType.SYMBOL_TO_STRING,
+    "number->string": TokenType.NUMBER_TO_STRING,
+    "string->number": TokenType.STRING_TO_NUMBER,
+    "open-output-string": TokenType.OPEN_OUTPUT_STRING,
+    "get-output-string": TokenType.GET_OUTPUT_STRING,
+    "write-string": TokenType.WRITE_STRING,
+    "display": TokenType.DISPLAY,
+    "newline": TokenType.NEWLINE,
+}
+
+# every lexeme that isn't a number or a string maps to one shared token, so
+# classifying it is a single lookup
+_NAMED_TOKENS: Dict[str, Token] = {
+    name: Symbol(token_type, name) for name, token_type in _KEYWORDS.items()
+}
+_NAMED_TOKENS["#t"] = Token(TokenType.BOOLEAN, True)
+_NAMED_TOKENS["#f"] = Token(TokenType.BOOLEAN, False)
+
+# identifiers are added as they are read and only kept while they are used,
+# so reading many distinct names doesn't grow a table that lives as long as
+# the process
+symbol_table: "weakref.WeakValueDictionary[str, Symbol]" = (
+    weakref.WeakValueDictionary()
+)
+# two threads reading the same new name must get the same symbol
+_symbols_lock = threading.Lock()
+
+_NUMBER_START = frozenset("0123456789+-.")
+
+_ESCAPE = re.compile(r"\\(.)", re.DOTALL)
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r"}
+
+
+def _unescape(match: "re.Match[str]") -> str:
+    char = match.group(1)
+    return _ESCAPES.get(char, char)
+
+
+def intern(name: str) -> Token:
+    """Returns the token for name, creating an identifier if it is new"""
+    token = _NAMED_TOKENS.get(name)
+    if token is None:
+        return _identifier(name)
+    return token
+
+
+def _identifier(name: str) -> Symbol:
+    symbol = symbol_table.get(name)
+    if symbol is None:
+        with _symbols_lock:
+            symbol = symbol_table.get(name)
+            if symbol is None:
+                symbol = symbol_table[name] = Symbol(TokenType.IDENT, name)
+    return symbol
+
+
+def keywords() -> Mapping[str, TokenType]:
+    """The names of the special forms and builtins, read only"""
+    return MappingProxyType(_KEYWORDS)
+
+
+class ParseError(Exception):
+    pass
+
+
+def number_token(value) -> Token:
+    if type(value) is int:
+        return Token(TokenType.INT, value)
+    elif type(value) is float:
+        return Token(TokenType.FLOAT, value)
+    return Token(TokenType.RATIONAL, value)
+
+
+_EXACTNESS = {"#e": exact, "#i": inexact}
+
+
+def read_number(t: str) -> Optional[Token]:
+    """
+    The token of an integer, a decimal or a rational like -1/3, None if t
+    isn't a number. Rationals are read in lowest terms. A #e or #i prefix
+    makes the number exact or inexact
+    """
+    convert = _EXACTNESS.get(t[:2])
+    if convert is None:
+        return _read_real(t)
+    number = _read_real(t[2:])
+    if number is None:
+        return None
+    try:
+        return number_token(convert(number.literal))
+    except (ValueError, OverflowError):
+        # infinities and nan have no exact value
+        return None
+
+
+def _read_real(t: str) -> Optional[Token]:
+    try:
+        return Token(TokenType.INT, int(t))
+    except ValueError:
+        pass
+    try:
+        return Token(TokenType.FLOAT, float(t))
+    except ValueError:
+        pass
+    top, slash, bottom = t.partition("/")
+    if not slash or not bottom.isdigit():
+        return None
+    try:
+        return number_token(rational(int(top), int(bottom)))
+    except (ValueError, ZeroDivisionError):
+        return None
+
+
+# a lexeme is a paranthesis, a comment, a string or a run of anything else.
+# Whitespace between lexemes is skipped by finditer. A double quoted string
+# missing its closing quote continues on the next line. A single quoted one
+# ends on its line, a ' without a closing one there starts an atom
+_LEXEME = re.compile(
+    r"""(?P<comment>;.*)"""
+    r"""|(?P<paren>[()])"""
+    r"""|(?P<string>"(?:[^"\\]|\\.)*(?:"|\\?$)|'[^'\n]*')"""
+    r"""|(?P<atom>[^\s()";]+)""",
+    re.DOTALL,
+)
+_STRING_END = re.compile(r"""(?:[^"\\]|\\.)*(?:"|\\?$)""", re.DOTALL)
+
+
+def tokenize(stream: Iterable[str]) -> Iterator[Tuple[str, int, int]]:
+    """
+    Scans source text once, line by line, and lazily yields
+    (lexeme, line, column) with 1 based positions. Comments are dropped.
+    Raises ParseError for a string that is still open at the end of input
+    """
+    pending = None
+    line = 0
+    for line, text in enumerate(stream, 1):
+        pos = 0
+        if pending is not None:
+            lexeme, start_line, start_column = pending
+            match = _STRING_END.match(text)
+            assert match
+            lexeme += match.group()
+            if not _is_terminated(lexeme):
+                pending = lexeme, start_line, start_column
+                continue
+            pending = None
+            pos = match.end()
+            yield lexeme, start_line, start_column
+
+        for match in _LEXEME.finditer(text, pos):
+            kind = match.lastgroup
+            if kind == "comment":
+                break
+            lexeme = match.group()
+            if kind == "string" and not _is_terminated(lexeme):
+                pending = lexeme, line, match.start() + 1
+                break
+            yield lexeme, line, match.start() + 1
+
+    if pending is not None:
+        _, start_line, start_column = pending
+        raise ParseError(
+            f"unterminated string at line {start_line}, column {start_column}"
+        )
+
+
+def _is_terminated(string: str) -> bool:
+    if len(string) < 2 or string[-1] != string[0]:
+        return False
+    # the closing quote must not be escaped
+    backslashes = len(string) - 1 - len(string[:-1].rstrip("\\"))
+    return backslashes % 2 == 0
+
+
 @dataclass
 class Parse:
-    # recursive descent parsing
-    def parse(self, exp: List):
+    def parse(self, source: Union[str, TextIO]) -> Iterator[Tuple[bool, Any]]:
         """
-        Takes a list of tokens and recursively parses it
-        Returns
+        Reads source (a string or a text stream) one datum at a time
+        Yields
         ------
-        (status of parsing, parsed list or error message)
+        (status of parsing, parsed datum or error message). Nothing is yielded
+        after an error
+        """
+        if isinstance(source, str):
+            source = io.StringIO(source)
+        try:
+            yield from self.read(tokenize(source))
+        except ParseError as e:
+            yield False, str(e)
+
+    def read(self, lexemes: Iterable[Tuple[str, int, int]]):
         """
-        f = exp.pop(0)
-        if f == "(":
-            parsed = []
-            while len(exp) > 0 and exp[0] != ")":
-                ret, res = self.parse(exp)
-                if ret:
-                    parsed.append(res)
-            # ')' next
-            if len(exp) > 0:
-                exp.pop(0)
-                return True, parsed
+        Builds data from lexemes, yielding each top level datum as soon as it
+        is complete. Lists are built with an explicit stack, so deep nesting
+        doesn't recurse
+        """
+        stack: List[Tuple[int, int, list]] = []
+        # the symbols read so far, looked up without going through the weak
+        # symbol table again. It lives as long as the source is read
+        symbols = dict(_NAMED_TOKENS)
+        for lexeme, line, column in lexemes:
+            if lexeme == "(":
+                stack.append((line, column, []))
+                continue
+            elif lexeme == ")":
+                if not stack:
+                    yield False, (
+                        "unexpected closing paranthesis at "
+                        f"line {line}, column {column}"
+                    )
+                    return
+                datum = stack.pop()[2]
+            else:
+                datum = symbols.get(lexeme)
+                if datum is None:
+                    datum = self.get_token(lexeme)
+                    if type(datum) is Symbol:
+                        symbols[lexeme] = datum
+
+            if stack:
+                stack[-1][2].append(datum)
             else:
-                return False, "expected closing paranthesis"
-        elif f == ")":
-            return False, "unexpected closing paranthesis"
-        else:
-            return True, self.get_token(f)
+                yield True, datum
+
+        if stack:
+            line, column, _ = stack[-1]
+            yield False, (
+                "expected closing paranthesis for the one at "
+                f"line {line}, column {column}"
+            )
 
     def get_token(self, t):
-        try:
-            return Token(TokenType.INT, int(t))
-        except (TypeError, ValueError):
-            try:
-                return Token(TokenType.FLOAT, float(t))
-            except (TypeError, ValueError):
-                pass
-
-        if t == "+":
-            return Token(TokenType.PLUS, t)
-        elif t == "-":
-            return Token(TokenType.MINUS, t)
-        elif t == "*":
-            return Token(TokenType.MULTIPLY, t)
-        elif t == "/":
-            return Token(TokenType.DIVIDE, t)
-        elif t == ">":
-            return Token(TokenType.GREATER_THAN, t)
-        elif t == "<":
-            return Token(TokenType.LESS_THAN, t)
-        elif t == ">=":
-            return Token(TokenType.GREATER_EQUAL, t)
-        elif t == "<=":
-            return Token(TokenType.LESS_EQUAL, t)
-        elif t == "=":
-            return Token(TokenType.EQUAL, t)
-        elif t == "sqrt":
-            return Token(TokenType.SQRT, t)
-        elif t == "floor":
-            return Token(TokenType.FLOOR, t)
-        elif t == "ceiling":
-            return Token(TokenType.CEIL, t)
-        elif t == "round":
-            return Token(TokenType.ROUND, t)
-        elif t == "max":
-            return Token(TokenType.MAX, t)
-        elif t == "min":
-            return Token(TokenType.MIN, t)
-        elif t == "abs":
-            return Token(TokenType.ABS, t)
-        elif t == "if":
-            return Token(TokenType.IF, t)
-        elif t == "define":
-            return Token(TokenType.DEFINE, t)
-        elif t == "set!":
-            return Token(TokenType.SET, t)
-        elif t[0] == "'" or t[0] == '"':
+        token = _NAMED_TOKENS.get(t)
+        if token is not None:
+            return token
+
+        first = t[0]
+        if first in _NUMBER_START or first == "#":
+            number = read_number(t)
+            if number is not None:
+                return number
+        elif first == "'":
+            if len(t) > 1 and t[-1] == "'":
+                return Token(TokenType.STRING, t[1:-1])
+            # an unclosed ' is kept in the string, as it always was
             return Token(TokenType.STRING, t)
-        elif t == "#t" or t == "#f":
-            return Token(TokenType.BOOLEAN, t)
-        elif t == "begin":
-            return Token(TokenType.BEGIN, t)
-        elif t == "lambda":
-            return Token(TokenType.LAMBDA, t)
-        return Token(TokenType.IDENT, t)
+        elif first == '"':
+            return Token(TokenType.STRING, _ESCAPE.sub(_unescape, t[1:-1]))
+        return _identifier(t)
@@ -1,6 +1,26 @@
-from fractions import Fraction
-import math
-import operator as op
+from dataclasses import dataclass
+from typing import Any, Callable, List
+
+
+@dataclass(repr=False, eq=False)
+class Procedure:
+    """
+    A user defined procedure. env is the frame the lambda was evaluated in,
+    calling the procedure binds params in a new frame chained to it. apply
+    runs it for builtins calling back into scheme, like map
+    """
+
+    params: List[str]
+    body: List[Any]
+    env: Any
+    apply: Callable[["Procedure", List[Any]], Any]
+    name: str = "lambda"
+
+    def __call__(self, *args):
+        return self.apply(self, list(args))
+
+    def __repr__(self):
+        return f"#<procedure {self.name}>"
 
 
 def reduce(f, *iterable):
@@ -19,29 +39,15 @@ def reduce(f, *iterable):
     return result
 
 
-def ceiling(n):
-    try:
-        return math.ceil(n)
-    except TypeError:
-        return math.ceil(Fraction(n))
-
-
-def floor(n):
-    try:
-        return math.floor(n)
-    except TypeError:
-        return math.floor(Fraction(n))
-
-
-def divide(a, b):
-    try:
-        return Fraction(a, b)
-    except TypeError:
-        return op.truediv(a, b)
-
-
-def scm_round(n):
-    try:
-        round(n)
-    except TypeError:
-        return round(Fraction(n))
+def to_string(value) -> str:
+    """The external representation of a value, as printed by the REPL"""
+    if value is True:
+        return "#t"
+    elif value is False:
+        return "#f"
+    elif isinstance(value, str):
+        return '"' + value.replace("\\", "\\\\").replace('"', '\\"') + '"'
+    elif callable(value):
+        name = getattr(value, "name", None)
+        return f"#<procedure {name}>" if name else "#<procedure>"
+    return str(value)
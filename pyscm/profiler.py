@@ -0,0 +1,117 @@
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+import time
+from typing import Dict, List
+
+from .parse import keywords
+
+
+@dataclass
+class ProcedureStats:
+    calls: int = 0
+    # time from entering the procedure until it returns, including callees
+    inclusive: float = 0.0
+    # time spent in the procedure's own body
+    exclusive: float = 0.0
+
+
+class Profiler:
+    """
+    Collects per procedure call counts and times while a backend runs with it.
+    Backends call enter when a procedure is applied, tail when a tail call
+    replaces the running procedure and exit when it returns
+    """
+
+    def __init__(self, env):
+        self.stats: Dict[str, ProcedureStats] = defaultdict(ProcedureStats)
+        self.builtins: Counter = Counter()
+        self.max_depth = 0
+        # call frames and closures created
+        self.allocations = 0
+        # exclusive seconds per call stack, for flamegraph tools
+        self.collapsed: Dict[str, float] = defaultdict(float)
+
+        # [name, start, time spent in callees] per running procedure
+        self.stack: List[list] = []
+        # how often each name is on the stack, recursive calls only count
+        # towards inclusive time once
+        self.active: Counter = Counter()
+
+        self.builtin_names = {}
+        # from the keywords only, the symbol table grows with every identifier.
+        # A builtin with aliases is reported by its first name
+        for name, token_type in keywords().items():
+            builtin = env.get(token_type)
+            if builtin is not None:
+                self.builtin_names.setdefault(builtin, name)
+
+    def enter(self, name: str):
+        self.stats[name].calls += 1
+        self.allocations += 1
+        self.active[name] += 1
+        self.stack.append([name, time.perf_counter(), 0.0])
+        if len(self.stack) > self.max_depth:
+            self.max_depth = len(self.stack)
+
+    def exit(self):
+        now = time.perf_counter()
+        path = ";".join(entry[0] for entry in self.stack)
+        name, start, children = self.stack.pop()
+        elapsed = now - start
+
+        stats = self.stats[name]
+        stats.exclusive += elapsed - children
+        self.collapsed[path] += elapsed - children
+        self.active[name] -= 1
+        if self.active[name] == 0:
+            stats.inclusive += elapsed
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def tail(self, name: str):
+        self.exit()
+        self.enter(name)
+
+    def unwind(self, depth: int):
+        """Exits the procedures above depth, which an error abandoned"""
+        while len(self.stack) > depth:
+            self.exit()
+
+    def builtin(self, procedure):
+        self.builtins[self.builtin_names.get(procedure, repr(procedure))] += 1
+
+    def allocate(self):
+        self.allocations += 1
+
+    def report(self) -> str:
+        lines = [
+            f"{'procedure':<24}{'calls':>10}{'inclusive (ms)':>16}"
+            f"{'exclusive (ms)':>16}"
+        ]
+        by_time = sorted(
+            self.stats.items(), key=lambda item: item[1].exclusive, reverse=True
+        )
+        for name, stats in by_time:
+            lines.append(
+                f"{name:<24}{stats.calls:>10}{stats.inclusive * 1000:>16.2f}"
+                f"{stats.exclusive * 1000:>16.2f}"
+            )
+
+        lines.append("")
+        lines.append(f"{'builtin':<24}{'calls':>10}")
+        for name, calls in self.builtins.most_common():
+            lines.append(f"{name:<24}{calls:>10}")
+
+        lines.append("")
+        lines.append(f"max depth: {self.max_depth}")
+        lines.append(f"allocations: {self.allocations}")
+        return "\n".join(lines)
+
+    def write_collapsed(self, path: str):
+        """
+        Writes one "caller;callee exclusive-microseconds" line per call stack,
+        the input format of flamegraph.pl and speedscope
+        """
+        with open(path, "w") as f:
+            for stack, seconds in sorted(self.collapsed.items()):
+                f.write(f"{stack} {round(seconds * 1_000_000)}\n")
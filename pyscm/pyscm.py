@@ -1,91 +1,261 @@
 import sys
-from typing import Any, List, Tuple, Union
+from typing import Any, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
 
-from .env import global_env
+from . import cache
+from .compile import Compile
+from .env import Env, global_env
 from .evaluate import EvalStatus, Evaluate
+from .expand import Expander
+from .limits import Limits, Meter
+from .optimize import Optimizer
 from .parse import Parse
+from .procedure import to_string
+from .profiler import Profiler
+from .resolve import free_globals, undefined_globals
+from .strings import current_output
+from .vm import Machine
 
 SUCCESS = True
 FAILURE = False
 
+# "tree" walks the parsed expressions directly, "closure" compiles them to
+# python closures first and "vm" compiles them to bytecode for a stack machine
+BACKENDS = ("tree", "closure", "vm")
+
 
 class Interpret:
-    def __init__(self, env: dict):
-        self.env = env
+    def __init__(
+        self,
+        env: Env,
+        backend: str = "tree",
+        profile: bool = False,
+        limits: Optional[Limits] = None,
+        optimize: bool = False,
+        output: Optional[TextIO] = None,
+    ):
+        """
+        Definitions are bound in a frame of the interpreter's own chained to
+        env, so interpreters sharing env don't see each other's definitions.
+        With profile set, self.profiler collects call counts and timings of
+        everything interpreted. limits bound every call of interpret and the
+        other methods evaluating source, self.meter holds the counters of the
+        latest one. With optimize set every form is rewritten by
+        self.optimizer before it is evaluated. output is the current output
+        port, which display, write-string and newline write to without a port
+        of their own. It is standard output when None
+        """
+        self.output = output
+        self.env = Env({}, env)
+        self.limits = limits
+        self.meter: Optional[Meter] = None
         self.parser = Parse()
-        self.evaluator = Evaluate(self.parser, self.env)
+        # macros are defined per interpreter like everything else
+        self.expander = Expander()
+        self.optimizer = Optimizer(env) if optimize else None
+        self.profiler = Profiler(env) if profile else None
+        if backend == "tree":
+            self.evaluator = Evaluate(self.parser, self.env, self.profiler)
+        elif backend == "closure":
+            self.evaluator = Compile(self.parser, self.env, self.profiler)
+        elif backend == "vm":
+            self.evaluator = Machine(self.parser, self.env, self.profiler)
+        else:
+            raise ValueError(f"unknown backend {backend}")
 
-    def split_expression(self, exp: str):
-        lines = exp.replace("(", " ( ").replace(")", " ) ").split("\n")
+    def interpret(
+        self, exp: Union[str, TextIO]
+    ) -> Tuple[bool, Union[List[Any], None, str]]:
+        """
+        exp is source code or a text stream of it. Each top level expression
+        is evaluated as soon as it has been read
+        """
+        if not exp:
+            return SUCCESS, None
+        return self.interpret_parsed(self.parser.parse(exp))
 
-        def filter_comment(line):
-            line = line.lstrip()
-            return line and line[0] != ";"
+    def interpret_file(
+        self, file: str, use_cache: bool = True
+    ) -> Tuple[bool, Union[List[Any], None, str]]:
+        """stream_file, collecting the results"""
+        return self.collect(self.stream_file(file, use_cache))
 
-        expr_without_comments = list(filter(filter_comment, lines))
+    def interpret_parsed(
+        self, parsed: Iterable[Tuple[bool, Any]]
+    ) -> Tuple[bool, Union[List[Any], None, str]]:
+        """Evaluates the output of Parse.parse"""
+        return self.collect(self.stream_parsed(parsed))
 
-        return "".join(expr_without_comments).split()
+    def stream(self, exp: Union[str, TextIO]) -> Iterator[Tuple[bool, Any]]:
+        """
+        Like interpret, but yields (SUCCESS, value) for every expression with
+        a value as soon as it has been evaluated, so nothing is kept. A
+        failure yields (FAILURE, message) and ends the stream
+        """
+        if exp:
+            yield from self.stream_parsed(self.parser.parse(exp))
 
-    def interpret(self, exp: str) -> Tuple[bool, Union[List[Any], None, str]]:
-        if not exp:
-            return SUCCESS, None
+    def stream_file(
+        self, file: str, use_cache: bool = True, check: bool = True
+    ) -> Iterator[Tuple[bool, Any]]:
+        """
+        stream for the file at path file. With check set variables it uses
+        without defining them are reported before any of it runs, which needs
+        the whole file unless the cache holds the names it uses. Raises
+        OSError if the file can't be read
+        """
+        if not check and not use_cache:
+            with open(file) as f:
+                yield from self.stream_parsed(self.parser.parse(f))
+            return
 
-        to_parse = self.split_expression(exp)
-        status = SUCCESS
+        # the names depend on the macros the file is expanded with, they are
+        # only cached for files expanded with none but their own
+        if use_cache and check and not self.expander.macros:
+            forms, names = cache.load_analyzed(file, self.parser, _free_globals)
+            if names is not None:
+                undefined = [name for name in names if name not in self.env]
+                if undefined:
+                    yield FAILURE, f"undefined variable {', '.join(undefined)}"
+                    return
+                yield from self.stream_parsed(forms)
+                return
+            parsed = list(forms)
+        elif use_cache:
+            parsed = list(cache.load(file, self.parser))
+        else:
+            with open(file) as f:
+                parsed = list(self.parser.parse(f))
+        if not check:
+            yield from self.stream_parsed(parsed)
+            return
+
+        # macro uses look like calls of undefined procedures until expanded
+        expanded = list(self.expander.expand_parsed(parsed))
+        datums = (datum for ok, datum in expanded if ok)
+        undefined = undefined_globals(datums, self.env)
+        if undefined:
+            yield FAILURE, f"undefined variable {', '.join(undefined)}"
+            return
+        yield from self.stream_expanded(expanded)
+
+    def stream_parsed(
+        self, parsed: Iterable[Tuple[bool, Any]]
+    ) -> Iterator[Tuple[bool, Any]]:
+        """Evaluates the output of Parse.parse, expanding macros first"""
+        yield from self.stream_expanded(self.expander.expand_parsed(parsed))
+
+    def stream_expanded(
+        self, parsed: Iterable[Tuple[bool, Any]]
+    ) -> Iterator[Tuple[bool, Any]]:
+        """stream_parsed for forms whose macros have already been expanded"""
+        if self.limits is not None:
+            self.meter = self.evaluator.meter = Meter(self.limits)
+        try:
+            for ret, parsed_or_msg in parsed:
+                if not ret:
+                    yield FAILURE, f"{parsed_or_msg}"
+                    return
+                if self.optimizer is not None:
+                    parsed_or_msg = self.optimizer.optimize_toplevel(parsed_or_msg)
+                # set around each form only, the stream yields between them
+                output = current_output.set(self.output)
+                try:
+                    evaluation = self.evaluator.evaluate(parsed_or_msg)
+                finally:
+                    current_output.reset(output)
+                if evaluation.status != EvalStatus.SUCCESS:
+                    yield FAILURE, evaluation.result
+                    return
+                if evaluation.result is not None:
+                    yield SUCCESS, evaluation.result
+        finally:
+            if self.meter is not None:
+                self.meter.stop()
+
+    def collect(
+        self, stream: Iterator[Tuple[bool, Any]]
+    ) -> Tuple[bool, Union[List[Any], None, str]]:
         results = []
-        while len(to_parse) > 0:
-            ret, parsed_or_msg = self.parser.parse(to_parse)
-            if not ret:
-                return FAILURE, f"{parsed_or_msg}"
-            else:
-                evaluation = self.evaluator.evaluate(parsed_or_msg)
-                status = evaluation.status
-                result = evaluation.result
-                if status == EvalStatus.FAILURE:
-                    return FAILURE, result
-                else:
-                    if result:
-                        results.append(result)
+        for status, result in stream:
+            if status == FAILURE:
+                return FAILURE, result
+            results.append(result)
         return SUCCESS, results
 
 
-def run_repl():
+def _free_globals(forms: List[Any]) -> Optional[List[str]]:
+    """
+    The global variables forms use without defining them once expanded with
+    only their own macros, None if expanding them fails
+    """
+    expanded = list(Expander().expand_parsed((True, form) for form in forms))
+    if not all(ok for ok, _ in expanded):
+        return None
+    return free_globals(datum for _, datum in expanded)
+
+
+def run_repl(backend="tree", limits=None):
     try:
-        interpreter = Interpret(global_env)
+        interpreter = Interpret(global_env, backend, limits=limits, output=sys.stdout)
         while True:
             exp = input("pyscm> ")
-            status, results = interpreter.interpret(exp)
-            if status == SUCCESS:
-                if isinstance(results, List):
-                    for result in results:
-                        if result:
-                            print(result)
-                elif results:
-                    print(results)
-            else:
-                print("error:", results)
+            for status, result in interpreter.stream(exp):
+                if status == SUCCESS:
+                    print(to_string(result))
+                else:
+                    print("error:", result)
     except (KeyboardInterrupt, EOFError):
         sys.exit(1)
 
 
-def interpret_from_file(file):
+def interpret_from_file(
+    file,
+    backend="tree",
+    use_cache=True,
+    profile=False,
+    collapsed=None,
+    check=True,
+    limits=None,
+    optimize=False,
+    dump=False,
+):
+    """
+    Prints every value as soon as it has been evaluated. file - reads
+    standard input as it arrives. With profile set a profile report is
+    printed to stderr afterwards, and written as collapsed stacks to the file
+    collapsed if it is given. With dump set the optimized forms are printed
+    to stderr before they are evaluated
+    """
     try:
-        if not file.endswith("scm"):
+        interpreter = Interpret(
+            global_env,
+            backend,
+            profile or bool(collapsed),
+            limits,
+            optimize or dump,
+            output=sys.stdout,
+        )
+        if dump:
+            interpreter.optimizer.dump = sys.stderr  # type: ignore
+        if file == "-":
+            stream = interpreter.stream(sys.stdin)
+        elif file.endswith("scm"):
+            stream = interpreter.stream_file(file, use_cache, check)
+        else:
             print("Can only interpret scheme file")
             sys.exit(1)
-        interpreter = Interpret(global_env)
-        f = open(file)
-        contents = f.read()
-        status, results = interpreter.interpret(contents)
-        if status == SUCCESS:
-            if isinstance(results, List):
-                for result in results:
-                    if result:
-                        print(result)
-            elif results:
-                print(results)
-        else:
-            print("error:", results)
+
+        for status, result in stream:
+            if status == SUCCESS:
+                print(to_string(result))
+            else:
+                print("error:", result)
+
+        if interpreter.profiler is not None:
+            if profile:
+                print(interpreter.profiler.report(), file=sys.stderr)
+            if collapsed:
+                interpreter.profiler.write_collapsed(collapsed)
     except OSError as e:
         print(e)
         sys.exit(1)
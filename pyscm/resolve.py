@@ -0,0 +1,187 @@
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .let import LET_FORMS, parse_let
+from .memoize import expand_define_memoized
+from .parse import Token, TokenType
+
+
+class Scope:
+    """
+    The variables of one procedure's call frame. A frame is a list holding
+    the enclosing frame in slot 0, then the parameters, then the names defined
+    in the body, so every variable has a fixed slot known at compile time
+    """
+
+    __slots__ = ("names", "nparams", "closed")
+
+    def __init__(self, names: List[str], nparams: int, closed: bool = False):
+        self.names = names
+        self.nparams = nparams
+        # set for the part of a frame visible while the rest is being bound,
+        # nothing can be defined in it
+        self.closed = closed
+
+    def slot(self, name: str) -> Optional[int]:
+        try:
+            return self.names.index(name) + 1
+        except ValueError:
+            return None
+
+    def define(self, name: str) -> int:
+        """Returns the slot of name, adding one for it if it is new"""
+        slot = self.slot(name)
+        if slot is None:
+            self.names.append(name)
+            slot = len(self.names)
+        return slot
+
+
+def resolve(name: str, scopes: Sequence[Scope]) -> Tuple[int, Optional[int]]:
+    """
+    Returns (depth, slot) of a variable, depth being the number of frames
+    out from the innermost one. slot is None for globals
+    """
+    for depth, scope in enumerate(scopes):
+        slot = scope.slot(name)
+        if slot is not None:
+            return depth, slot
+    return len(scopes), None
+
+
+def procedure_scope(params, body) -> Scope:
+    """
+    The scope of a lambda. Slots for internal defines are allocated up front,
+    so references compiled before the define still resolve to the slot
+    """
+    names = [param.literal for param in params]
+    for defined in body_defines(body):
+        if defined not in names:
+            names.append(defined)
+    return Scope(names, len(params))
+
+
+def let_scope(let) -> Scope:
+    """
+    The scope of the frame of a let, let* or letrec, laid out like the call
+    frame of a procedure taking the variables. A letrec's variables can be
+    read before they are assigned, so none of them count as parameters
+    """
+    scope = procedure_scope(let.params, let.body)
+    if let.token_type == TokenType.LETREC:
+        scope.nparams = 0
+    return scope
+
+
+def partial_scope(scope: Scope, n: int) -> Scope:
+    """The scope of the first n variables of a frame, all of them assigned"""
+    return Scope(scope.names[:n], n, closed=True)
+
+
+def body_defines(body) -> List[str]:
+    names = []
+    for exp in body:
+        if isinstance(exp, Token) or len(exp) < 2:
+            continue
+        head = exp[0]
+        if not isinstance(head, Token):
+            continue
+        if head.token_type == TokenType.BEGIN:
+            names.extend(body_defines(exp[1:]))
+        elif head.token_type in (TokenType.DEFINE, TokenType.DEFINE_MEMOIZED):
+            target = exp[1]
+            if not isinstance(target, Token):
+                target = target[0] if len(target) > 0 else None
+            if isinstance(target, Token):
+                names.append(target.literal)
+    return names
+
+
+def undefined_globals(forms: Iterable, env) -> List[str]:
+    """
+    The global variables a program refers to without ever defining them, in
+    order of first use. Forms are only read, never evaluated, so this reports
+    them before anything runs. Ill-formed expressions are skipped, running
+    them reports the error
+    """
+    return [name for name in free_globals(forms) if name not in env]
+
+
+def free_globals(forms: Iterable) -> List[str]:
+    """undefined_globals before looking the names up in an environment"""
+    defined: Dict[str, None] = {}
+    used: Dict[str, None] = {}
+    for exp in forms:
+        _walk(exp, [], defined, used)
+    return [name for name in used if name not in defined]
+
+
+def _walk(exp, scopes: List[set], defined: dict, used: dict):
+    if isinstance(exp, Token):
+        if exp.token_type == TokenType.IDENT and not any(
+            exp.literal in scope for scope in scopes
+        ):
+            used.setdefault(exp.literal)
+        return
+    if len(exp) == 0:
+        return
+
+    head = exp[0]
+    token_type = head.token_type if isinstance(head, Token) else None
+    if token_type == TokenType.DEFINE and len(exp) >= 3:
+        target = exp[1]
+        if isinstance(target, Token):
+            _bind(target, scopes, defined)
+            _walk(exp[2], scopes, defined, used)
+        elif len(target) > 0 and isinstance(target[0], Token):
+            _bind(target[0], scopes, defined)
+            _walk_procedure(target[1:], exp[2:], scopes, defined, used)
+    elif token_type == TokenType.DEFINE_MEMOIZED:
+        expansion = expand_define_memoized(exp)
+        if expansion is not None:
+            _walk(expansion, scopes, defined, used)
+    elif token_type == TokenType.LAMBDA and len(exp) >= 3:
+        _walk_procedure(exp[1], exp[2:], scopes, defined, used)
+    elif token_type in LET_FORMS:
+        let = parse_let(exp)
+        if let is None:
+            return
+        if let.token_type == TokenType.LET:
+            for init in let.inits:
+                _walk(init, scopes, defined, used)
+        if let.name is not None:
+            _walk_procedure(
+                let.params, let.body, [{let.name.literal}, *scopes], defined, used
+            )
+            return
+        scope = set(let_scope(let).names)
+        if let.token_type == TokenType.LET_STAR:
+            for i, init in enumerate(let.inits):
+                names = {param.literal for param in let.params[:i]}
+                _walk(init, [names, *scopes], defined, used)
+        elif let.token_type == TokenType.LETREC:
+            for init in let.inits:
+                _walk(init, [scope, *scopes], defined, used)
+        for e in let.body:
+            _walk(e, [scope, *scopes], defined, used)
+    else:
+        for e in exp:
+            _walk(e, scopes, defined, used)
+
+
+def _walk_procedure(params, body, scopes: List[set], defined: dict, used: dict):
+    if isinstance(params, Token) or not all(
+        isinstance(param, Token) for param in params
+    ):
+        return
+    scope = set(procedure_scope(params, body).names)
+    for exp in body:
+        _walk(exp, [scope, *scopes], defined, used)
+
+
+def _bind(target: Token, scopes: List[set], defined: dict):
+    if target.token_type != TokenType.IDENT:
+        return
+    if scopes:
+        scopes[0].add(target.literal)
+    else:
+        defined.setdefault(target.literal)
@@ -0,0 +1,290 @@
+import io
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import socketserver
+import stat
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from .env import global_env
+from .limits import Limits
+from .procedure import to_string
+from .pyscm import BACKENDS, SUCCESS, Interpret
+
+# Requests and responses are json objects, one per line. A request holds the
+# "source" to evaluate and optionally the "backend" to run it with and its
+# "limits", an object with "steps", "timeout" and "memory" that can only
+# tighten the limits the server was started with. It is
+# answered with a {"result": ...} line per value, printed like the REPL does,
+# as soon as the expression is evaluated, then {"status": "ok"} or
+# {"status": "error", "error": message}. What an expression writes with
+# display, write-string and newline comes in an {"output": text} line before
+# its result
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    """host:port is a TCP address, anything else the path of a unix socket"""
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def request_limits(request: Dict[str, Any], limits: Limits) -> Limits:
+    """The request's own limits within limits. Raises ValueError if invalid"""
+    requested = request.get("limits", {})
+    if not isinstance(requested, dict) or set(requested) - set(vars(limits)):
+        raise ValueError("invalid limits")
+    for value in requested.values():
+        number = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if value is not None and not number:
+            raise ValueError("invalid limits")
+    return Limits(**requested).within(limits)
+
+
+def evaluate_request(
+    request: Dict[str, Any], limits: Limits = Limits()
+) -> Iterator[Dict[str, Any]]:
+    source = request.get("source")
+    backend = request.get("backend", "tree")
+    if not isinstance(source, str):
+        yield {"status": "error", "error": "request has no source"}
+        return
+    if backend not in BACKENDS:
+        yield {"status": "error", "error": f"unknown backend {backend}"}
+        return
+    try:
+        limits = request_limits(request, limits)
+    except ValueError as e:
+        yield {"status": "error", "error": str(e)}
+        return
+
+    # a new interpreter per request, so definitions don't leak from one
+    # request into the next
+    output = io.StringIO()
+    interpreter = Interpret(global_env, backend, limits=limits, output=output)
+    try:
+        for status, result in interpreter.stream(source):
+            yield from _take_output(output)
+            if status != SUCCESS:
+                yield {"status": "error", "error": str(result)}
+                return
+            yield {"result": to_string(result)}
+    except Exception as e:
+        yield from _take_output(output)
+        yield {"status": "error", "error": str(e)}
+        return
+    yield from _take_output(output)
+    yield {"status": "ok"}
+
+
+def _take_output(output: io.StringIO) -> Iterator[Dict[str, Any]]:
+    """An output message with what was written since the last one, if any"""
+    text = output.getvalue()
+    if text:
+        output.seek(0)
+        output.truncate()
+        yield {"output": text}
+
+
+def _serve_worker(connection, limits: Limits):
+    # ctrl-c in a terminal reaches the whole process group, the server shuts
+    # its workers down itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        for message in evaluate_request(request, limits):
+            connection.send(message)
+
+
+class Worker:
+    """
+    An interpreter process that has already imported everything, evaluating
+    the requests sent to it one at a time
+    """
+
+    def __init__(self, limits: Limits = Limits()):
+        self.limits = limits
+        self.connection, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_serve_worker, args=(child, limits), daemon=True
+        )
+        self.process.start()
+        child.close()
+        # set while the worker owes messages for a request
+        self.pending = False
+
+    def submit(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        self.connection.send(request)
+        self.pending = True
+        while self.pending:
+            message = self.connection.recv()
+            if "status" in message:
+                self.pending = False
+            yield message
+
+    def drain(self):
+        """Discards the rest of an abandoned request's messages"""
+        while self.pending:
+            if "status" in self.connection.recv():
+                self.pending = False
+
+    def close(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.connection.close()
+
+
+class WorkerPool:
+    """
+    Hands each request to an idle worker, waiting for one if all are busy.
+    limits bound every request
+    """
+
+    def __init__(self, size: int, limits: Limits = Limits()):
+        self.limits = limits
+        self.workers = [Worker(limits) for _ in range(size)]
+        self.idle: queue.Queue = queue.Queue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def submit(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        worker = self.idle.get()
+        try:
+            yield from worker.submit(request)
+        except (EOFError, OSError):
+            # the worker died, a fresh one takes its place
+            worker = self.replace(worker)
+            yield {"status": "error", "error": "worker exited"}
+        finally:
+            try:
+                worker.drain()
+            except (EOFError, OSError):
+                worker = self.replace(worker)
+            self.idle.put(worker)
+
+    def replace(self, worker: Worker) -> Worker:
+        worker.close()
+        fresh = Worker(self.limits)
+        self.workers[self.workers.index(worker)] = fresh
+        return fresh
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                request = None
+            if not isinstance(request, dict):
+                self.send({"status": "error", "error": "invalid request"})
+                continue
+            request.setdefault("backend", self.server.backend)  # type: ignore
+            for message in self.server.pool.submit(request):  # type: ignore
+                self.send(message)
+
+    def send(self, message: Dict[str, Any]):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def make_server(address: str, pool: WorkerPool, backend: str = "tree"):
+    family, location = parse_address(address)
+    if family == socket.AF_UNIX:
+        # a socket file left behind by a server that didn't shut down cleanly.
+        # Anything else at the path is left alone
+        if os.path.exists(location):
+            if not stat.S_ISSOCK(os.stat(location).st_mode):
+                raise FileExistsError(f"{location} exists and is not a socket")
+            os.unlink(location)
+        server = _UnixServer(location, _RequestHandler)
+    else:
+        server = _TCPServer(location, _RequestHandler)
+    server.pool = pool  # type: ignore
+    server.backend = backend  # type: ignore
+    return server
+
+
+def serve(
+    address: str,
+    workers: Optional[int] = None,
+    backend: str = "tree",
+    limits: Limits = Limits(),
+):
+    """Serves requests on address until interrupted"""
+    pool = WorkerPool(workers or os.cpu_count() or 1, limits)
+    server = make_server(address, pool, backend)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pool.close()
+        if server.address_family == socket.AF_UNIX:
+            os.unlink(str(server.server_address))
+
+
+def submit(
+    address: str, source: str, backend: Optional[str] = None
+) -> Iterator[Dict[str, Any]]:
+    """Sends source to the server at address, yielding its responses"""
+    request: Dict[str, Any] = {"source": source}
+    if backend is not None:
+        request["backend"] = backend
+    family, location = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(location)
+        with sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode() + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                yield message
+                if "status" in message:
+                    return
+    raise ConnectionError("server closed the connection")
+
+
+def run_client(address: str, source: str, backend: Optional[str] = None) -> int:
+    """The client for the command line. Returns the exit status"""
+    try:
+        for message in submit(address, source, backend):
+            if "output" in message:
+                print(message["output"], end="")
+            elif "result" in message:
+                print(message["result"])
+            elif message["status"] == "error":
+                print("error:", message["error"])
+                return 1
+    except OSError as e:
+        print(e)
+        return 1
+    return 0
@@ -0,0 +1,175 @@
+from contextvars import ContextVar
+import io
+import sys
+import threading
+from typing import Optional, TextIO
+import weakref
+
+from .number import is_number
+from .pair import from_iterable
+from .parse import Symbol, TokenType, read_number
+from .procedure import to_string
+
+
+class RuntimeSymbol(Symbol):
+    """
+    A symbol made by string->symbol. They are kept apart from the reader's
+    symbol table and only as long as they are used, so converting strings
+    doesn't grow a table that lives as long as the process
+    """
+
+    __slots__ = ()
+
+
+_symbols: "weakref.WeakValueDictionary[str, RuntimeSymbol]" = (
+    weakref.WeakValueDictionary()
+)
+# two threads converting the same name must get the same symbol
+_symbols_lock = threading.Lock()
+
+
+# where display, write-string and newline write without a port. Interpret sets
+# it to its output while it evaluates, None is standard output
+current_output: ContextVar[Optional[TextIO]] = ContextVar(
+    "current_output", default=None
+)
+
+
+class StringPort:
+    """
+    An output port collecting what is written to it in a StringIO, so a string
+    built from many writes takes time linear in its length instead of copying
+    it on every append
+    """
+
+    __slots__ = ("buffer",)
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+
+    def __repr__(self):
+        return "#<string-port>"
+
+
+def _string(value, name: str) -> str:
+    if type(value) is not str:
+        raise TypeError(f"{name}: {to_string(value)} is not a string")
+    return value
+
+
+def is_string(value) -> bool:
+    return type(value) is str
+
+
+def is_symbol(value) -> bool:
+    return isinstance(value, Symbol)
+
+
+def string_length(s: str) -> int:
+    return len(_string(s, "string-length"))
+
+
+def string_append(*strings) -> str:
+    return "".join([_string(s, "string-append") for s in strings])
+
+
+def substring(s: str, start: int, end: Optional[int] = None) -> str:
+    """The characters of s from start up to but not including end"""
+    _string(s, "substring")
+    if end is None:
+        end = len(s)
+    # python would accept negative indices and count from the end
+    if type(start) is not int or type(end) is not int or not 0 <= start <= end:
+        raise IndexError(f"substring: range {start} {end} is invalid")
+    if end > len(s):
+        raise IndexError(f"substring: index {end} out of range")
+    return s[start:end]
+
+
+def string_split(s: str, separator: Optional[str] = None):
+    """
+    The list of the parts of s between separators. Without a separator s is
+    split at runs of whitespace and leading or trailing whitespace is ignored
+    """
+    _string(s, "string-split")
+    if separator is not None and not _string(separator, "string-split"):
+        raise ValueError("string-split: separator is empty")
+    return from_iterable(s.split(separator))
+
+
+def string_to_symbol(s: str) -> Symbol:
+    _string(s, "string->symbol")
+    with _symbols_lock:
+        symbol = _symbols.get(s)
+        if symbol is None:
+            symbol = _symbols[s] = RuntimeSymbol(TokenType.IDENT, s)
+    return symbol
+
+
+def symbol_to_string(symbol: Symbol) -> str:
+    if not isinstance(symbol, Symbol):
+        raise TypeError(f"symbol->string: {to_string(symbol)} is not a symbol")
+    return symbol.literal  # type: ignore
+
+
+_DIGITS = {2: "b", 8: "o", 10: "d", 16: "x"}
+
+
+def number_to_string(n, radix: int = 10) -> str:
+    if not is_number(n):
+        raise TypeError(f"number->string: {to_string(n)} is not a number")
+    if radix == 10:
+        return to_string(n)
+    if radix not in _DIGITS or type(n) is not int:
+        raise ValueError("number->string: expects an integer and radix 2, 8 or 16")
+    return format(n, _DIGITS[radix])
+
+
+def string_to_number(s: str, radix: int = 10):
+    """The number s is written as, #f if it isn't one"""
+    _string(s, "string->number")
+    if radix == 10:
+        token = read_number(s)
+        return False if token is None else token.literal
+    if radix not in _DIGITS:
+        raise ValueError("string->number: radix must be 2, 8, 10 or 16")
+    try:
+        return int(s, radix)
+    except ValueError:
+        return False
+
+
+def open_output_string() -> StringPort:
+    return StringPort()
+
+
+def get_output_string(port: StringPort) -> str:
+    return _port(port, "get-output-string").buffer.getvalue()
+
+
+def write_string(s: str, port: Optional[StringPort] = None):
+    _write(_string(s, "write-string"), port, "write-string")
+
+
+def display(value, port: Optional[StringPort] = None):
+    """Writes value like the REPL prints it, but strings without quotes"""
+    _write(value if type(value) is str else to_string(value), port, "display")
+
+
+def newline(port: Optional[StringPort] = None):
+    _write("\n", port, "newline")
+
+
+def _port(value, name: str) -> StringPort:
+    if type(value) is not StringPort:
+        raise TypeError(f"{name}: {to_string(value)} is not a string port")
+    return value
+
+
+def _write(text: str, port: Optional[StringPort], name: str):
+    """Writes to the port, or to the current output without one"""
+    if port is None:
+        output = current_output.get()
+        (sys.stdout if output is None else output).write(text)
+    else:
+        _port(port, name).buffer.write(text)
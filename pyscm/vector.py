@@ -0,0 +1,210 @@
+from array import array
+from itertools import repeat
+import math
+import operator as op
+from typing import Iterable
+
+from .pair import from_iterable
+from .procedure import to_string
+
+# numpy is optional, without it element-wise float arithmetic still runs in C
+# through array and map, only slower
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None  # type: ignore
+
+# storage of a vector: "q" for 64 bit ints, "d" for floats and None for a list
+# holding anything else
+INT = "q"
+FLOAT = "d"
+
+
+class Vector:
+    """
+    A fixed length vector. Vectors of only ints or only floats are packed in
+    an array, which keeps them compact and lets the bulk operations loop in C
+    instead of in the evaluator
+    """
+
+    __slots__ = ("data",)
+
+    def __init__(self, data):
+        self.data = data
+
+    @property
+    def typecode(self):
+        return self.data.typecode if type(self.data) is array else None
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __repr__(self):
+        return "#(" + " ".join(to_string(item) for item in self.data) + ")"
+
+    def __add__(self, other):
+        return elementwise(op.add, self, other)
+
+    def __radd__(self, other):
+        return elementwise(op.add, other, self)
+
+    def __sub__(self, other):
+        return elementwise(op.sub, self, other)
+
+    def __rsub__(self, other):
+        return elementwise(op.sub, other, self)
+
+    def __mul__(self, other):
+        return elementwise(op.mul, self, other)
+
+    def __rmul__(self, other):
+        return elementwise(op.mul, other, self)
+
+
+def _kind(value):
+    """The storage a value fits in"""
+    if type(value) is Vector:
+        return value.typecode
+    elif type(value) is int:
+        return INT
+    elif type(value) is float:
+        return FLOAT
+    return None
+
+
+def _store(items: Iterable, typecode=None) -> Vector:
+    """
+    Packs items in an array of typecode, or of whatever fits all of them when
+    typecode is None. Falls back to a list for ints that don't fit in 64 bits
+    """
+    items = list(items)
+    if typecode is None:
+        kinds = {_kind(item) for item in items}
+        if kinds == {INT}:
+            typecode = INT
+        elif kinds == {FLOAT}:
+            typecode = FLOAT
+        else:
+            return Vector(items)
+    try:
+        return Vector(array(typecode, items))
+    except OverflowError:
+        return Vector(items)
+
+
+def _numpy_view(value):
+    # only called when numpy is installed
+    assert numpy is not None
+    if type(value) is not Vector:
+        return float(value)
+    elif value.typecode == FLOAT:
+        return numpy.frombuffer(value.data, numpy.float64)
+    return numpy.frombuffer(value.data, numpy.int64).astype(numpy.float64)
+
+
+def elementwise(f, a, b) -> Vector:
+    """
+    Applies f to the elements of two vectors of the same length, or to each
+    element of a vector and a scalar
+    """
+    if type(a) is Vector and type(b) is Vector:
+        if len(a) != len(b):
+            raise ValueError(
+                f"vectors of different lengths {len(a)} and {len(b)}"
+            )
+        items = map(f, a.data, b.data)
+    elif type(a) is Vector:
+        items = map(f, a.data, repeat(b))
+    else:
+        items = map(f, repeat(a), b.data)
+
+    kinds = {_kind(a), _kind(b)}
+    if kinds == {INT}:
+        # int results can outgrow 64 bits, which _store handles
+        return _store(items, INT)
+    elif kinds <= {INT, FLOAT}:
+        if numpy is not None:
+            result = f(_numpy_view(a), _numpy_view(b))
+            return Vector(array(FLOAT, result.tobytes()))
+        return Vector(array(FLOAT, items))
+    return _store(items)
+
+
+def make_vector(k: int, fill=0) -> Vector:
+    kind = _kind(fill)
+    if kind is None:
+        return Vector([fill] * k)
+    return Vector(_store([fill], kind).data * k)
+
+
+def vector(*items) -> Vector:
+    return _store(items)
+
+
+def vector_ref(v: Vector, k: int):
+    data = _vector(v, "vector-ref").data
+    _check_index(data, k, "vector-ref")
+    return data[k]
+
+
+def vector_set(v: Vector, k: int, value):
+    data = _vector(v, "vector-set!").data
+    _check_index(data, k, "vector-set!")
+    if type(data) is array and _kind(value) != data.typecode:
+        # the value doesn't fit the packed storage, keep it in a list instead
+        data = v.data = list(data)
+    try:
+        data[k] = value
+    except OverflowError:
+        data = v.data = list(data)
+        data[k] = value
+
+
+def vector_length(v: Vector) -> int:
+    return len(_vector(v, "vector-length").data)
+
+
+def vector_fill(v: Vector, fill):
+    v.data = make_vector(vector_length(v), fill).data
+
+
+def vector_map(procedure, *vectors) -> Vector:
+    """Stops at the end of the shortest vector"""
+    if not vectors:
+        raise TypeError("vector-map: expects at least one vector")
+    datas = [_vector(v, "vector-map").data for v in vectors]
+    return _store(map(procedure, *datas))
+
+
+def vector_sum(v: Vector):
+    data = _vector(v, "vector-sum").data
+    if type(data) is array and data.typecode == FLOAT:
+        return math.fsum(data)
+    return sum(data)
+
+
+def vector_to_list(v: Vector):
+    return from_iterable(_vector(v, "vector->list").data)
+
+
+def list_to_vector(lst) -> Vector:
+    return _store(lst)
+
+
+def is_vector(value) -> bool:
+    return type(value) is Vector
+
+
+def _vector(value, name: str) -> Vector:
+    if type(value) is not Vector:
+        raise TypeError(f"{name}: {to_string(value)} is not a vector")
+    return value
+
+
+def _check_index(data, k, name: str):
+    # python would accept negative indices and count from the end
+    if type(k) is not int or not 0 <= k < len(data):
+        raise IndexError(f"{name}: index {to_string(k)} out of range")
@@ -0,0 +1,607 @@
+from array import array
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .env import Env, primitive
+from .memoize import expand_define_memoized
+from .evaluate import EvalError, EvalResult, EvalStatus
+from .let import Let, parse_let
+from .limits import LimitExceeded, Meter
+from .parse import CONSTANT_TYPES, Parse, Token, TokenType
+from .profiler import Profiler
+from .resolve import (
+    Scope,
+    let_scope,
+    partial_scope,
+    procedure_scope,
+    resolve,
+)
+
+# every instruction is an opcode followed by one argument
+CONST = 0  # push consts[arg]
+LOCAL = 1  # push slot arg of the current frame
+DEREF = 2  # push slot (arg & 0xFFFF) of the frame (arg >> 16) levels out
+GLOBAL = 3  # push the global named consts[arg]
+SET_LOCAL = 4  # pop into a slot of the current frame, push None
+SET_DEREF = 5  # pop into a slot of an enclosing frame, push None
+SET_GLOBAL = 6  # pop into the existing global named consts[arg], push None
+DEFINE_GLOBAL = 7  # pop into the global named consts[arg], push None
+POP = 8  # discard the top of the stack
+JUMP = 9  # continue at arg
+JUMP_IF_FALSE = 10  # pop, continue at arg if it is #f
+CLOSURE = 11  # push a procedure for the code object consts[arg]
+CALL = 12  # call the procedure below the top arg values
+TAIL_CALL = 13  # same as CALL, reusing the current call's place
+RETURN = 14  # return the top of the stack to the caller
+PRIMITIVE1 = 15  # replace the top of the stack with consts[arg] applied to it
+PRIMITIVE2 = 16  # pop two values, push consts[arg] applied to them
+# pop (arg & 0xFFFF) values into a new frame of (arg >> 16) slots chained to
+# the current one and continue in it
+FRAME = 17
+LEAVE = 18  # continue in the frame the current one is chained to
+
+OPNAMES = [
+    "CONST",
+    "LOCAL",
+    "DEREF",
+    "GLOBAL",
+    "SET_LOCAL",
+    "SET_DEREF",
+    "SET_GLOBAL",
+    "DEFINE_GLOBAL",
+    "POP",
+    "JUMP",
+    "JUMP_IF_FALSE",
+    "CLOSURE",
+    "CALL",
+    "TAIL_CALL",
+    "RETURN",
+    "PRIMITIVE1",
+    "PRIMITIVE2",
+    "FRAME",
+    "LEAVE",
+]
+
+# marks a missing binding, None is a perfectly valid value to bind
+_MISSING = object()
+# fills the slots of internal defines until they are assigned
+_UNASSIGNED = object()
+
+
+@dataclass(repr=False)
+class CodeObject:
+    """
+    The compiled form of a procedure body or of a top level expression.
+    A call frame is a list holding the enclosing frame in slot 0, then the
+    parameters, then the names defined in the body
+    """
+
+    name: str
+    nparams: int
+    instructions: array = field(default_factory=lambda: array("l"))
+    consts: List[Any] = field(default_factory=list)
+    local_names: List[str] = field(default_factory=list)
+    # the name each DEREF instruction reads by its position, for errors
+    deref_names: Dict[int, str] = field(default_factory=dict)
+
+    def emit(self, op: int, arg: int = 0) -> int:
+        """Appends an instruction and returns its position"""
+        self.instructions.append(op)
+        self.instructions.append(arg)
+        return len(self.instructions) - 2
+
+    def patch(self, position: int, arg: int):
+        self.instructions[position + 1] = arg
+
+    def const(self, value) -> int:
+        # identity, not equality, 1 == 1.0 == True in python
+        for i, const in enumerate(self.consts):
+            if const is value:
+                return i
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def __repr__(self):
+        return f"#<code {self.name}>"
+
+
+@dataclass(repr=False, eq=False)
+class Closure:
+    code: CodeObject
+    frame: Optional[list]
+    machine: "Machine"
+
+    def __call__(self, *args):
+        return self.machine.call(self, list(args))
+
+    @property
+    def name(self):
+        return self.code.name
+
+    def __repr__(self):
+        return f"#<procedure {self.code.name}>"
+
+
+def disassemble(code: CodeObject) -> str:
+    lines = []
+    instructions = code.instructions
+    for pc in range(0, len(instructions), 2):
+        op, arg = instructions[pc], instructions[pc + 1]
+        if op in (CONST, GLOBAL, SET_GLOBAL, DEFINE_GLOBAL, CLOSURE) or op in (
+            PRIMITIVE1,
+            PRIMITIVE2,
+        ):
+            detail = f" ({code.consts[arg]!r})"
+        elif op in (DEREF, SET_DEREF):
+            detail = f" (depth {arg >> 16}, slot {arg & 0xFFFF})"
+        elif op == FRAME:
+            detail = f" (size {arg >> 16}, values {arg & 0xFFFF})"
+        else:
+            detail = ""
+        lines.append(f"{pc:>4} {OPNAMES[op]:<14}{arg}{detail}")
+    return "\n".join(lines)
+
+
+@dataclass
+class Machine:
+    """
+    Compiles parsed expressions to bytecode and runs it on a stack machine.
+    Variables are resolved to frame slots at compile time, and calls push
+    return information on an explicit stack instead of recursing in python
+    """
+
+    parser: Parse
+    env: Env
+    profiler: Optional[Profiler] = None
+    meter: Optional[Meter] = None
+
+    def __post_init__(self):
+        self.special_forms = {
+            TokenType.DEFINE: self.compile_define,
+            TokenType.DEFINE_MEMOIZED: self.compile_define_memoized,
+            TokenType.SET: self.compile_set,
+            TokenType.IF: self.compile_if,
+            TokenType.LAMBDA: self.compile_lambda,
+            TokenType.BEGIN: self.compile_begin,
+            TokenType.LET: self.compile_let,
+            TokenType.LET_STAR: self.compile_let,
+            TokenType.LETREC: self.compile_let,
+        }
+
+    def evaluate(self, exp) -> EvalResult:
+        depth = len(self.profiler.stack) if self.profiler is not None else 0
+        try:
+            result = self.run(self.assemble(exp), None)
+        except LimitExceeded as e:
+            return EvalResult(EvalStatus.LIMIT_EXCEEDED, str(e))
+        except EvalError as e:
+            return EvalResult(EvalStatus.FAILURE, str(e))
+        except Exception as e:
+            return EvalResult(EvalStatus.FAILURE, e)
+        finally:
+            # calls abandoned by an error never returned
+            if self.profiler is not None:
+                self.profiler.unwind(depth)
+        return EvalResult(EvalStatus.SUCCESS, result)
+
+    def assemble(self, exp) -> CodeObject:
+        """Compiles a top level expression"""
+        code = CodeObject("top level", 0)
+        self.compile(exp, code, (), True)
+        code.emit(RETURN)
+        return code
+
+    # the compiler. scopes are the resolve.Scope of the enclosing lambdas,
+    # innermost first, and are empty at the top level where names are global
+
+    def compile(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        if isinstance(exp, Token):
+            self.compile_token(exp, code, scopes)
+            return
+
+        if len(exp) == 0:
+            raise EvalError("attempt to call a non procedure")
+        head = exp[0]
+        if isinstance(head, Token):
+            special_form = self.special_forms.get(head.token_type)
+            if special_form is not None:
+                special_form(exp, code, scopes, tail)
+                return
+            if self.compile_primitive(exp, code, scopes):
+                return
+
+        for e in exp:
+            self.compile(e, code, scopes, False)
+        code.emit(TAIL_CALL if tail else CALL, len(exp) - 1)
+
+    def compile_primitive(self, exp, code: CodeObject, scopes: Tuple) -> bool:
+        """
+        Compiles calls to builtins with one or two arguments to a single
+        instruction. Returns False for anything else
+        """
+        head = exp[0]
+        nargs = len(exp) - 1
+        if (
+            head.token_type == TokenType.IDENT
+            or nargs not in (1, 2)
+            or self.profiler is not None
+        ):
+            return False
+        builtin = primitive(self.env, head.token_type, nargs)
+        if builtin is None:
+            return False
+        for arg in exp[1:]:
+            self.compile(arg, code, scopes, False)
+        code.emit(PRIMITIVE1 if nargs == 1 else PRIMITIVE2, code.const(builtin))
+        return True
+
+    def compile_token(self, exp: Token, code: CodeObject, scopes: Tuple):
+        if exp.token_type == TokenType.IDENT:
+            depth, slot = resolve(exp.literal, scopes)  # type: ignore
+            if slot is None:
+                code.emit(GLOBAL, code.const(exp.literal))
+            elif depth == 0 and (
+                slot <= scopes[0].nparams or scopes[0].names is code.local_names
+            ):
+                code.emit(LOCAL, slot)
+            else:
+                # LOCAL names the variable it finds unassigned after the code
+                # object's own locals, which a let's frame doesn't have
+                position = code.emit(DEREF, depth << 16 | slot)
+                code.deref_names[position] = exp.literal  # type: ignore
+            return
+
+        if exp.token_type in CONSTANT_TYPES:
+            value = exp.literal
+        else:
+            # builtins can't be rebound, so they are looked up once
+            value = self.env.get(exp.token_type)
+            if value is None:
+                raise EvalError("ill-formed special form")
+        code.emit(CONST, code.const(value))
+
+    def compile_body(self, body, code: CodeObject, scopes: Tuple, tail: bool):
+        if len(body) == 0:
+            raise EvalError("ill-formed special form")
+        for exp in body[:-1]:
+            self.compile(exp, code, scopes, False)
+            code.emit(POP)
+        self.compile(body[-1], code, scopes, tail)
+
+    def compile_begin(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        self.compile_body(exp[1:], code, scopes, tail)
+
+    def compile_define(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        if len(exp) < 3:
+            raise EvalError("ill-formed definition")
+
+        target = exp[1]
+        if isinstance(target, Token):
+            if target.token_type != TokenType.IDENT or len(exp) != 3:
+                raise EvalError("ill-formed definition")
+            name = target.literal
+            value = exp[2]
+            if self.is_lambda(value):
+                self.compile_procedure(value[1], value[2:], name, code, scopes)
+            else:
+                self.compile(value, code, scopes, False)
+        else:
+            # (define (name params...) body...) is shorthand for a named lambda
+            if len(target) == 0:
+                raise EvalError("ill-formed definition")
+            fn_name = target[0]
+            if not isinstance(fn_name, Token) or fn_name.token_type != TokenType.IDENT:
+                raise EvalError("ill-formed definition")
+            name = fn_name.literal
+            self.compile_procedure(target[1:], exp[2:], name, code, scopes)
+
+        if scopes and scopes[0].closed:
+            raise EvalError("ill-formed definition")
+        if not scopes:
+            code.emit(DEFINE_GLOBAL, code.const(name))
+            return
+        # defines inside a lambda body bind a slot of the call frame
+        code.emit(SET_LOCAL, scopes[0].define(name))
+
+    def compile_define_memoized(
+        self, exp, code: CodeObject, scopes: Tuple, tail: bool
+    ):
+        expansion = expand_define_memoized(exp)
+        if expansion is None:
+            raise EvalError("ill-formed definition")
+        self.compile(expansion, code, scopes, tail)
+
+    def compile_set(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        if len(exp) != 3:
+            raise EvalError("ill-formed special form")
+        target = exp[1]
+        if not isinstance(target, Token) or target.token_type != TokenType.IDENT:
+            raise EvalError("argument of wrong type")
+
+        self.compile(exp[2], code, scopes, False)
+        depth, slot = resolve(target.literal, scopes)  # type: ignore
+        if slot is None:
+            code.emit(SET_GLOBAL, code.const(target.literal))
+        elif depth == 0:
+            code.emit(SET_LOCAL, slot)
+        else:
+            code.emit(SET_DEREF, depth << 16 | slot)
+
+    def compile_if(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        if len(exp) not in (3, 4):
+            raise EvalError("ill-formed special form")
+
+        self.compile(exp[1], code, scopes, False)
+        to_alternative = code.emit(JUMP_IF_FALSE)
+        self.compile(exp[2], code, scopes, tail)
+        to_end = code.emit(JUMP)
+        code.patch(to_alternative, len(code.instructions))
+        if len(exp) == 4:
+            self.compile(exp[3], code, scopes, tail)
+        else:
+            code.emit(CONST, code.const(None))
+        code.patch(to_end, len(code.instructions))
+
+    def compile_let(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        """
+        A let, let* or letrec runs its body in one new frame holding its
+        variables and the names defined in its body, without making a
+        procedure or a call
+        """
+        let = parse_let(exp)
+        if let is None:
+            raise EvalError("ill-formed special form")
+        if let.name is not None:
+            self.compile_named_let(let, code, scopes, tail)
+            return
+
+        scope = let_scope(let)
+        inner = (scope, *scopes)
+        if let.token_type == TokenType.LET:
+            for init in let.inits:
+                self.compile(init, code, scopes, False)
+            enter = code.emit(FRAME, len(let.inits))
+        else:
+            # let* and letrec evaluate the inits in the new frame, assigning
+            # each variable as soon as its init is done
+            enter = code.emit(FRAME)
+            for i, init in enumerate(let.inits):
+                if let.token_type == TokenType.LET_STAR:
+                    # an init only sees the variables bound before it
+                    visible = (partial_scope(scope, i), *scopes)
+                    self.compile(init, code, visible, False)
+                else:
+                    self.compile(init, code, inner, False)
+                code.emit(SET_LOCAL, i + 1)
+                code.emit(POP)
+        self.compile_body(let.body, code, inner, tail)
+        # the size is only known once defines nested in the body have slots
+        code.patch(enter, len(scope.names) << 16 | code.instructions[enter + 1])
+        code.emit(LEAVE)
+
+    def compile_named_let(
+        self, let: Let, code: CodeObject, scopes: Tuple, tail: bool
+    ):
+        """
+        The procedure of a named let is bound to its name in a frame of its
+        own and called, so loops are tail calls, which reuse their place
+        """
+        name: str = let.name.literal  # type: ignore
+        code.emit(FRAME, 1 << 16)
+        # the slot is assigned before the procedure can run
+        self.compile_procedure(
+            let.params, let.body, name, code, (Scope([name], 1), *scopes)
+        )
+        code.emit(SET_LOCAL, 1)
+        code.emit(POP)
+        code.emit(LOCAL, 1)
+        # the inits don't see the name, the empty scope stands in for the frame
+        outside = (Scope([], 0, closed=True), *scopes)
+        for init in let.inits:
+            self.compile(init, code, outside, False)
+        code.emit(TAIL_CALL if tail else CALL, len(let.inits))
+        code.emit(LEAVE)
+
+    def compile_lambda(self, exp, code: CodeObject, scopes: Tuple, tail: bool):
+        if len(exp) < 3:
+            raise EvalError("ill-formed special form")
+        self.compile_procedure(exp[1], exp[2:], "lambda", code, scopes)
+
+    def compile_procedure(self, params, body, name, code: CodeObject, scopes: Tuple):
+        if isinstance(params, Token):
+            raise EvalError("ill-formed special form")
+        for param in params:
+            if not isinstance(param, Token) or param.token_type != TokenType.IDENT:
+                raise EvalError("ill-formed special form")
+        if len({param.literal for param in params}) != len(params):
+            raise EvalError("ill-formed special form")
+
+        procedure = CodeObject(name, len(params))
+        # the scope shares its list of names with the code object, so slots
+        # of defines nested in other forms are allocated in both
+        scope = procedure_scope(params, body)
+        procedure.local_names = scope.names
+        self.compile_body(body, procedure, (scope, *scopes), True)
+        procedure.emit(RETURN)
+        code.emit(CLOSURE, code.const(procedure))
+
+    def is_lambda(self, exp) -> bool:
+        return (
+            isinstance(exp, list)
+            and len(exp) > 2
+            and isinstance(exp[0], Token)
+            and exp[0].token_type == TokenType.LAMBDA
+        )
+
+    # the virtual machine
+
+    def call(self, closure: Closure, args: List[Any]):
+        """Runs a closure for python callers, like builtins calling back"""
+        code = closure.code
+        if code.nparams != len(args):
+            raise EvalError(
+                f"function expects {code.nparams} arguments, got {len(args)} instead"
+            )
+        if self.meter is not None:
+            self.meter.step()
+        frame = [closure.frame, *args]
+        frame.extend([_UNASSIGNED] * (len(code.local_names) - len(args)))
+        if self.profiler is None:
+            return self.run(code, frame)
+        self.profiler.enter(code.name)
+        try:
+            return self.run(code, frame)
+        finally:
+            self.profiler.exit()
+
+    def run(self, code: CodeObject, frame: Optional[list]):
+        env = self.env
+        profiler = self.profiler
+        meter = self.meter
+        top = code
+        stack: List[Any] = []
+        # (code, pc, frame) to continue with when the current call returns
+        calls: List[Tuple[CodeObject, int, Optional[list]]] = []
+        instructions = code.instructions
+        consts = code.consts
+        pc = 0
+
+        while True:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+
+            if op == LOCAL:
+                value = frame[arg]  # type: ignore
+                if value is _UNASSIGNED:
+                    raise EvalError(
+                        f"undefined variable {code.local_names[arg - 1]}"
+                    )
+                stack.append(value)
+            elif op == CONST:
+                stack.append(consts[arg])
+            elif op == PRIMITIVE2:
+                b = stack.pop()
+                stack[-1] = consts[arg](stack[-1], b)
+            elif op == PRIMITIVE1:
+                stack[-1] = consts[arg](stack[-1])
+            elif op == GLOBAL:
+                value = env.get(consts[arg], _MISSING)
+                if value is _MISSING:
+                    raise EvalError(f"undefined variable {consts[arg]}")
+                stack.append(value)
+            elif op == DEREF:
+                outer = frame
+                for _ in range(arg >> 16):
+                    outer = outer[0]  # type: ignore
+                value = outer[arg & 0xFFFF]  # type: ignore
+                if value is _UNASSIGNED:
+                    raise EvalError(
+                        f"undefined variable {code.deref_names[pc - 2]}"
+                    )
+                stack.append(value)
+            elif op == JUMP_IF_FALSE:
+                if stack.pop() is False:
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == CALL or op == TAIL_CALL:
+                if arg:
+                    args = stack[-arg:]
+                    del stack[-arg:]
+                else:
+                    args = []
+                procedure = stack.pop()
+
+                if type(procedure) is Closure:
+                    callee = procedure.code
+                    # the function should be called with expected number of arguments
+                    if callee.nparams != arg:
+                        raise EvalError(
+                            f"function expects {callee.nparams} arguments, got {arg} instead"
+                        )
+                    if meter is not None:
+                        meter.step()
+                    # a tail call doesn't come back here, so there is nothing
+                    # to remember
+                    if op == CALL:
+                        calls.append((code, pc, frame))
+                    if profiler is not None:
+                        if op == TAIL_CALL and code is not top:
+                            profiler.tail(callee.name)
+                        else:
+                            profiler.enter(callee.name)
+                    frame = [procedure.frame, *args]
+                    if len(callee.local_names) > arg:
+                        frame.extend(
+                            [_UNASSIGNED] * (len(callee.local_names) - arg)
+                        )
+                    code = callee
+                    instructions = code.instructions
+                    consts = code.consts
+                    pc = 0
+                    continue
+
+                if not callable(procedure):
+                    raise EvalError("attempt to call a non procedure")
+                if profiler is not None:
+                    profiler.builtin(procedure)
+                value = procedure(*args)
+                if op == CALL:
+                    stack.append(value)
+                    continue
+                # the builtin's value is returned from the current call
+                if profiler is not None and code is not top:
+                    profiler.exit()
+                if not calls:
+                    return value
+                code, pc, frame = calls.pop()
+                instructions = code.instructions
+                consts = code.consts
+                stack.append(value)
+            elif op == RETURN:
+                if profiler is not None and code is not top:
+                    profiler.exit()
+                if not calls:
+                    return stack.pop()
+                code, pc, frame = calls.pop()
+                instructions = code.instructions
+                consts = code.consts
+            elif op == POP:
+                stack.pop()
+            elif op == FRAME:
+                nvalues = arg & 0xFFFF
+                frame = [frame]
+                if nvalues:
+                    frame.extend(stack[-nvalues:])
+                    del stack[-nvalues:]
+                if (arg >> 16) > nvalues:
+                    frame.extend([_UNASSIGNED] * ((arg >> 16) - nvalues))
+            elif op == LEAVE:
+                frame = frame[0]  # type: ignore
+            elif op == CLOSURE:
+                if profiler is not None:
+                    profiler.allocate()
+                stack.append(Closure(consts[arg], frame, self))
+            elif op == SET_LOCAL:
+                frame[arg] = stack.pop()  # type: ignore
+                stack.append(None)
+            elif op == SET_DEREF:
+                outer = frame
+                for _ in range(arg >> 16):
+                    outer = outer[0]  # type: ignore
+                outer[arg & 0xFFFF] = stack.pop()  # type: ignore
+                stack.append(None)
+            elif op == SET_GLOBAL:
+                # set! checks if binding already exists before overwriting it
+                name = consts[arg]
+                frame_env = env.find(name)
+                if frame_env is None:
+                    raise EvalError(f"unbound variable {name}")
+                frame_env[name] = stack.pop()
+                stack.append(None)
+            elif op == DEFINE_GLOBAL:
+                env[consts[arg]] = stack.pop()
+                stack.append(None)
+            else:
+                raise EvalError(f"bad opcode {op}")
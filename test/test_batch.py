@@ -0,0 +1,81 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from pyscm.batch import evaluate_file, format_batch, read_manifest, run_batch
+from pyscm.env import global_env
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(6):
+            self.paths.append(self.write(f"file{i}.scm", f"(define n {i}) (* n n)"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, source):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as f:
+            f.write(source)
+        return path
+
+    def test_ordered_results(self):
+        bad = self.write("bad.scm", "(car 1)")
+        paths = [*self.paths[:3], bad, *self.paths[3:]]
+        results = run_batch(paths, "closure", workers=2, use_cache=False)
+        self.assertEqual([result.path for result in results], paths)
+        self.assertEqual(
+            [result.results for result in results if result.ok],
+            [[str(i * i)] for i in range(6)],
+        )
+        self.assertFalse(results[3].ok)
+        self.assertIn("not a pair", results[3].error or "")
+        summary = format_batch(results, 0.0).splitlines()[-1]
+        self.assertEqual(summary, "7 files, 1 failed in 0.00 ms")
+
+    def test_output(self):
+        path = self.write("out.scm", '(display "row") (newline) (+ 1 2) (display 4)')
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            [result] = run_batch([path], use_cache=False)
+        self.assertEqual(stdout.getvalue(), "")
+        self.assertEqual(result.output, "row\n4")
+        self.assertEqual(
+            format_batch([result], 0.0).splitlines()[1:4], ["  | row", "  | 4", "  3"]
+        )
+
+    def test_isolated(self):
+        result = evaluate_file(self.paths[0], use_cache=False)
+        self.assertTrue(result.ok)
+        self.assertNotIn("n", global_env)
+
+    def test_errors(self):
+        self.assertFalse(evaluate_file(self.write("a.txt", "1")).ok)
+        result = evaluate_file(os.path.join(self.directory.name, "missing.scm"))
+        self.assertFalse(result.ok)
+        path = self.write("undefined.scm", "(f 1)")
+        result = evaluate_file(path, use_cache=False)
+        self.assertEqual(result.error, "undefined variable f")
+
+    def test_undecodable_file(self):
+        path = os.path.join(self.directory.name, "binary.scm")
+        with open(path, "wb") as f:
+            f.write(b"\xff\xfe(+ 1 2)")
+        for use_cache in (True, False):
+            results = run_batch([path, self.paths[1]], workers=2, use_cache=use_cache)
+            self.assertFalse(results[0].ok)
+            self.assertIn("decode", results[0].error or "")
+            self.assertEqual(results[1].results, ["1"])
+
+    def test_manifest(self):
+        manifest = self.write("manifest", "file0.scm\n\n; skipped\nfile1.scm\n")
+        self.assertEqual(read_manifest(manifest), self.paths[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
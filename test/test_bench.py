@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+
+from pyscm.bench import (
+    BenchResult,
+    compare,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class TestBench(unittest.TestCase):
+    def test_run(self):
+        [result] = run_benchmarks("closure", ["nesting"], repeat=1)
+        self.assertEqual(result.name, "nesting")
+        self.assertGreater(result.parse_time, 0)
+        self.assertGreater(result.eval_time, 0)
+        self.assertGreater(result.peak_memory, 0)
+
+        with self.assertRaises(ValueError):
+            run_benchmarks("closure", ["missing"])
+
+    def test_compare(self):
+        baseline = {"fib": BenchResult("fib", 0.01, 0.09, 1000.0, 10)}
+        faster = [BenchResult("fib", 0.01, 0.08, 1100.0, 10)]
+        slower = [BenchResult("fib", 0.01, 0.12, 800.0, 10)]
+        self.assertEqual(compare(faster, baseline, 0.1), [])
+        self.assertEqual(len(compare(slower, baseline, 0.1)), 1)
+        self.assertEqual(compare(slower, baseline, 0.5), [])
+
+    def test_baseline_per_backend(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            save_baseline([BenchResult("fib", 1, 2, 3, 4)], "tree", path)
+            save_baseline([BenchResult("fib", 5, 6, 7, 8)], "closure", path)
+
+            with open(path) as f:
+                self.assertEqual(set(json.load(f)), {"tree", "closure"})
+            self.assertEqual(load_baseline(path, "tree")["fib"].eval_time, 2)
+            self.assertEqual(load_baseline(path, "closure")["fib"].eval_time, 6)
+            self.assertEqual(load_baseline(path, "missing"), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+from fractions import Fraction
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from pyscm import cache
+from pyscm.env import global_env
+from pyscm.parse import Parse
+from pyscm.pyscm import Interpret
+
+SUCCESS = True
+FAILURE = False
+
+
+class CountingParse(Parse):
+    def __init__(self):
+        self.calls = 0
+
+    def parse(self, source):
+        self.calls += 1
+        return super().parse(source)
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "lib.scm")
+        self.write("(define (double n) (* n 2)) (double 21) \"s\" 1.5 -2/6 #f")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, source):
+        with open(self.path, "w") as f:
+            f.write(source)
+
+    def load(self, parser):
+        return [form for _, form in cache.load(self.path, parser)]
+
+    def test_cache_hit(self):
+        parser = CountingParse()
+        first = self.load(parser)
+        self.assertTrue(os.path.exists(cache.cache_path(self.path)))
+        second = self.load(parser)
+        self.assertEqual(parser.calls, 1)
+
+        self.assertEqual(repr(first), repr(second))
+        # symbols come back interned
+        self.assertIs(first[0][1][0], second[0][1][0])
+
+        status, result = Interpret(global_env).interpret_parsed(
+            cache.load(self.path, parser)
+        )
+        self.assertEqual(status, SUCCESS)
+        self.assertEqual(result, [42, "s", 1.5, Fraction(-1, 3), False])
+
+    def test_invalidated_on_change(self):
+        parser = CountingParse()
+        self.load(parser)
+        self.write("(+ 1 2)")
+        [form] = self.load(parser)
+        self.assertEqual(parser.calls, 2)
+        self.assertEqual(len(form), 3)
+
+    def test_invalidated_on_reader_change(self):
+        parser = CountingParse()
+        self.load(parser)
+        with mock.patch.object(cache, "READER_VERSION", b"another reader"):
+            self.load(parser)
+        self.assertEqual(parser.calls, 2)
+
+    def test_unknown_reader_not_cached(self):
+        parser = CountingParse()
+        with mock.patch.object(cache, "READER_VERSION", None):
+            self.assertEqual(len(self.load(parser)), 6)
+        self.assertFalse(os.path.exists(cache.cache_path(self.path)))
+
+    def test_errors_not_cached(self):
+        self.write("(+ 1")
+        parser = CountingParse()
+        [(status, _)] = list(cache.load(self.path, parser))
+        self.assertEqual(status, FAILURE)
+        self.assertFalse(os.path.exists(cache.cache_path(self.path)))
+
+    def test_cached_file_streams(self):
+        self.write("1 (define (f) 2) (f)")
+        list(Interpret(global_env).stream_file(self.path))
+        # a cached file is checked with the names the cache holds, then each
+        # form is decoded when it is evaluated
+        with mock.patch.object(cache, "decode", wraps=cache.decode) as decode:
+            stream = Interpret(global_env).stream_file(self.path)
+            self.assertEqual(next(stream), (SUCCESS, 1))
+            self.assertEqual(decode.call_count, 1)
+            self.assertEqual(list(stream), [(SUCCESS, 2)])
+
+    def test_cached_file_checked(self):
+        self.write("1 (undefined-here)")
+        for _ in range(2):
+            stream = Interpret(global_env).stream_file(self.path)
+            self.assertEqual(
+                list(stream), [(FAILURE, "undefined variable undefined-here")]
+            )
+
+    def test_corrupt_cache_ignored(self):
+        parser = CountingParse()
+        self.load(parser)
+        with open(cache.cache_path(self.path), "wb") as f:
+            f.write(b"garbage")
+        self.assertEqual(len(self.load(parser)), 6)
+        self.assertEqual(parser.calls, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
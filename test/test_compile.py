@@ -0,0 +1,36 @@
+import unittest
+
+from test import test_interpreter
+
+FAILURE = False
+
+
+class TestClosureBackend(test_interpreter.TestSchemeInterpreter):
+    """Runs the interpreter tests against the closure compiler"""
+
+    backend = "closure"
+
+    def test_ill_formed_lambda(self):
+        status, _ = self.interpreter.interpret("(lambda 5 5)")
+        self.assertEqual(status, FAILURE)
+
+    def test_ill_formed_before_execution(self):
+        # the whole expression is compiled first, so nothing is defined
+        status, _ = self.interpreter.interpret("(begin (define z 1) (if))")
+        self.assertEqual(status, FAILURE)
+
+        status, _ = self.interpreter.interpret("z")
+        self.assertEqual(status, FAILURE)
+
+    def test_internal_define_before_assignment(self):
+        status, _ = self.interpreter.interpret(
+            '''
+            (define (f) (define a b) (define b 1) a)
+            (f)
+            '''
+        )
+        self.assertEqual(status, FAILURE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import unittest
+
+from pyscm.expand import Expander, ExpandError
+from pyscm.parse import Parse
+
+
+class TestExpand(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parse()
+        self.expander = Expander()
+
+    def expand(self, source):
+        return [
+            str(datum)
+            for _, datum in self.expander.expand_parsed(self.parser.parse(source))
+        ]
+
+    def datum(self, source):
+        [(_, datum)] = list(self.parser.parse(source))
+        return datum
+
+    def form(self, source):
+        return str(self.datum(source))
+
+    def test_expand(self):
+        expanded = self.expand(
+            '''
+            (define-syntax unless
+                (syntax-rules ()
+                    ((_ test body ...) (if test #f (begin body ...)))))
+            (unless (> x 1) (display x) x)
+            (define (f) (unless #t))
+            '''
+        )
+        self.assertEqual(
+            expanded,
+            [
+                self.form("(if (> x 1) #f (begin (display x) x))"),
+                self.form("(define (f) (if #t #f (begin)))"),
+            ],
+        )
+
+    def test_literals_and_nested_ellipsis(self):
+        expanded = self.expand(
+            '''
+            (define-syntax my-cond
+                (syntax-rules (else)
+                    ((_ (else e)) e)
+                    ((_ (c e ...) rest ...)
+                        (if c (begin e ...) (my-cond rest ...)))))
+            (my-cond (a 1 2) (b 3) (else 4))
+            (define-syntax pairs
+                (syntax-rules () ((_ (a b ...) ...) (list (cons a (list b ...)) ...))))
+            (pairs (1 2 3) (4))
+            '''
+        )
+        self.assertEqual(
+            expanded,
+            [
+                self.form("(if a (begin 1 2) (if b (begin 3) 4))"),
+                self.form("(list (cons 1 (list 2 3)) (cons 4 (list)))"),
+            ],
+        )
+
+    def test_binders_renamed(self):
+        [expanded] = self.expand(
+            '''
+            (define-syntax swap!
+                (syntax-rules ()
+                    ((_ a b) (let ((tmp a)) (set! a b) (set! b tmp)))))
+            (swap! tmp other)
+            '''
+        )
+        # the template's tmp can't capture the one of the macro use. A ; can't
+        # be part of a name in source code
+        self.assertEqual(
+            expanded,
+            "[let, [[tmp;1, tmp]], [set!, tmp, other], [set!, other, tmp;1]]",
+        )
+
+    def test_local_variables_hide_macros(self):
+        [expanded] = self.expand(
+            '''
+            (define-syntax one (syntax-rules () ((_) 1)))
+            (list (one) (lambda (one) (one)) (let ((one car)) (one)))
+            '''
+        )
+        self.assertEqual(
+            expanded,
+            self.form("(list 1 (lambda (one) (one)) (let ((one car)) (one)))"),
+        )
+
+    def test_errors(self):
+        for source in [
+            "(define-syntax)",
+            "(define-syntax m (lambda (x) x))",
+            "(define-syntax m (syntax-rules (1)))",
+            "(define-syntax m (syntax-rules () (_ 1)))",
+            "(define-syntax m (syntax-rules () ((_ a) 1))) (m)",
+            "(define-syntax m (syntax-rules () ((_ a ...) a))) (m 1)",
+            "(define-syntax m (syntax-rules () ((_ a) (m a)))) (m 1)",
+            "(lambda () (define-syntax m (syntax-rules ())) 1)",
+        ]:
+            expander = Expander()
+            parsed = list(expander.expand_parsed(self.parser.parse(source)))
+            self.assertEqual(parsed[-1][0], False, source)
+
+        with self.assertRaises(ExpandError):
+            Expander().expand_toplevel(self.datum("(define-syntax 1 2)"))
+
+
+if __name__ == "__main__":
+    unittest.main()
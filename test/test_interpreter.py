@@ -1,7 +1,13 @@
+from fractions import Fraction
+import io
 from typing import List
+import threading
 import unittest
 
 from pyscm.env import global_env
+from pyscm.limits import Limits
+from pyscm.parse import symbol_table
+from pyscm.procedure import to_string
 from pyscm.pyscm import Interpret
 
 SUCCESS = True
@@ -9,8 +15,11 @@ FAILURE = False
 
 
 class TestSchemeInterpreter(unittest.TestCase):
+    backend = "tree"
+    optimize = False
+
     def setUp(self):
-        self.interpreter = Interpret(global_env)
+        self.interpreter = Interpret(global_env, self.backend, optimize=self.optimize)
 
     def test_basic1(self):
         status, result = self.interpreter.interpret("42")
@@ -18,49 +27,49 @@ class TestSchemeInterpreter(unittest.TestCase):
 
         # this is just to please the typechecker
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 42)
+            self.assertEqual(result[0], 42)
 
     def test_basic2(self):
         status, result = self.interpreter.interpret("#t")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "#t")
+            self.assertEqual(result[0], True)
 
     def test_basic3(self):
         status, result = self.interpreter.interpret("'abcd'")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "'abcd'")
+            self.assertEqual(result[0], "abcd")
 
     def test_abs(self):
         status, result = self.interpreter.interpret("(abs -35)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 35)
+            self.assertEqual(result[0], 35)
 
     def test_ceiling1(self):
         status, result = self.interpreter.interpret("(ceiling 13.92)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 14)
+            self.assertEqual(result[0], 14)
 
     def test_ceiling2(self):
         status, result = self.interpreter.interpret("(ceiling (/ 2 18))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 1)
+            self.assertEqual(result[0], 1)
 
     def test_ceiling3(self):
         status, result = self.interpreter.interpret("(ceiling (/ 934.2 2.45))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 382)
+            self.assertEqual(result[0], 382)
 
     def test_define(self):
         status, result = self.interpreter.interpret(
@@ -72,63 +81,122 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 34)
+            self.assertEqual(result[0], 34)
+
+    def test_unclosed_single_quote(self):
+        # a ' without a closing one on its line doesn't swallow the next lines
+        status, result = self.interpreter.interpret(
+            "(define x 'a)\n(define y 'b)\nx"
+        )
+        self.assertEqual(status, SUCCESS)
+        self.assertEqual(result, ["'a"])
 
     def test_division1(self):
         status, result = self.interpreter.interpret("(/ 2 18)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "1/9")
+            self.assertEqual(result[0], Fraction(1, 9))
+
+    def test_division_exact(self):
+        status, result = self.interpreter.interpret("(/ 18 -3)")
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], -6)
+            self.assertIs(type(result[0]), int)
+
+        status, _ = self.interpreter.interpret("(/ 1 0)")
+        self.assertEqual(status, FAILURE)
+
+    def test_fixed_arity_builtins(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (+ 5)
+            (* 7)
+            (+ 1 2 3 4)
+            (max 3 9 4)
+            (define add +)
+            (add 1 2)
+            (< 1 2)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result, [5, 7, 10, 9, 3, True])
+
+        status, _ = self.interpreter.interpret('(+ 1 "a")')
+        self.assertEqual(status, FAILURE)
+
+    def test_booleans_are_not_numbers(self):
+        for source in (
+            "(+ #t 1)",
+            "(+ #f)",
+            "(* 2 #t)",
+            "(+ 1 2 #t)",
+            "(- #t 1)",
+            "(/ 1.5 #t)",
+            "(= #t 1)",
+            "(< #f 1)",
+            '(= "a" "a")',
+            "(abs #t)",
+            "(max 1 #t)",
+            "(sqrt #t)",
+            "(expt #t 2)",
+        ):
+            status, result = self.interpreter.interpret(source)
+            self.assertEqual(status, FAILURE, source)
+            self.assertIn("expects a number", str(result))
 
     def test_division2(self):
         status, result = self.interpreter.interpret("(/ 8.8 2.2)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 4)
+            self.assertEqual(result[0], 4)
 
     def test_equal(self):
         status, result = self.interpreter.interpret("(= (+ 2 2) (* 2 2))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "#t")
+            self.assertEqual(result[0], True)
 
     def test_floor1(self):
         status, result = self.interpreter.interpret("(floor 13.92)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 13.0)
+            self.assertEqual(result[0], 13.0)
 
     def test_floor2(self):
         status, result = self.interpreter.interpret("(floor (/ 2 18))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 0)
+            self.assertEqual(result[0], 0)
 
     def test_floor3(self):
         status, result = self.interpreter.interpret("(floor (/ 934.2 2.45))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 381)
+            self.assertEqual(result[0], 381)
 
     def test_ge(self):
         status, result = self.interpreter.interpret("(>= 4 4)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "#t")
+            self.assertEqual(result[0], True)
 
     def test_le(self):
         status, result = self.interpreter.interpret("(<= 18 18)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, "#t")
+            self.assertEqual(result[0], True)
 
     def test_min_max(self):
         status, result = self.interpreter.interpret(
@@ -137,35 +205,35 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, -4)
+            self.assertEqual(result[0], -4)
 
     def test_minus(self):
         status, result = self.interpreter.interpret("(- 2 14)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, -12)
+            self.assertEqual(result[0], -12)
 
     def test_multiply(self):
         status, result = self.interpreter.interpret("(* 1 2 3 4 5)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 120)
+            self.assertEqual(result[0], 120)
 
     def test_plus(self):
         status, result = self.interpreter.interpret("(+ 1 2 3 4 5)")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 15)
+            self.assertEqual(result[0], 15)
 
     def test_round(self):
         status, result = self.interpreter.interpret("(round (/ 15 4))")
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 4)
+            self.assertEqual(result[0], 4)
 
     def test_set1(self):
         status, result = self.interpreter.interpret(
@@ -177,7 +245,7 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 26)
+            self.assertEqual(result[0], 26)
 
     def test_set2(self):
         status, _ = self.interpreter.interpret("(set! name 'siddharth')")
@@ -188,7 +256,214 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 4.0)
+            self.assertEqual(result[0], 4.0)
+
+    def test_rationals(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (+ 1/3 1/6)
+            (+ 1/2 1/2)
+            (* 2/3 3/4)
+            (- 1/2 0.25)
+            (numerator 6/4)
+            (denominator (/ 6 4))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result, [Fraction(1, 2), 1, Fraction(1, 2), 0.25, 3, 2])
+            # whole results are integers again
+            self.assertIs(type(result[1]), int)
+            self.assertEqual(to_string(result[0]), "1/2")
+
+    def test_exactness(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (exact? 1/3)
+            (inexact? 1/3)
+            (exact 2.5)
+            (inexact 1/4)
+            (exact->inexact 3)
+            (integer? 2.0)
+            (rational? 1/2)
+            (number? #t)
+            (sqrt 9/4)
+            (sqrt 2)
+            (floor 7/2)
+            (floor 3.5)
+            (round 5/2)
+            (truncate -7/2)
+            (max 1 2.5 3)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(
+                result,
+                [
+                    True,
+                    False,
+                    Fraction(5, 2),
+                    0.25,
+                    3.0,
+                    True,
+                    True,
+                    False,
+                    Fraction(3, 2),
+                    2**0.5,
+                    3,
+                    3.0,
+                    2,
+                    -3,
+                    3.0,
+                ],
+            )
+            self.assertIs(type(result[10]), int)
+            self.assertIs(type(result[14]), float)
+
+        status, _ = self.interpreter.interpret("(exact? 'a')")
+        self.assertEqual(status, FAILURE)
+
+    def test_integer_division(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (quotient 17 -5)
+            (remainder 17 -5)
+            (modulo 17 -5)
+            (modulo -7 2)
+            (expt 2 100)
+            (expt 2 -2)
+            (expt 2.0 3)
+            (expt 4 1/2)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(
+                result, [-3, 2, -3, 1, 2**100, Fraction(1, 4), 8.0, 2.0]
+            )
+
+        status, _ = self.interpreter.interpret("(quotient 1/2 3)")
+        self.assertEqual(status, FAILURE)
+        status, _ = self.interpreter.interpret("(modulo 1 0)")
+        self.assertEqual(status, FAILURE)
+
+    def test_strings(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (string-append "foo" "" "bar")
+            (string-length "héllo")
+            (substring "hello" 1 3)
+            (substring "hello" 2)
+            (string-split "a,b,,c" ",")
+            (string-split "  two  words ")
+            (number->string 1/3)
+            (number->string 255 16)
+            (string->number "-2.5")
+            (string->number "12abc")
+            (string? "s")
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[:4], ["foobar", 5, "el", "llo"])
+            self.assertEqual(to_string(result[4]), '("a" "b" "" "c")')
+            self.assertEqual(to_string(result[5]), '("two" "words")')
+            self.assertEqual(result[6:], ["1/3", "ff", -2.5, False, True])
+
+        for source in (
+            '(string-append "a" 1)',
+            '(substring "abc" 2 1)',
+            '(substring "abc" 0 4)',
+            '(string-split "abc" "")',
+        ):
+            status, _ = self.interpreter.interpret(source)
+            self.assertEqual(status, FAILURE)
+
+    def test_string_to_number_exactness(self):
+        # string->number reads the prefixes the reader does
+        status, result = self.interpreter.interpret(
+            '''
+            (string->number "#e1.5")
+            (string->number "#i1/2")
+            (string->number "#e")
+            (string->number "#einf")
+            (= (string->number "#e-0.25") #e-0.25)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result, [Fraction(3, 2), 0.5, False, False, True])
+            self.assertIs(type(result[1]), float)
+
+    def test_symbols(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define s (string->symbol "abc"))
+            s
+            (symbol? s)
+            (symbol? "abc")
+            (string->symbol (string-append "a" "bc"))
+            (symbol->string (string->symbol "12"))
+            (symbol? (string->symbol "12"))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(to_string(result[0]), "abc")
+            self.assertIs(result[3], result[0])
+            self.assertEqual(result[1:3] + result[4:], [True, False, "12", True])
+
+        status, _ = self.interpreter.interpret('(symbol->string "abc")')
+        self.assertEqual(status, FAILURE)
+
+        # symbols made at runtime stay out of the reader's symbol table
+        status, _ = self.interpreter.interpret('(string->symbol "made-at-runtime")')
+        self.assertEqual(status, SUCCESS)
+        self.assertNotIn("made-at-runtime", symbol_table)
+
+    def test_string_port(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define port (open-output-string))
+            (define (report n)
+              (if (> n 0)
+                  (begin
+                    (write-string "row " port)
+                    (display n port)
+                    (newline port)
+                    (report (- n 1)))))
+            (report 3)
+            (get-output-string port)
+            (display "done" port)
+            (string-length (get-output-string port))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result, ["row 3\nrow 2\nrow 1\n", 22])
+
+        status, _ = self.interpreter.interpret('(get-output-string "port")')
+        self.assertEqual(status, FAILURE)
+
+    def test_current_output(self):
+        output = io.StringIO()
+        interpreter = Interpret(
+            global_env, self.backend, optimize=self.optimize, output=output
+        )
+        status, result = interpreter.interpret(
+            '(display "total: ") (display (+ 1/2 1)) (newline) "done"'
+        )
+        self.assertEqual(status, SUCCESS)
+        self.assertEqual(result, ["done"])
+        self.assertEqual(output.getvalue(), "total: 3/2\n")
 
     def test_begin(self):
         status, result = self.interpreter.interpret(
@@ -200,7 +475,7 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 15)
+            self.assertEqual(result[0], 15)
 
     def test_define_with_expr(self):
         status, result = self.interpreter.interpret(
@@ -213,7 +488,7 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 2366)
+            self.assertEqual(result[0], 2366)
 
     def test_lambda(self):
         status, result = self.interpreter.interpret(
@@ -225,7 +500,13 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 30)
+            self.assertEqual(result[0], 30)
+
+    def test_duplicate_parameters(self):
+        for source in ("((lambda (x x) x) 1 2)", "(define (f a b a) a)"):
+            status, result = self.interpreter.interpret(source)
+            self.assertEqual(status, FAILURE)
+            self.assertEqual(result, "ill-formed special form")
 
     def test_lambda_in_define(self):
         status, result = self.interpreter.interpret(
@@ -238,8 +519,8 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 144)
-            self.assertEqual(result[1].literal, 361)
+            self.assertEqual(result[0], 144)
+            self.assertEqual(result[1], 361)
 
     def test_closure(self):
         status, result = self.interpreter.interpret(
@@ -256,5 +537,457 @@ class TestSchemeInterpreter(unittest.TestCase):
         self.assertEqual(status, SUCCESS)
 
         if isinstance(result, List):
-            self.assertEqual(result[0].literal, 20)
-            self.assertEqual(result[1].literal, 10)
+            self.assertEqual(result[0], 20)
+            self.assertEqual(result[1], 10)
+
+    def test_recursion(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+            (fib 15)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 610)
+
+    def test_closure_state(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define (make-counter)
+                (define n 0)
+                (lambda () (set! n (+ n 1)) n))
+            (define c1 (make-counter))
+            (define c2 (make-counter))
+            (c1)
+            (c1)
+            (c2)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 1)
+            self.assertEqual(result[1], 2)
+            self.assertEqual(result[2], 1)
+
+    def test_parameter_shadowing(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define n 100)
+            (define (add n m) (+ n m))
+            (add 1 2)
+            n
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 3)
+            self.assertEqual(result[1], 100)
+
+    def test_tail_calls(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define (count-down n acc)
+                (if (= n 0) acc (count-down (- n 1) (+ acc 1))))
+            (define (is-even n) (if (= n 0) #t (is-odd (- n 1))))
+            (define (is-odd n) (if (= n 0) #f (begin n (is-even (- n 1)))))
+            (count-down 20000 0)
+            (is-even 20001)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 20000)
+            self.assertEqual(result[1], False)
+
+    def test_native_values(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define third (/ 1 3))
+            (+ third (/ 1 6))
+            0
+            #f
+            "a \\"b\\""
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], Fraction(1, 2))
+            self.assertIs(result[1], 0)
+            self.assertIs(result[2], False)
+            self.assertEqual(result[3], 'a "b"')
+            self.assertEqual(to_string(result[3]), '"a \\"b\\""')
+
+    def test_lists(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define xs (list 1 2 3))
+            (define ys (cons 0 xs))
+            (car (cdr ys))
+            (length ys)
+            (map (lambda (x y) (* x y)) xs (list 10 20 30 40))
+            (append xs (list 4) (list))
+            (reverse xs)
+            (null? (cdr (cdr (cdr xs))))
+            (pair? (list))
+            (begin (define total 0)
+                   (for-each (lambda (x) (set! total (+ total x))) ys)
+                   total)
+            (cons 1 2)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 1)
+            self.assertEqual(result[1], 4)
+            self.assertEqual(list(result[2]), [10, 40, 90])
+            self.assertEqual(to_string(result[3]), "(1 2 3 4)")
+            self.assertEqual(to_string(result[4]), "(3 2 1)")
+            self.assertIs(result[5], True)
+            self.assertIs(result[6], False)
+            self.assertEqual(result[7], 6)
+            self.assertEqual(to_string(result[8]), "(1 . 2)")
+
+    def test_list_sharing(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define (build n acc) (if (= n 0) acc (build (- n 1) (cons n acc))))
+            (define xs (build 50000 (list)))
+            (define (sum xs acc) (if (null? xs) acc (sum (cdr xs) (+ acc (car xs)))))
+            (sum xs 0)
+            (length (map (lambda (x) (* x 2)) xs))
+            (car (append (list 0) xs))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 1250025000)
+            self.assertEqual(result[1], 50000)
+            self.assertEqual(result[2], 0)
+
+    def test_list_errors(self):
+        status, _ = self.interpreter.interpret("(car (list))")
+        self.assertEqual(status, FAILURE)
+
+        status, _ = self.interpreter.interpret("(map (lambda (x) (undefined x)) (list 1))")
+        self.assertEqual(status, FAILURE)
+
+    def test_vectors(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define v (make-vector 4 1))
+            (vector-set! v 2 5)
+            (vector-ref v 2)
+            (vector-length v)
+            (+ v (vector 10 20 30 40) 1)
+            (* 2 (vector 1.5 2.5))
+            (- (vector 1 2) (vector 0.5 0.5))
+            (vector-sum (vector-map (lambda (x) (* x x)) v))
+            (vector->list (list->vector (list 1 2 3)))
+            (vector? v)
+            (begin (vector-set! v 0 (/ 1 2)) v)
+            (+ (vector 9223372036854775807) 1)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 5)
+            self.assertEqual(result[1], 4)
+            self.assertEqual(to_string(result[2]), "#(12 22 36 42)")
+            self.assertEqual(to_string(result[3]), "#(3.0 5.0)")
+            self.assertEqual(to_string(result[4]), "#(0.5 1.5)")
+            self.assertEqual(result[5], 28)
+            self.assertEqual(to_string(result[6]), "(1 2 3)")
+            self.assertIs(result[7], True)
+            self.assertEqual(to_string(result[8]), "#(1/2 1 5 1)")
+            self.assertEqual(to_string(result[9]), "#(9223372036854775808)")
+
+    def test_vector_errors(self):
+        for exp in [
+            "(vector-ref (vector 1 2) 2)",
+            "(vector-ref (vector 1 2) -1)",
+            "(+ (vector 1 2) (vector 1 2 3))",
+            "(vector-sum (list 1 2))",
+        ]:
+            status, _ = self.interpreter.interpret(exp)
+            self.assertEqual(status, FAILURE, exp)
+
+    def test_define_memoized(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define-memoized (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+            (fib 60)
+            (memo-stats fib)
+            fib
+            (define (count-paths n)
+                (define-memoized (paths x y)
+                    (if (= x 0) 1 (if (= y 0) 1 (+ (paths (- x 1) y) (paths x (- y 1))))))
+                (paths n n))
+            (count-paths 16)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], 1548008755920)
+            self.assertEqual(to_string(result[1]), "(58 61 61 #f)")
+            self.assertEqual(to_string(result[2]), "#<procedure fib>")
+            self.assertEqual(result[3], 601080390)
+
+        status, _ = self.interpreter.interpret("(define-memoized fib 1)")
+        self.assertEqual(status, FAILURE)
+
+    def test_memoize(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define calls 0)
+            (define half
+                (memoize (lambda (x) (begin (set! calls (+ calls 1)) (/ x 2))) 2))
+            (half 1)
+            (half 1.0)
+            (half 1)
+            (half 4)
+            (half 1)
+            calls
+            (memo-stats half)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(result[0], Fraction(1, 2))
+            self.assertEqual(result[1], 0.5)
+            self.assertIs(type(result[1]), float)
+            # (half 4) evicted (half 1.0), which was used less recently
+            # than (half 1)
+            self.assertEqual(result[5], 3)
+            self.assertEqual(to_string(result[6]), "(2 3 2 2)")
+
+        status, _ = self.interpreter.interpret("(memoize 1)")
+        self.assertEqual(status, FAILURE)
+
+    def test_isolated_interpreters(self):
+        other = Interpret(global_env, self.backend)
+        self.interpreter.interpret("(define shared 1)")
+        status, _ = other.interpret("shared")
+        self.assertEqual(status, FAILURE)
+        self.assertNotIn("shared", global_env)
+
+        with self.assertRaises(TypeError):
+            global_env["shared"] = 1
+
+    def test_concurrent_interpreters(self):
+        results = {}
+
+        def run(n):
+            interpreter = Interpret(global_env, self.backend)
+            results[n] = interpreter.interpret(
+                f"""
+                (define n {n})
+                (define (loop i acc) (if (= i 0) acc (loop (- i 1) (+ acc n))))
+                (loop 2000 0)
+                """
+            )
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for n in range(8):
+            self.assertEqual(results[n], (SUCCESS, [2000 * n]))
+
+    def test_stream(self):
+        lines_read = []
+
+        def source():
+            for n in range(1, 4):
+                lines_read.append(n)
+                yield f"(* {n} 10)\n"
+            yield "(car 1)\n"
+            yield "(+ 1 1)\n"
+
+        stream = self.interpreter.stream(source())  # type: ignore
+        self.assertEqual(next(stream), (SUCCESS, 10))
+        # only what the first result needed has been read
+        self.assertEqual(lines_read, [1])
+        self.assertEqual(next(stream), (SUCCESS, 20))
+        self.assertEqual(next(stream), (SUCCESS, 30))
+        status, _ = next(stream)
+        self.assertEqual(status, FAILURE)
+        self.assertEqual(list(stream), [])
+
+    def test_let(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define x 10)
+            (let ((x 1) (y x)) (list x y))
+            (let () 5)
+            (let ((x 1)) (define y 2) (+ x y))
+            (define (adders n) (let ((m (* n 2))) (lambda (k) (+ k m))))
+            ((adders 3) 1)
+            x
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(to_string(result[0]), "(1 10)")
+            self.assertEqual(result[1:], [5, 3, 7, 10])
+
+    def test_let_star(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define x 10)
+            (let* ((y x) (x 1) (z (+ x y))) (list x y z))
+            (let* ((a 1) (f (lambda () a)) (a 2)) (list a (f)))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(to_string(result[0]), "(1 10 11)")
+            # a rebound name doesn't change what earlier inits captured
+            self.assertEqual(to_string(result[1]), "(2 1)")
+
+    def test_letrec(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (letrec ((even? (lambda (n) (if (= n 0) #t (odd? (- n 1)))))
+                     (odd? (lambda (n) (if (= n 0) #f (even? (- n 1))))))
+                (list (even? 1000) (odd? 7)))
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            self.assertEqual(to_string(result[0]), "(#t #t)")
+
+        status, _ = self.interpreter.interpret("(letrec ((a b) (b 1)) a)")
+        self.assertEqual(status, FAILURE)
+
+    def test_unassigned_variable(self):
+        # read from an enclosing frame before it is assigned
+        status, result = self.interpreter.interpret(
+            "(letrec ((a (lambda () b)) (b (a))) b)"
+        )
+        self.assertEqual(status, FAILURE)
+        self.assertEqual(str(result), "undefined variable b")
+
+    def test_named_let(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define (sum-to n)
+                (let loop ((i 0) (acc 0))
+                    (if (> i n) acc (loop (+ i 1) (+ acc i)))))
+            (sum-to 100000)
+            (let loop ((i 3)) (if (= i 0) 0 (+ 1 (loop (- i 1)))))
+            (define loop 5)
+            (let loop ((i loop)) (if (= i 0) loop (loop (- i 1))))
+            loop
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            # loops are tail calls and run in constant stack
+            self.assertEqual(result[0], 5000050000)
+            self.assertEqual(result[1], 3)
+            # the inits don't see the loop's name, which is local to it
+            self.assertEqual(to_string(result[2]), "#<procedure loop>")
+            self.assertEqual(result[3], 5)
+
+    def test_ill_formed_let(self):
+        for exp in [
+            "(let)",
+            "(let ((x 1)))",
+            "(let (x) x)",
+            "(let ((x)) x)",
+            "(let ((1 2)) 1)",
+            "(let ((x 1) (x 2)) x)",
+            "(letrec ((x 1) (x 2)) x)",
+            "(let 1 ((x 1)) x)",
+            "(let loop)",
+        ]:
+            status, _ = self.interpreter.interpret(exp)
+            self.assertEqual(status, FAILURE, exp)
+
+    def test_macros(self):
+        status, result = self.interpreter.interpret(
+            '''
+            (define-syntax while
+                (syntax-rules ()
+                    ((_ test body ...) (let loop () (when test body ... (loop))))))
+            (define-syntax when
+                (syntax-rules () ((_ test body ...) (if test (begin body ...) #f))))
+            (define (count-to n)
+                (define i 0)
+                (define loop 0)
+                (while (< i n) (set! i (+ i 1)) (set! loop (+ loop 1)))
+                (list i loop))
+            (count-to 10000)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+
+        if isinstance(result, List):
+            # the loop of the template doesn't capture the one of count-to
+            self.assertEqual(to_string(result[0]), "(10000 10000)")
+
+        # macros stay defined in the interpreter they were defined in
+        status, result = self.interpreter.interpret("(when #t 1)")
+        self.assertEqual((status, result), (SUCCESS, [1]))
+        other = Interpret(global_env, self.backend)
+        status, _ = other.interpret("(when #t 1)")
+        self.assertEqual(status, FAILURE)
+
+        status, _ = self.interpreter.interpret("1 (when)")
+        self.assertEqual(status, FAILURE)
+
+    def test_step_limit(self):
+        interpreter = Interpret(global_env, self.backend, limits=Limits(steps=500))
+        status, result = interpreter.interpret(
+            '''
+            (define (loop n) (loop (+ n 1)))
+            (loop 0)
+            '''
+        )
+        self.assertEqual(status, FAILURE)
+        self.assertEqual(result, "step limit of 500 exceeded")
+        self.assertEqual(interpreter.meter.steps, 501)  # type: ignore
+        self.assertEqual(interpreter.meter.exceeded, result)  # type: ignore
+
+        # the budget is per evaluation and definitions made so far are kept
+        status, result = interpreter.interpret(
+            "(define (count n) (if (= n 0) 0 (count (- n 1)))) (count 100)"
+        )
+        self.assertEqual((status, result), (SUCCESS, [0]))
+        self.assertEqual(interpreter.meter.steps, 101)  # type: ignore
+        self.assertIsNone(interpreter.meter.exceeded)  # type: ignore
+
+    def test_step_limit_in_callback(self):
+        # a builtin calling back into scheme doesn't swallow the limit
+        interpreter = Interpret(global_env, self.backend, limits=Limits(steps=50))
+        status, result = interpreter.interpret(
+            '''
+            (define (loop n) (loop (+ n 1)))
+            (map (lambda (x) (loop x)) (list 1 2))
+            '''
+        )
+        self.assertEqual((status, result), (FAILURE, "step limit of 50 exceeded"))
+
+    def test_timeout(self):
+        interpreter = Interpret(global_env, self.backend, limits=Limits(timeout=0.05))
+        status, result = interpreter.interpret(
+            "(define (loop n) (loop (+ n 1))) (loop 0)"
+        )
+        self.assertEqual((status, result), (FAILURE, "time limit of 0.05s exceeded"))
+        self.assertGreaterEqual(interpreter.meter.elapsed, 0.05)  # type: ignore
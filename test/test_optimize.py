@@ -0,0 +1,91 @@
+import io
+import unittest
+
+from pyscm.env import global_env
+from pyscm.optimize import Optimizer, to_source
+from pyscm.parse import Parse
+from test import test_interpreter
+
+
+class TestOptimizer(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parse()
+        self.optimizer = Optimizer(global_env)
+
+    def optimize(self, source):
+        [(_, exp)] = list(self.parser.parse(source))
+        return to_source(self.optimizer.optimize(exp))
+
+    def test_fold_constants(self):
+        self.assertEqual(self.optimize("(* 4 8)"), "32")
+        self.assertEqual(self.optimize("(+ x (* 2 (- 5 1)) 1.5)"), "(+ x 8 1.5)")
+        self.assertEqual(self.optimize("(define w (max 1 (abs -7)))"), "(define w 7)")
+        self.assertEqual(self.optimize("(< (* 2 2) 3)"), "#f")
+        self.assertEqual(self.optimize("(/ 1 3)"), "1/3")
+        self.assertEqual(self.optimize("(exact? (/ 1 3))"), "#t")
+        self.assertEqual(
+            self.optimize('(string-append "n=" (number->string (* 6 7)))'), '"n=42"'
+        )
+        # failing calls are left to evaluation
+        self.assertEqual(self.optimize("(/ 1 0)"), "(/ 1 0)")
+        self.assertEqual(self.optimize("(car (+ 1 1))"), "(car 2)")
+
+    def test_dead_branches(self):
+        self.assertEqual(self.optimize("(if #t a (b))"), "a")
+        self.assertEqual(self.optimize("(if (= 1 2) a (+ 1 1))"), "2")
+        self.assertEqual(self.optimize('(if "" a b)'), "a")
+        self.assertEqual(self.optimize("(if #f a)"), "(if #f a)")
+        self.assertEqual(self.optimize("(if x a b)"), "(if x a b)")
+
+    def test_flatten_begin(self):
+        self.assertEqual(
+            self.optimize("(begin 1 (begin (f) (begin 2 (g))) x)"),
+            "(begin (f) (g) x)",
+        )
+        self.assertEqual(self.optimize("(begin (begin 1))"), "1")
+        self.assertEqual(
+            self.optimize("(lambda (x) (begin (define y x)) 5 (* y 2))"),
+            "(lambda (x) (define y x) (* y 2))",
+        )
+
+    def test_inline_lambda(self):
+        self.assertEqual(
+            self.optimize("((lambda (a b) (+ a b)) 1 (* 2 3))"),
+            "(let ((a 1) (b 6)) (+ a b))",
+        )
+        self.assertEqual(self.optimize("((lambda () (f)))"), "(let () (f))")
+        # arity errors are left for evaluation to report
+        self.assertEqual(
+            self.optimize("((lambda (a) a) 1 2)"), "((lambda (a) a) 1 2)"
+        )
+
+    def test_special_forms(self):
+        self.assertEqual(
+            self.optimize("(let loop ((i (+ 1 1))) (if #f 0 (loop i)))"),
+            "(let loop ((i 2)) (loop i))",
+        )
+        self.assertEqual(self.optimize("(set! x (- 3 1))"), "(set! x 2)")
+        self.assertEqual(self.optimize("(lambda (+ 1 2) 1)"), "(lambda (+ 1 2) 1)")
+        self.assertEqual(self.optimize("(if)"), "(if)")
+
+    def test_dump(self):
+        output = io.StringIO()
+        self.optimizer.dump = output
+        [(_, exp)] = list(self.parser.parse('(define s (if #t "a\\"b" 1))'))
+        self.optimizer.optimize_toplevel(exp)
+        self.assertEqual(output.getvalue(), '(define s "a\\"b")\n')
+
+
+class TestOptimizedInterpreter(test_interpreter.TestSchemeInterpreter):
+    """Runs the interpreter tests with the optimizer rewriting every form"""
+
+    optimize = True
+
+
+class TestOptimizedVirtualMachine(test_interpreter.TestSchemeInterpreter):
+    backend = "vm"
+    optimize = True
+
+
+if __name__ == "__main__":
+    unittest.main()
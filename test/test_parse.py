@@ -0,0 +1,128 @@
+from fractions import Fraction
+import gc
+import io
+import unittest
+
+from pyscm.number import Rational
+from pyscm.parse import (
+    Parse,
+    Symbol,
+    Token,
+    TokenType,
+    intern,
+    symbol_table,
+    tokenize,
+)
+
+SUCCESS = True
+FAILURE = False
+
+
+class TestParse(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parse()
+
+    def test_tokenize_positions(self):
+        lexemes = list(tokenize(io.StringIO("(+ 1\n  (* 2 3)) ; done\n")))
+        self.assertEqual(
+            lexemes,
+            [
+                ("(", 1, 1),
+                ("+", 1, 2),
+                ("1", 1, 4),
+                ("(", 2, 3),
+                ("*", 2, 4),
+                ("2", 2, 6),
+                ("3", 2, 8),
+                (")", 2, 9),
+                (")", 2, 10),
+            ],
+        )
+
+    def test_tokenize_strings(self):
+        lexemes = [
+            lexeme
+            for lexeme, _, _ in tokenize(
+                io.StringIO('(f "a (b) ; c" \'x y\' "multi\nline" "q\\"")')
+            )
+        ]
+        self.assertEqual(
+            lexemes,
+            ["(", "f", '"a (b) ; c"', "'x y'", '"multi\nline"', '"q\\""', ")"],
+        )
+
+    def test_single_quote_ends_at_line(self):
+        lexemes = [
+            lexeme
+            for lexeme, _, _ in tokenize(io.StringIO("(a 'b)\n'c d'\n"))
+        ]
+        self.assertEqual(lexemes, ["(", "a", "'b", ")", "'c d'"])
+
+    def test_parse_one_datum_at_a_time(self):
+        data = self.parser.parse("1 (a (b)) c")
+        self.assertEqual(next(data), (SUCCESS, Token(TokenType.INT, 1)))
+        status, datum = next(data)
+        self.assertEqual(status, SUCCESS)
+        self.assertEqual(len(datum), 2)
+        self.assertEqual(len(datum[1]), 1)
+        self.assertEqual(next(data)[1].literal, "c")
+        self.assertEqual(list(data), [])
+
+    def test_parse_deep_nesting(self):
+        depth = 10000
+        [(status, datum)] = list(self.parser.parse("(" * depth + ")" * depth))
+        self.assertEqual(status, SUCCESS)
+        for _ in range(depth - 1):
+            datum = datum[0]
+        self.assertEqual(datum, [])
+
+    def test_symbols_interned(self):
+        [(_, first), (_, second)] = list(self.parser.parse("(foo bar) (bar foo)"))
+        self.assertIs(first[0], second[1])
+        self.assertIs(first[1], second[0])
+        self.assertIsInstance(first[0], Symbol)
+        self.assertEqual(first[0].token_type, TokenType.IDENT)
+
+        self.assertIs(self.parser.get_token("lambda"), intern("lambda"))
+        self.assertEqual(intern("lambda").token_type, TokenType.LAMBDA)
+        self.assertEqual(self.parser.get_token("-4.5"), Token(TokenType.FLOAT, -4.5))
+        self.assertEqual(self.parser.get_token("-").token_type, TokenType.MINUS)
+        self.assertEqual(self.parser.get_token("nan").token_type, TokenType.IDENT)
+
+    def test_symbols_not_kept(self):
+        # identifiers nothing refers to anymore leave the symbol table
+        [(_, form)] = list(self.parser.parse("(read-once (read-once))"))
+        self.assertIs(form[0], intern("read-once"))
+        del form
+        gc.collect()
+        self.assertNotIn("read-once", symbol_table)
+        self.assertEqual(intern("if").token_type, TokenType.IF)
+
+    def test_numbers(self):
+        self.assertEqual(self.parser.get_token("12"), Token(TokenType.INT, 12))
+        self.assertEqual(
+            self.parser.get_token("-2/6"), Token(TokenType.RATIONAL, Rational(-1, 3))
+        )
+        # rationals are read in lowest terms, a whole one is an integer
+        self.assertEqual(self.parser.get_token("8/4"), Token(TokenType.INT, 2))
+        self.assertEqual(self.parser.get_token("#e1.5").literal, Fraction(3, 2))
+        self.assertEqual(self.parser.get_token("#i1/4"), Token(TokenType.FLOAT, 0.25))
+        for name in ("1/0", "1/-2", "1/2/3", "a/b"):
+            self.assertEqual(self.parser.get_token(name).token_type, TokenType.IDENT)
+
+    def test_parse_errors(self):
+        status, msg = list(self.parser.parse("(+ 1\n (2"))[-1]
+        self.assertEqual(status, FAILURE)
+        self.assertIn("line 2, column 2", msg)
+
+        status, msg = list(self.parser.parse("1 )"))[-1]
+        self.assertEqual(status, FAILURE)
+        self.assertIn("line 1, column 3", msg)
+
+        status, msg = list(self.parser.parse('(f "abc'))[-1]
+        self.assertEqual(status, FAILURE)
+        self.assertIn("unterminated string", msg)
+
+
+if __name__ == "__main__":
+    unittest.main()
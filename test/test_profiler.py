@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from pyscm.env import global_env
+from pyscm.pyscm import BACKENDS, Interpret
+
+SUCCESS = True
+FAILURE = False
+
+PROGRAM = """
+(define (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))
+(define (loop n acc) (if (= n 0) acc (loop (- n 1) (+ acc (fib 5)))))
+(loop 10 0)
+"""
+
+
+class TestProfiler(unittest.TestCase):
+    def test_counts(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                interpreter = Interpret(global_env, backend, profile=True)
+                status, result = interpreter.interpret(PROGRAM)
+                self.assertEqual(status, SUCCESS)
+                self.assertEqual(result, [50])
+
+                profiler = interpreter.profiler
+                assert profiler is not None
+                self.assertEqual(profiler.stats["fib"].calls, 150)
+                self.assertEqual(profiler.stats["loop"].calls, 11)
+                self.assertEqual(profiler.builtins["<"], 150)
+                self.assertEqual(profiler.builtins["="], 11)
+                # tail calls of loop replace each other, fib(5) is 5 deep
+                self.assertEqual(profiler.max_depth, 6)
+                self.assertEqual(profiler.allocations, 150 + 11 + 2)
+                self.assertEqual(profiler.stack, [])
+
+                loop = profiler.stats["loop"]
+                self.assertGreaterEqual(loop.inclusive, loop.exclusive)
+                self.assertIn("fib", profiler.report())
+
+    def test_collapsed(self):
+        interpreter = Interpret(global_env, "closure", profile=True)
+        interpreter.interpret(PROGRAM)
+        assert interpreter.profiler is not None
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "stacks.txt")
+            interpreter.profiler.write_collapsed(path)
+            with open(path) as f:
+                stacks = [line.rsplit(" ", 1)[0] for line in f]
+        self.assertIn("loop", stacks)
+        self.assertIn("loop;fib;fib;fib;fib", stacks)
+
+    def test_error_unwinds(self):
+        for backend in BACKENDS:
+            with self.subTest(backend=backend):
+                interpreter = Interpret(global_env, backend, profile=True)
+                status, _ = interpreter.interpret(
+                    "(define (f n) (g n)) (define (g n) (undefined n)) (f 1)"
+                )
+                self.assertEqual(status, FAILURE)
+                assert interpreter.profiler is not None
+                self.assertEqual(interpreter.profiler.stack, [])
+                self.assertEqual(interpreter.profiler.stats["g"].calls, 1)
+
+    def test_disabled(self):
+        interpreter = Interpret(global_env)
+        self.assertIsNone(interpreter.profiler)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from pyscm.env import Env, global_env
+from pyscm.parse import Parse
+from pyscm.pyscm import interpret_from_file
+from pyscm.resolve import Scope, procedure_scope, resolve, undefined_globals
+
+
+class TestResolve(unittest.TestCase):
+    def setUp(self):
+        self.parser = Parse()
+
+    def forms(self, source):
+        return [form for _, form in self.parser.parse(source)]
+
+    def test_resolve(self):
+        inner = Scope(["x", "y"], 2)
+        outer = Scope(["f", "x"], 1)
+        self.assertEqual(resolve("y", (inner, outer)), (0, 2))
+        self.assertEqual(resolve("x", (inner, outer)), (0, 1))
+        self.assertEqual(resolve("f", (inner, outer)), (1, 1))
+        self.assertEqual(resolve("g", (inner, outer)), (2, None))
+
+    def test_procedure_scope(self):
+        [exp] = self.forms("(lambda (a b) (define c 1) (begin (define d 2)) a)")
+        scope = procedure_scope(exp[1], exp[2:])
+        self.assertEqual(scope.names, ["a", "b", "c", "d"])
+        self.assertEqual(scope.nparams, 2)
+        self.assertEqual(scope.define("e"), 5)
+        self.assertEqual(scope.define("c"), 3)
+
+    def test_undefined_globals(self):
+        forms = self.forms(
+            '''
+            (define (f n) (g (+ n missing)))
+            (define (g n) (define (h m) (* m n)) (h n))
+            (define-memoized (fib n) (if (< n 2) n (fib (- n 1))))
+            (set! unset 1)
+            ((lambda (x) (if x (other x) x)) 1)
+            '''
+        )
+        self.assertEqual(
+            undefined_globals(forms, Env()), ["missing", "unset", "other"]
+        )
+        self.assertEqual(
+            undefined_globals(forms, Env({"missing": 1})), ["unset", "other"]
+        )
+
+    def test_undefined_globals_let(self):
+        forms = self.forms(
+            '''
+            (let ((a 1) (b a)) (define c b) (+ a b c))
+            (let* ((d 1) (e d)) e)
+            (letrec ((f (lambda () g)) (g 1)) (f))
+            (let loop ((i i)) (loop i))
+            '''
+        )
+        self.assertEqual(undefined_globals(forms, Env()), ["a", "i"])
+
+    def test_undefined_before_execution(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "program.scm")
+            with open(path, "w") as f:
+                f.write("(define ran-first 1) (undefined-procedure 1)")
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                interpret_from_file(path, use_cache=False)
+        self.assertEqual(
+            output.getvalue(), "error: undefined variable undefined-procedure\n"
+        )
+        self.assertNotIn("ran-first", global_env)
+
+
+if __name__ == "__main__":
+    unittest.main()
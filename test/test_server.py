@@ -0,0 +1,177 @@
+import contextlib
+import io
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from pyscm.env import global_env
+from pyscm.limits import Limits
+from pyscm.server import (
+    WorkerPool,
+    evaluate_request,
+    make_server,
+    parse_address,
+    submit,
+)
+
+
+class TestEvaluateRequest(unittest.TestCase):
+    def test_results(self):
+        messages = list(
+            evaluate_request(
+                {"source": '(define x 2) (* x 21) "s"', "backend": "vm"}
+            )
+        )
+        self.assertEqual(
+            messages, [{"result": "42"}, {"result": '"s"'}, {"status": "ok"}]
+        )
+
+    def test_output(self):
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            messages = list(
+                evaluate_request(
+                    {"source": '(display "a") 1 (write-string "b") (newline) (car 1)'}
+                )
+            )
+        self.assertEqual(
+            messages[:3], [{"output": "a"}, {"result": "1"}, {"output": "b\n"}]
+        )
+        self.assertEqual(messages[3]["status"], "error")
+        self.assertEqual(stdout.getvalue(), "")
+
+    def test_isolated(self):
+        list(evaluate_request({"source": "(define leaked 1)"}))
+        self.assertNotIn("leaked", global_env)
+        messages = list(evaluate_request({"source": "leaked"}))
+        self.assertEqual(messages[-1]["status"], "error")
+
+    def test_errors(self):
+        for request in [
+            {},
+            {"source": "1", "backend": "jit"},
+            {"source": "(+ 1"},
+            {"source": "1 (car 1) 2"},
+        ]:
+            messages = list(evaluate_request(request))
+            self.assertEqual(messages[-1]["status"], "error", request)
+        self.assertEqual(messages[0], {"result": "1"})
+
+    def test_limits(self):
+        source = "(define (loop n) (loop (+ n 1))) (loop 0)"
+        messages = list(evaluate_request({"source": source}, Limits(steps=100)))
+        self.assertEqual(
+            messages[-1], {"status": "error", "error": "step limit of 100 exceeded"}
+        )
+
+        # a request can tighten the server's limits but not loosen them
+        for requested, steps in [(10, 10), (1000, 100), (None, 100)]:
+            request = {"source": source, "limits": {"steps": requested}}
+            messages = list(evaluate_request(request, Limits(steps=100)))
+            self.assertEqual(
+                messages[-1]["error"], f"step limit of {steps} exceeded"
+            )
+
+        for limits in [[], {"stack": 1}, {"steps": "1"}]:
+            messages = list(evaluate_request({"source": "1", "limits": limits}))
+            self.assertEqual(
+                messages, [{"status": "error", "error": "invalid limits"}]
+            )
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address("localhost:7000")[1], ("localhost", 7000))
+        self.assertEqual(parse_address("/tmp/pyscm.sock")[1], "/tmp/pyscm.sock")
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.address = os.path.join(cls.directory.name, "pyscm.sock")
+        cls.pool = WorkerPool(2)
+        cls.server = make_server(cls.address, cls.pool)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+        cls.pool.close()
+        cls.directory.cleanup()
+
+    def test_socket_path(self):
+        # only a socket left behind is replaced, never another file
+        path = os.path.join(self.directory.name, "notes.txt")
+        with open(path, "w") as f:
+            f.write("notes")
+        with self.assertRaises(FileExistsError):
+            make_server(path, self.pool)
+        with open(path) as f:
+            self.assertEqual(f.read(), "notes")
+
+        stale = os.path.join(self.directory.name, "stale.sock")
+        with socket.socket(socket.AF_UNIX) as sock:
+            sock.bind(stale)
+        server = make_server(stale, self.pool)
+        server.server_close()
+        os.unlink(stale)
+
+    def test_submit(self):
+        messages = list(
+            submit(self.address, "(define (f n) (+ n 1)) (f 1) (f 2)")
+        )
+        self.assertEqual(
+            messages, [{"result": "2"}, {"result": "3"}, {"status": "ok"}]
+        )
+
+    def test_concurrent_clients(self):
+        results = {}
+
+        def run(n):
+            results[n] = list(submit(self.address, f"(* {n} {n})", "closure"))
+
+        threads = [threading.Thread(target=run, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for n in range(8):
+            self.assertEqual(
+                results[n], [{"result": str(n * n)}, {"status": "ok"}]
+            )
+
+    def test_server_backend(self):
+        # requests without a backend run on the server's
+        address = os.path.join(self.directory.name, "vm.sock")
+        server = make_server(address, self.pool, "vm")
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            source = "(define (sum n) (if (= n 0) 0 (+ n (sum (- n 1))))) (sum 20000)"
+            messages = list(submit(address, source))
+            self.assertEqual(messages, [{"result": "200010000"}, {"status": "ok"}])
+            messages = list(submit(address, source, "tree"))
+            self.assertEqual(messages[-1]["status"], "error")
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+            os.unlink(address)
+
+    def test_dead_worker_replaced(self):
+        for worker in self.pool.workers:
+            worker.process.kill()
+            worker.process.join()
+        for _ in self.pool.workers:
+            messages = list(submit(self.address, "1"))
+            self.assertEqual(messages, [{"status": "error", "error": "worker exited"}])
+        messages = list(submit(self.address, "1"))
+        self.assertEqual(messages, [{"result": "1"}, {"status": "ok"}])
+
+
+if __name__ == "__main__":
+    unittest.main()
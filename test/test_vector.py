@@ -0,0 +1,109 @@
+from array import array
+import operator as op
+import types
+import unittest
+from unittest import mock
+
+from pyscm import vector
+from pyscm.vector import FLOAT, Vector, elementwise
+
+try:
+    import numpy  # type: ignore
+except ImportError:
+    numpy = None
+
+
+class FakeArray:
+    """Enough of a numpy float array for elementwise, backed by a list"""
+
+    def __init__(self, items):
+        self.items = list(items)
+
+    def astype(self, dtype):
+        return FakeArray(map(float, self.items))
+
+    def tobytes(self):
+        return array("d", self.items).tobytes()
+
+    def _apply(self, f, other, swap=False):
+        others = other.items if type(other) is FakeArray else [other] * len(self)
+        pairs = zip(others, self.items) if swap else zip(self.items, others)
+        return FakeArray(f(a, b) for a, b in pairs)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __add__(self, other):
+        return self._apply(op.add, other)
+
+    def __radd__(self, other):
+        return self._apply(op.add, other, swap=True)
+
+    def __sub__(self, other):
+        return self._apply(op.sub, other)
+
+    def __rsub__(self, other):
+        return self._apply(op.sub, other, swap=True)
+
+    def __mul__(self, other):
+        return self._apply(op.mul, other)
+
+    def __rmul__(self, other):
+        return self._apply(op.mul, other, swap=True)
+
+
+def fake_numpy():
+    fake = types.SimpleNamespace(float64="d", int64="q", calls=0)
+
+    def frombuffer(buffer, dtype):
+        fake.calls += 1
+        data = array(dtype)
+        data.frombytes(bytes(buffer))
+        return FakeArray(data)
+
+    fake.frombuffer = frombuffer
+    return fake
+
+
+# float arithmetic on vectors and scalars, which takes the numpy path
+CASES = [
+    (op.add, vector.vector(1.5, 2.0, -3.25), vector.vector(1, 2, 3)),
+    (op.sub, vector.vector(1, 2, 3), vector.vector(0.5, 0.25, 4.0)),
+    (op.mul, 2.5, vector.vector(1, -2, 3)),
+    (op.sub, vector.vector(1.0, 2.0), 3),
+]
+
+
+class TestElementwise(unittest.TestCase):
+    def expected(self, f, a, b):
+        with mock.patch.object(vector, "numpy", None):
+            return elementwise(f, a, b)
+
+    def check_cases(self):
+        for f, a, b in CASES:
+            result = elementwise(f, a, b)
+            self.assertIs(type(result), Vector)
+            self.assertEqual(result.typecode, FLOAT)
+            self.assertEqual(list(result), list(self.expected(f, a, b)))
+
+    def test_fake_numpy(self):
+        fake = fake_numpy()
+        with mock.patch.object(vector, "numpy", fake):
+            self.check_cases()
+        self.assertEqual(fake.calls, 6)
+
+    @unittest.skipUnless(numpy, "numpy is not installed")
+    def test_numpy(self):
+        with mock.patch.object(vector, "numpy", numpy):
+            self.check_cases()
+
+    def test_ints_skip_numpy(self):
+        fake = fake_numpy()
+        with mock.patch.object(vector, "numpy", fake):
+            result = elementwise(op.add, vector.vector(1, 2), vector.vector(3, 4))
+        self.assertEqual(list(result), [4, 6])
+        self.assertEqual(fake.calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from pyscm.vm import Machine, disassemble
+from test import test_interpreter
+
+SUCCESS = True
+FAILURE = False
+
+
+class TestVirtualMachine(test_interpreter.TestSchemeInterpreter):
+    """Runs the interpreter tests against the bytecode compiler and vm"""
+
+    backend = "vm"
+
+    def machine(self) -> Machine:
+        machine = self.interpreter.evaluator
+        assert isinstance(machine, Machine)
+        return machine
+
+    def test_deep_recursion(self):
+        # calls are kept on the machine's own stack, not python's
+        status, result = self.interpreter.interpret(
+            '''
+            (define (sum n) (if (= n 0) 0 (+ n (sum (- n 1)))))
+            (sum 20000)
+            '''
+        )
+        self.assertEqual(status, SUCCESS)
+        self.assertEqual(result, [200010000])
+
+    def test_internal_define_before_assignment(self):
+        status, _ = self.interpreter.interpret(
+            '''
+            (define (f) (define a b) (define b 1) a)
+            (f)
+            '''
+        )
+        self.assertEqual(status, FAILURE)
+
+    def test_disassemble(self):
+        machine = self.machine()
+        [(_, exp)] = list(
+            self.interpreter.parser.parse("(lambda (n) (if n (f n) x))")
+        )
+        code = machine.assemble(exp)
+        listing = disassemble(code.consts[0])
+        self.assertIn("JUMP_IF_FALSE", listing)
+        self.assertIn("LOCAL", listing)
+        self.assertIn("TAIL_CALL", listing)
+        self.assertIn("GLOBAL", listing)
+
+    def test_primitive_instructions(self):
+        machine = self.machine()
+        [(_, exp)] = list(self.interpreter.parser.parse("(- (+ n 1) (+ 1 2 3))"))
+        listing = disassemble(machine.assemble(exp))
+        self.assertIn("PRIMITIVE2", listing)
+        self.assertIn("CALL", listing)
+
+    def test_let_frame(self):
+        machine = self.machine()
+        [(_, exp)] = list(
+            self.interpreter.parser.parse("(lambda (n) (let ((m 1)) (f m n)) n)")
+        )
+        listing = disassemble(machine.assemble(exp).consts[0])
+        # no procedure is made for the let, its body runs in a new frame
+        self.assertIn("FRAME", listing)
+        self.assertIn("LEAVE", listing)
+        self.assertNotIn("CLOSURE", listing)
+        self.assertIn("DEREF", listing)
+
+
+if __name__ == "__main__":
+    unittest.main()